@@ -6,46 +6,73 @@
 # - Reliable verify at 115200
 # ============================================================
 
+import autogen_flash_startup as startup  # first: the --startup-profile clock starts here
 import os
 
 # Port cache
 _CACHED_PORT = None
 
 
+def enter_bootloader(ser):
+    """DTR/RTS sequence on an open serial port: EN low, IO0 low, release EN."""
+    import time
+    ser.dtr = False
+    ser.rts = True
+    time.sleep(0.05)
+    ser.dtr = True
+    ser.rts = False
+    time.sleep(0.05)
+    ser.dtr = False
+    ser.rts = False
+    time.sleep(0.05)
+
+
 def touch_reset_lines(port: str):
     """Toggle DTR/RTS to put ESP into a clean bootloader state."""
     try:
-        import serial, time
+        import serial
         ser = serial.Serial(port, 115200, timeout=0.2)
-        ser.dtr = False
-        ser.rts = True
-        time.sleep(0.05)
-        ser.dtr = True
-        ser.rts = False
-        time.sleep(0.05)
-        ser.dtr = False
-        ser.rts = False
-        time.sleep(0.05)
+        enter_bootloader(ser)
         ser.close()
     except Exception:
         pass
 
 import sys
 import json
+import struct
 import time
 
-# --- PyInstaller bundling hint (safe) ---
-try:
-    import esptool  # noqa: F401
-except Exception:
-    esptool = None
+from autogen_flash_events import FlashCancelled, check_cancel  # noqa: F401 (FlashCancelled re-exported)
+from autogen_flash_trace import span
+
+# esptool / pyserial are imported where they are used (startup stays fast);
+# the PyInstaller builds name them with --hidden-import instead
 
 
 # -------------------- helpers --------------------
 
-def die(msg: str, code: int = 1):
+class FlashError(Exception):
+    """A flash run failed; str() is the reason the operator sees after ❌."""
+
+class ConfigError(FlashError):
+    """version.json asks for something this tool cannot do."""
+
+class FirmwareError(FlashError):
+    """Firmware missing, rejected or too big for the device."""
+
+class DeviceNotFoundError(FlashError):
+    """No serial port / no ESP answering on any port."""
+
+class WriteError(FlashError):
+    """Erase or write failed at every baud rate."""
+
+class VerifyError(FlashError):
+    """What is on the flash does not match the firmware."""
+
+def die(msg: str, kind=FlashError):
+    """Print the ❌ reason and raise it as `kind`; main() / the GUI / the daemon catch FlashError once."""
     print(f"\n❌ {msg}\n", file=sys.stderr)
-    raise SystemExit(code)
+    raise kind(msg)
 
 def is_frozen() -> bool:
     return bool(getattr(sys, "frozen", False))
@@ -76,7 +103,11 @@ def load_cfg() -> dict:
     1) external next to tool (Contents/MacOS on mac app)
     2) bundled resources
     fallback: defaults
+    A release bundle (firmware.agx, see autogen_flash_bundle) next to the tool
+    or bundled supplies its own config and the release fields (name, version,
+    chip); a version.json then only adds station settings on top.
     """
+    cfg = None
     candidates = [
         os.path.join(app_dir(), "version.json"),
         os.path.join(bundled_dir(), "version.json"),
@@ -85,10 +116,27 @@ def load_cfg() -> dict:
         if os.path.exists(p):
             try:
                 with open(p, "r", encoding="utf-8") as f:
-                    return json.load(f)
+                    cfg = json.load(f)
+                break
             except Exception:
                 pass
 
+    bundle = None
+    try:
+        from autogen_flash_bundle import BUNDLE_NAME, find_bundle
+        fw_name = (cfg or {}).get("firmware") or BUNDLE_NAME
+        bundle = find_bundle([app_dir(), bundled_dir()], fw_name if fw_name.endswith(".agx") else BUNDLE_NAME)
+    except Exception:
+        bundle = None
+    if bundle:
+        merged = bundle.config
+        merged.update(cfg or {})
+        merged.update(bundle.release())
+        merged["firmware"] = bundle.path
+        return merged
+    if cfg is not None:
+        return cfg
+
     # Safe defaults
     return {
         "name": "AutoGen X",
@@ -96,73 +144,259 @@ def load_cfg() -> dict:
         "firmware": "firmware.bin",
         "erase": False,
         "baud_try": [921600, 460800, 230400, 115200],
+        "engine": "session",
+        "delta": False,
+        "delta_block": 4096,
+        "probe_timeout": 8,
+        "fast_probe": True,
+        "use_daemon": True,
+        "connect_mode": "default-reset",
+        "gui_log_lines": 5000,
+        "chip": "ESP32",
+        "validate_image": True,
+        "ota_mode": "dual",
+        "ota_slot": "app0",
+        "partition_table": "device",
+        "verify": "md5",
+        "metrics": True,
     }
 
-def list_ports():
+def prepare_cfg() -> dict:
+    """load_cfg() plus the legacy single "baud" -> "baud_try" ladder."""
+    cfg = load_cfg()
+    if "baud_try" not in cfg:
+        cfg["baud_try"] = [cfg.get("baud", 921600), 460800, 230400, 115200]
+    return cfg
+
+def list_port_info() -> list:
+    """Serial ports with their USB identity (vid/pid/serial_number/location, None if not USB)."""
     try:
         import serial.tools.list_ports
     except Exception:
         return []
     out = []
     for p in serial.tools.list_ports.comports():
-        out.append((p.device, p.description or ""))
+        out.append({
+            "device": p.device,
+            "description": p.description or "",
+            "vid": p.vid,
+            "pid": p.pid,
+            "serial_number": p.serial_number,
+            "location": p.location,
+        })
     return out
 
-def find_device_port() -> str:
+def list_ports():
+    return [(p["device"], p["description"]) for p in list_port_info()]
+
+def port_info(port: str) -> dict:
+    for p in list_port_info():
+        if p["device"] == port:
+            return p
+    return {"device": port}
+
+def remember_port(port: str, info: dict = None, **fields):
+    """Store what we learned about the device on `port` in the on-disk device cache."""
+    try:
+        from autogen_flash_cache import remember_device
+        remember_device(info or port_info(port), **fields)
+    except Exception:
+        pass
+
+# Device fingerprints learned in this process: port -> chip / MAC / flash fields
+_FINGERPRINTS = {}
+
+def remember_fingerprint(port: str, fp: dict) -> dict:
+    """Merge what we learned about the controller on `port`; stored per MAC (and linked to the USB identity)."""
+    cur = _FINGERPRINTS.setdefault(port, {})
+    if fp.get("mac") and cur.get("mac") and fp["mac"] != cur["mac"]:
+        cur.clear()  # another controller on this port now
+    cur.update({k: v for k, v in fp.items() if v is not None and not k.startswith("_")})
+    if cur.get("mac"):
+        try:
+            from autogen_flash_fingerprint import save
+            save(cur)
+        except Exception:
+            pass
+        remember_port(port, mac=cur["mac"])
+    return cur
+
+def device_fingerprint(port: str) -> dict:
+    """What we know about the controller on `port`: this run's probe, else the fingerprint of the MAC last seen on its USB identity."""
+    if _FINGERPRINTS.get(port):
+        return dict(_FINGERPRINTS[port])
+    try:
+        from autogen_flash_cache import JsonStore, usb_key
+        from autogen_flash_fingerprint import load
+        key = usb_key(port_info(port))
+        mac = (JsonStore("devices").get(key) or {}).get("mac") if key else None
+        return dict(load(mac) or {})
+    except Exception:
+        return {}
+
+def port_score(dev: str, desc: str) -> int:
+    """Lower score = probed first (CP210x/SLAB, then generic UART/USB)."""
+    d = (desc or "").lower()
+    v = (dev or "").lower()
+    if ("cp210" in d) or ("silicon labs" in d) or ("slab" in d):
+        return 0
+    if ("usb to uart" in d) or ("uart" in d):
+        return 1
+    if ("usbserial" in v) or ("usb" in v):
+        return 2
+    return 10
+
+def probe_ports(ports, timeout: float = 8.0, first: bool = True, fast: bool = True) -> list:
+    """
+    Probe all ports concurrently, each with a hard deadline of `timeout` seconds.
+    first=True returns as soon as one ESP answers; otherwise every ESP found,
+    in port_score order. Frozen Windows runs esptool in-process (stdout is
+    redirected globally), so there ports are probed one at a time.
+    """
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    devs = [dev for dev, desc in sorted(ports, key=lambda x: port_score(x[0], x[1]))]
+    if not devs:
+        return []
+    workers = 1 if (is_frozen() and os.name == "nt") else len(devs)
+
+    found = []
+    pool = ThreadPoolExecutor(max_workers=workers)
+    try:
+        futures = {pool.submit(probe_esp, dev, timeout, fast): dev for dev in devs}
+        for fut in as_completed(futures):
+            dev = futures[fut]
+            try:
+                ok = fut.result()
+            except Exception:
+                ok = False
+            if ok:
+                print(f"✅ Found ESP device on {dev}")
+                found.append(dev)
+                if first:
+                    break
+    finally:
+        # Don't wait on slow non-ESP ports; their probes die at their own deadline
+        pool.shutdown(wait=False, cancel_futures=True)
+    return sorted(found, key=devs.index)
+
+def find_device_port(probe_timeout: float = 8.0, fast: bool = True) -> str:
     global _CACHED_PORT
     if _CACHED_PORT:
         print(f"ℹ️ Using cached port: {_CACHED_PORT}")
         return _CACHED_PORT
 
-    ports = list_ports()
+    with span("list_ports") as s:
+        infos = list_port_info()
+        s["ports"] = len(infos)
+    ports = [(p["device"], p["description"]) for p in infos]
     if not ports:
-        die("No serial ports detected. Plug AutoGen X via USB data cable.")
+        die("No serial ports detected. Plug AutoGen X via USB data cable.", kind=DeviceNotFoundError)
 
     print("🔎 Detected ports:")
     for dev, desc in ports:
         print(f"  - {dev}  ({desc})")
 
-    # Prefer CP210x/SLAB, then probe each port ONCE
-    def score(dev: str, desc: str) -> int:
-        d = (desc or "").lower()
-        v = (dev or "").lower()
-        if ("cp210" in d) or ("silicon labs" in d) or ("slab" in d):
-            return 0
-        if ("usb to uart" in d) or ("uart" in d):
-            return 1
-        if ("usbserial" in v) or ("usb" in v):
-            return 2
-        return 10
-
-    for dev, desc in sorted(ports, key=lambda x: score(x[0], x[1])):
-        print(f"\n🧪 Probing {dev} ...")
-        if probe_esp(dev):
-            print(f"✅ Found ESP device on {dev}\n")
+    # Same USB identity as a previously confirmed ESP? Revalidate just that port.
+    try:
+        from autogen_flash_cache import known_devices
+        known = known_devices(infos)
+    except Exception:
+        known = []
+    for dev, entry in known if fast else []:
+        with span(f"revalidate @{dev}") as s:
+            chip = fast_probe(dev)
+            s["result"] = chip
+        if chip:
+            print(f"\n✅ Known device on {dev} ({entry.get('chip') or chip}), skipping full probe\n")
+            remember_port(dev, next(p for p in infos if p["device"] == dev), chip=entry.get("chip") or chip)
             _CACHED_PORT = dev
             return dev
 
-    die("No ESP device found on detected ports.")
+    # Probe every port at once; the first ESP to answer wins
+    print(f"\n🧪 Probing {len(ports)} port(s) (timeout {probe_timeout:g}s each) ...")
+    with span("probe_ports", ports=len(ports)) as s:
+        found = probe_ports(ports, timeout=probe_timeout, first=True, fast=fast)
+        s["found"] = found
+    if found:
+        print()
+        remember_port(found[0], next(p for p in infos if p["device"] == found[0]))
+        _CACHED_PORT = found[0]
+        return found[0]
+
+    die("No ESP device found on detected ports.", kind=DeviceNotFoundError)
+
+def find_device_ports(probe_timeout: float = 8.0, fast: bool = True) -> list:
+    """Every port with an ESP behind it (station mode). Empty list if none."""
+    return probe_ports(list_ports(), timeout=probe_timeout, first=False, fast=fast)
 
 # -------------------- esptool (IN-PROCESS) --------------------
-def run_esptool(args, silent=False) -> int:
+class _LineWriter:
+    """File-like object that hands every complete output line (\\n or \\r) to on_line."""
+
+    def __init__(self, on_line):
+        self.on_line = on_line
+        self.buf = ""
+
+    def write(self, s):
+        self.buf += s
+        while True:
+            cut = min((i for i in (self.buf.find("\n"), self.buf.find("\r")) if i >= 0), default=-1)
+            if cut < 0:
+                break
+            line, self.buf = self.buf[:cut], self.buf[cut + 1:]
+            if line:
+                self.on_line(line)
+        return len(s)
+
+    def flush(self):
+        if self.buf:
+            line, self.buf = self.buf, ""
+            self.on_line(line)
+
+def _write_size(args):
+    """Size of the file a write_flash/verify_flash call sends (for byte-level progress)."""
+    try:
+        if any(a.replace("-", "_") in ("write_flash", "verify_flash") for a in args):
+            return os.path.getsize(args[-1])
+    except Exception:
+        pass
+    return None
+
+def run_esptool(args, silent=False, timeout=None, device: dict = None) -> int:
     """Run esptool reliably.
     Frozen Windows EXE:
       - MUST run in-process (subprocess sys.executable relaunches the EXE -> popups/recursion)
     Normal python:
       - Run via sys.executable -m esptool
+    Output is printed line by line AS IT ARRIVES and parsed into progress
+    events (autogen_flash_events) for the GUI / daemon.
+    timeout (seconds) kills the subprocess when it is exceeded (not enforced in-process).
+    device: dict that receives the fingerprint fields esptool printed (chip, MAC, flash ...).
     Returns:
       0 on success, non-zero on failure, 2 on unexpected exception.
+    Raises FlashCancelled (the subprocess killed) once the run is cancelled.
     """
     import os, sys
+    from autogen_flash_events import EsptoolOutputParser, emit
 
     frozen = bool(getattr(sys, 'frozen', False)) or hasattr(sys, '_MEIPASS')
+    parser = EsptoolOutputParser(total=_write_size(args))
+    real_out = sys.stdout
+
+    def on_line(line):
+        print(line, file=real_out)
+        for ev in parser.feed(line):
+            emit(ev)
+        if device is not None:
+            device.update(parser.device)
+        check_cancel()  # cancelled run: stop esptool at its next line
 
     # --- Frozen Windows: run esptool.main() in-process ---
     if frozen and os.name == 'nt':
         try:
-            import io, contextlib
+            import contextlib
             import esptool
-            buf = io.StringIO()
             if silent:
                 with open(os.devnull, 'w') as dn:
                     with contextlib.redirect_stdout(dn), contextlib.redirect_stderr(dn):
@@ -172,17 +406,16 @@ def run_esptool(args, silent=False) -> int:
                         except SystemExit as ex:
                             return int(ex.code) if isinstance(ex.code, int) else 1
             else:
-                with contextlib.redirect_stdout(buf), contextlib.redirect_stderr(buf):
+                w = _LineWriter(on_line)
+                with contextlib.redirect_stdout(w), contextlib.redirect_stderr(w):
                     try:
                         esptool.main(list(args))
                         rc = 0
                     except SystemExit as ex:
                         rc = int(ex.code) if isinstance(ex.code, int) else 1
-                out = buf.getvalue() or ''
-                for line in out.splitlines():
-                    print(line)
+                w.flush()
                 # marker override
-                if ('Connected to ESP' in out) or ('Chip type:' in out) or ('Detecting chip type' in out):
+                if parser.connected and not parser.failed:
                     return 0
                 return rc
         except Exception as ex:
@@ -203,31 +436,156 @@ def run_esptool(args, silent=False) -> int:
                 stderr=subprocess.DEVNULL,
                 check=False,
                 creationflags=creationflags,
+                timeout=timeout,
             )
             return r.returncode
 
-        r = subprocess.run(
+        proc = subprocess.Popen(
             cmd,
             stdin=subprocess.DEVNULL,
             stdout=subprocess.PIPE,
             stderr=subprocess.STDOUT,
             text=True,
             errors='replace',
-            check=False,
+            bufsize=1,
             creationflags=creationflags,
+            env=dict(os.environ, PYTHONUNBUFFERED="1"),
         )
-        out = r.stdout or ''
-        for line in out.splitlines():
-            print(line)
-        if ('Connected to ESP' in out) or ('Chip type:' in out) or ('Detecting chip type' in out):
+        timer = None
+        expired = []
+        if timeout:
+            import threading
+            timer = threading.Timer(timeout, lambda: (expired.append(1), proc.kill()))
+            timer.daemon = True
+            timer.start()
+        try:
+            w = _LineWriter(on_line)
+            for chunk in proc.stdout:  # universal newlines: esptool's \r progress updates arrive as lines
+                w.write(chunk)
+            w.flush()
+            rc = proc.wait()
+        finally:
+            if timer:
+                timer.cancel()
+            if proc.poll() is None:
+                proc.kill()  # cancelled: esptool must not keep writing to the port
+                proc.wait()
+        if expired:
+            raise subprocess.TimeoutExpired(cmd, timeout)
+        if parser.connected and not parser.failed:
             return 0
-        return r.returncode
+        return rc
+    except subprocess.TimeoutExpired:
+        print(f"⏱️ esptool timed out after {timeout}s: {' '.join(args)}")
+        return 124
     except Exception as ex:
         return 2
 
-def probe_esp(port: str) -> bool:
-    """Probe using non-silent run so marker detection applies everywhere."""
-    rc = run_esptool(['--chip','auto','--port', port, '--baud','115200','flash-id'], silent=False)
+# -------------------- fast SLIP probe (pyserial only) --------------------
+
+ROM_SYNC     = 0x08
+ROM_READ_REG = 0x0A
+CHIP_MAGIC_REG = 0x40001000
+CHIP_MAGIC = {
+    0x00F01D83: "ESP32",
+    0x000007C6: "ESP32-S2",
+    0xFFF0C101: "ESP8266",
+}
+
+def slip_encode(payload: bytes) -> bytes:
+    return b"\xc0" + payload.replace(b"\xdb", b"\xdb\xdd").replace(b"\xc0", b"\xdb\xdc") + b"\xc0"
+
+def slip_frames(buf: bytes):
+    """Split a raw byte stream into decoded SLIP frames (partial frames dropped)."""
+    out = []
+    for chunk in buf.split(b"\xc0")[1:-1]:
+        if chunk:
+            out.append(chunk.replace(b"\xdb\xdc", b"\xc0").replace(b"\xdb\xdd", b"\xdb"))
+    return out
+
+def rom_command(op: int, data: bytes = b"", chk: int = 0) -> bytes:
+    return slip_encode(struct.pack("<BBHI", 0x00, op, len(data), chk) + data)
+
+def _rom_response(ser, op: int, timeout: float):
+    """Wait for a ROM response to `op`; returns its 32-bit value or None."""
+    buf = b""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        buf += ser.read(ser.in_waiting or 1)
+        for f in slip_frames(buf):
+            if len(f) >= 8 and f[0] == 0x01 and f[1] == op:
+                return struct.unpack("<I", f[4:8])[0]
+    return None
+
+def fast_probe(port: str, timeout: float = 0.5, read_chip: bool = True):
+    """
+    Enter the ROM bootloader via DTR/RTS and send SYNC over SLIP.
+    Returns:
+      chip name (e.g. "ESP32", or "ESP" if unknown)  -> confirmed ESP
+      False -> port can't be opened (busy / gone)
+      None  -> no answer, can't decide (caller falls back to esptool)
+    """
+    try:
+        import serial
+    except Exception:
+        return None
+    try:
+        ser = serial.Serial(port, 115200, timeout=0.02)
+    except Exception:
+        return False
+    try:
+        try:
+            enter_bootloader(ser)
+        except Exception:
+            pass  # no modem lines (pty, some USB-JTAG bridges): just try SYNC
+        ser.reset_input_buffer()
+        sync = rom_command(ROM_SYNC, b"\x07\x07\x12\x20" + b"\x55" * 32)
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            ser.write(sync)
+            if _rom_response(ser, ROM_SYNC, 0.1) is not None:
+                break
+        else:
+            return None
+        if not read_chip:
+            return "ESP"
+        # ROM answers each SYNC several times; drop the extras before READ_REG
+        time.sleep(0.02)
+        ser.reset_input_buffer()
+        ser.write(rom_command(ROM_READ_REG, struct.pack("<I", CHIP_MAGIC_REG)))
+        magic = _rom_response(ser, ROM_READ_REG, 0.2)
+        return CHIP_MAGIC.get(magic, "ESP")
+    except Exception:
+        return None
+    finally:
+        try:
+            ser.close()
+        except Exception:
+            pass
+
+def probe_esp(port: str, timeout=None, fast: bool = True) -> bool:
+    """
+    Fast SLIP SYNC probe first; only launch esptool when it can't decide.
+    Probe esptool using non-silent run so marker detection applies everywhere.
+    """
+    if fast:
+        with span(f"fast_probe @{port}") as s:
+            chip = fast_probe(port)
+            s["result"] = chip
+        if chip:
+            print(f"⚡ {port}: {chip} answered ROM SYNC")
+            if chip != "ESP":
+                remember_fingerprint(port, {"chip": chip})
+            return True
+        if chip is False:
+            return False
+    device = {}
+    with span(f"esptool_probe @{port}") as s:
+        rc = run_esptool(['--chip','auto','--port', port, '--baud','115200','flash-id'], silent=False, timeout=timeout,
+                         device=device)
+        s["rc"] = rc
+    if rc == 0 and device.get("chip"):
+        remember_fingerprint(port, device)  # later steps skip chip / flash detection
     return rc == 0
 
 def resolve_firmware_path(cfg, firmware_override=None) -> str:
@@ -236,112 +594,560 @@ def resolve_firmware_path(cfg, firmware_override=None) -> str:
     1) firmware_override (GUI selected file or CLI arg)
     2) firmware.bin next to the tool (external per-customer file)
     3) bundled firmware.bin (legacy embedded)
+    Any of them may be a .agx release bundle (load_cfg points "firmware" at one it found).
     """
     if firmware_override:
         if os.path.exists(firmware_override):
             return os.path.abspath(firmware_override)
-        die(f"Selected firmware not found: {firmware_override}")
+        die(f"Selected firmware not found: {firmware_override}", kind=FirmwareError)
 
+    p = find_firmware(cfg)
+    if p:
+        return p
     fw_name = cfg.get("firmware", "firmware.bin")
+    die(f"Firmware not found.\nExpected either:\n- {os.path.join(app_dir(), fw_name)}\n- or bundled {fw_name}\n", kind=FirmwareError)
 
-    # External firmware sitting next to the EXE/app-run folder
-    p_external = os.path.join(app_dir(), fw_name)
-    if os.path.exists(p_external):
-        return p_external
+def find_firmware(cfg, firmware_override=None):
+    """resolve_firmware_path() without the error: the path, or None."""
+    if firmware_override:
+        return os.path.abspath(firmware_override) if os.path.exists(firmware_override) else None
+    fw_name = cfg.get("firmware", "firmware.bin")
+    # External firmware sitting next to the EXE/app-run folder, then the bundled fallback (if you still embed it)
+    for p in (os.path.join(app_dir(), fw_name), os.path.join(bundled_dir(), fw_name)):
+        if os.path.exists(p):
+            return p
+    return None
 
-    # Bundled fallback (if you still embed it)
-    p_bundled = os.path.join(bundled_dir(), fw_name)
-    if os.path.exists(p_bundled):
-        return p_bundled
+# -------------------- flash logic (AUTO FIXED FOR AUTOGEN X) --------------------
 
-    die(f"Firmware not found.\nExpected either:\n- {p_external}\n- or bundled {fw_name}\n")
+# AutoGen X OTA partition layout (confirmed). Built-in fallback: the layout is
+# normally read from the device's partition table (autogen_flash_partitions)
+OTADATA_OFFSET = 0xE000
+OTADATA_SIZE   = 0x2000
+APP0_OFFSET    = 0x10000
+APP1_OFFSET    = 0x150000
+SLOT_SIZE      = APP1_OFFSET - APP0_OFFSET
+SLOTS          = (("app0", APP0_OFFSET), ("app1", APP1_OFFSET))
+
+OTA_STATE_VALID = 2  # esp_ota_img_states_t ESP_OTA_IMG_VALID
 
-# -------------------- flash logic (AUTO FIXED FOR AUTOGEN X) --------------------
 
-def flash(cfg, firmware_override=None):
-    # AutoGen X OTA partition layout (confirmed)
-    OTADATA_OFFSET = "0xE000"
-    OTADATA_SIZE   = "0x2000"
-    APP0_OFFSET    = "0x10000"
-    APP1_OFFSET    = "0x150000"
+def default_layout() -> dict:
+    """The built-in layout in the shape autogen_flash_partitions.ota_layout() returns."""
+    return {"otadata": OTADATA_OFFSET, "otadata_size": OTADATA_SIZE,
+            "slots": [(n, o, SLOT_SIZE) for n, o in SLOTS], "source": "built-in"}
 
+
+def otadata_image(slot: int, size: int = OTADATA_SIZE) -> bytes:
+    """
+    Both otadata sectors, selecting OTA slot 0 (app0) or 1 (app1):
+    one esp_ota_select_entry_t {seq, label[20], state, crc32(seq)} in
+    sector 0, sector 1 blank. The bootloader boots (seq - 1) % 2.
+    """
+    import binascii
+    seq = slot + 1
+    crc = binascii.crc32(struct.pack("<I", seq), 0xFFFFFFFF) & 0xFFFFFFFF  # same as IDF otatool
+    entry = struct.pack("<I20sII", seq, b"\xff" * 20, OTA_STATE_VALID, crc)
+    return entry + b"\xff" * (size - len(entry))
+
+
+def check_firmware(cfg, fw_path: str):
+    """Pre-flight check of the app image (nothing is sent to the device if it fails)."""
+    if not cfg.get("validate_image", True):
+        return None
+    from autogen_flash_bundle import BundleError, is_bundle, open_bundle
+    from autogen_flash_image import ImageError, check_target, validate_image
+    try:
+        with span("validate_image"):
+            # Device layout: the slot size is checked per device once its partition table is known
+            slot_size = SLOT_SIZE if cfg.get("partition_table", "device") == "built-in" else None
+            if is_bundle(fw_path):
+                # Parsed when the bundle was built; the members are checked against the
+                # manifest hashes so a bit-rotted bundle never reaches the device
+                bundle = open_bundle(fw_path)
+                bundle.verify()
+                layout = bundle.layout()
+                if layout and slot_size:
+                    slot_size = min(size for _, _, size in layout["slots"])
+                info = check_target(dict(bundle.manifest["image"]), chip=cfg.get("chip", "ESP32"), slot_size=slot_size)
+                print(f"🎁 Bundle: {bundle.describe()}")
+            else:
+                info = validate_image(fw_path, chip=cfg.get("chip", "ESP32"), slot_size=slot_size)
+    except (ImageError, BundleError) as ex:
+        die(f"Firmware image rejected: {ex}\n{fw_path}", kind=FirmwareError)
+    print(f"🧾 Image OK: {info['chip']} app, {len(info['segments'])} segments, {info['file_size']} bytes "
+          f"({info['file_size'] * 100 // SLOT_SIZE}% of slot){', SHA-256 verified' if info['hash_appended'] else ''}")
+    return info
+
+
+def flash(cfg, firmware_override=None, port=None, session=None):
+    """One flash run (see _flash), recorded in the station's metrics store (autogen_flash_metrics)."""
+    from autogen_flash_metrics import RunRecorder
+    rec = RunRecorder(cfg)
+    try:
+        _flash(cfg, firmware_override, port, session, rec)
+    except BaseException as ex:
+        rec.set(fingerprint=_FINGERPRINTS.get(rec.info.get("port")))
+        rec.finish(False, str(ex) if isinstance(ex, FlashError) else f"{type(ex).__name__}: {ex}")
+        raise
+    rec.set(fingerprint=_FINGERPRINTS.get(rec.info.get("port")))
+    rec.finish(True)
+
+def _flash(cfg, firmware_override, port, session, rec):
     erase_full = bool(cfg.get("erase", False))
     baud_list  = cfg.get("baud_try", [921600, 460800, 230400, 115200])
-    verify_baud = 115200  # reliable on your Mac/CP2102
+    engine     = cfg.get("engine", "session")
+    delta      = bool(cfg.get("delta", False))
+    delta_block = int(cfg.get("delta_block", 0x1000))
+    connect_mode = cfg.get("connect_mode", "default-reset")  # "no-reset": no DTR/RTS (simulator, manual boot)
+    ota_mode   = cfg.get("ota_mode", "dual")
+    ota_slot   = cfg.get("ota_slot", "app0")
+    ptable     = cfg.get("partition_table", "device")
+    verify     = cfg.get("verify", "md5")
+    verify_samples = int(cfg.get("verify_samples", 8))
+    if delta_block not in (0x1000, 0x10000):
+        die("delta_block must be 4096 or 65536.", kind=ConfigError)
+    if ota_mode not in ("dual", "single"):
+        die('ota_mode must be "dual" or "single".', kind=ConfigError)
+    if ota_slot not in dict(SLOTS):
+        die('ota_slot must be "app0" or "app1".', kind=ConfigError)
+    if ptable not in ("device", "built-in"):
+        die('partition_table must be "device" or "built-in".', kind=ConfigError)
+    if verify not in ("md5", "sample", "full"):
+        die('verify must be "md5", "sample" or "full".', kind=ConfigError)
+    single_slot = ota_slot if ota_mode == "single" else None
 
     fw_path = resolve_firmware_path(cfg, firmware_override)
-    port = find_device_port()
+    image = check_firmware(cfg, fw_path)
+    if image is None:
+        from autogen_flash_cache import load_firmware
+        img = load_firmware(fw_path)  # validation off: the same digest from the firmware cache
+        image = {"sha256": img.sha256, "file_size": img.size}
+    rec.set(firmware=image["sha256"], bytes=image["file_size"])  # no second hash of the file for the metrics
+    if not port:
+        with span("find_device_port") as s:
+            port = find_device_port(probe_timeout=float(cfg.get("probe_timeout", 8)),
+                                    fast=bool(cfg.get("fast_probe", True)))
+            s["port"] = port
+
+    # One baud model for every phase (learned per USB adapter across runs)
+    from autogen_flash_link import LinkModel
+    info = port_info(port)
+    link = LinkModel.for_port(port, baud_list, info)
+    rec.set(port=port, port_info=info)
+
+    # Known controller: explicit chip / flash size instead of detecting them again
+    fp = device_fingerprint(port)
+    if fp.get("chip") and fp["chip"].upper() != str(cfg.get("chip", fp["chip"])).upper():
+        fp = {}  # not the chip this tool flashes: let esptool detect (and fail) normally
 
     print(f"📦 Target: {cfg.get('name','AutoGen')}  Version: {cfg.get('version','')}")
     print(f"📄 Firmware: {fw_path}")
-    print(f"🧠 Mode: AutoGenX OTA (otadata={OTADATA_OFFSET}, app0={APP0_OFFSET}, app1={APP1_OFFSET}) erase_full={erase_full}")
+    print(f"🧠 Mode: AutoGenX OTA (partitions: {ptable}) erase_full={erase_full} engine={engine} delta={delta} verify={verify} ota={ota_mode}{'/' + ota_slot if single_slot else ''}")
+    if fp:
+        from autogen_flash_fingerprint import describe
+        print(f"🪪 Device: {describe(fp)}")
     print()
 
-    # Optional full erase (kept for compatibility)
-    if erase_full:
-        for b in baud_list:
-            print(f"🧽 Erasing FULL flash @ baud {b} ...")
-            rc = run_esptool(["--port", port, "--baud", str(b), "erase_flash"], silent=False)
-            if rc == 0:
-                break
-        else:
-            die("Erase failed on all baud rates.")
+    if engine == "session" or session is not None:
+        try:
+            flash_session(port, fw_path, link, erase_full, delta=delta, delta_block=delta_block, session=session,
+                          connect_mode=connect_mode, single_slot=single_slot, partition_table=ptable, fingerprint=fp,
+                          verify=verify, verify_samples=verify_samples)
+            return
+        except FlashError:
+            raise  # a verdict (rejected image, verify failed), not an engine problem
+        except Exception as ex:
+            print(f"⚠️ Session engine failed ({ex}), falling back to esptool subprocess...\n")
+            rec.set(fallback=True)
 
-    # Always erase otadata so it won't keep booting an old slot
-    for b in baud_list:
-        print(f"🧹 Erasing otadata @ {OTADATA_OFFSET} size {OTADATA_SIZE} (baud {b}) ...")
-        rc = run_esptool(["--port", port, "--baud", str(b), "erase_region", OTADATA_OFFSET, OTADATA_SIZE], silent=False)
-        if rc == 0:
-            break
-        print("⚠️ otadata erase failed at this baud, retrying lower...\n")
-        time.sleep(0.3)
+    flash_subprocess(port, fw_path, link, erase_full, connect_mode=connect_mode, single_slot=single_slot,
+                     partition_table=ptable, fingerprint=fp)
+
+
+def flash_session(port: str, fw_path: str, link, erase_full: bool, delta: bool = False, delta_block: int = 0x1000,
+                  session=None, connect_mode: str = "default-reset", single_slot: str = None,
+                  partition_table: str = "device", fingerprint: dict = None, verify: str = "md5",
+                  verify_samples: int = 8):
+    """
+    Whole sequence over ONE esptool connection (stub + baud switch happen once).
+    delta=True only rewrites the blocks whose on-device MD5 differs.
+    session: an already open FlashSession for this port (daemon); it is closed here.
+    single_slot: "app0"/"app1" writes + verifies only that slot, then points otadata at it.
+    partition_table: "device" takes otadata + slots from the device's table, "built-in" the constants above.
+    fingerprint: device_fingerprint(port); its chip skips auto-detection.
+    verify: "md5" (on-device MD5 vs the cached digest), "sample" (verify_samples random blocks read back)
+    or "full" (everything read back), all at the session baud.
+    """
+    from autogen_flash_cache import load_firmware
+    from autogen_flash_session import FlashSession
+
+    # Deflated stream + digests come from the local cache (computed once per firmware)
+    with span("load_firmware"):
+        img = load_firmware(fw_path)
+
+    if session is not None and session.esp is None:
+        session = None  # prepared session went stale
+    chip = (fingerprint or {}).get("chip")
+    with (session or FlashSession(port, link=link, connect_mode=connect_mode, chip=chip)) as s:
+        remember_port(port, chip=s.chip, flash_size=s.flash_size, baud=s.baud)
+        remember_fingerprint(port, s.fingerprint or {})
+        layout = img.layout or default_layout()  # a bundle knows the layout its release targets
+        if partition_table == "device":
+            from autogen_flash_partitions import device_layout
+            try:
+                with span("partition_table", baud=s.baud) as sp:
+                    layout = device_layout(s)
+                    sp["source"] = layout["source"]
+            except Exception as ex:
+                print(f"⚠️ Partition table not usable ({ex}), using the {layout['source']} layout.")
+            if img.layout and img.layout["slots"] != layout["slots"]:
+                print("⚠️ The device's partition table differs from the one this release targets.")
+        from autogen_flash_partitions import describe
+        print(f"🗂️ Layout: {describe(layout)}")
+        otadata_off, otadata_size = layout["otadata"], layout["otadata_size"]
+        slots = [(n, o) for n, o, _ in layout["slots"] if single_slot in (None, n)]
+        for name, offset, size in layout["slots"]:
+            if single_slot in (None, name) and img.size > size:
+                die(f"Firmware ({img.size} bytes) does not fit {name} ({size:#x} bytes) on this device.", kind=FirmwareError)
+
+        if erase_full and not s.flash_size:
+            # No plan without knowing where the flash ends: erase the whole chip
+            print("🧽 Clean slate: flash size unknown, erasing the whole chip ...")
+            with span("erase_flash", baud=s.baud):
+                s.erase_flash()
+        elif erase_full:
+            # Clean slate without a chip erase: skip what the writes / otadata erase cover and
+            # what is already blank, erase the rest in as few regions as possible
+            from autogen_flash_erase import describe_plan, plan_erase
+            covered = [(o, img.size) for _, o in slots] + [(otadata_off, otadata_size)]
+            with span("erase_plan", baud=s.baud) as sp:
+                plan = plan_erase(s.md5, s.flash_size, covered)
+                sp["checks"], sp["bytes"] = plan["checks"], plan["erase"]
+            print(f"🧽 Clean slate: {describe_plan(plan)}")
+            for offset, size in plan["runs"]:
+                print(f"   Erasing {offset:#x} size {size:#x} ...")
+                with span("erase_region", baud=s.baud, bytes=size):
+                    s.erase_region(offset, size)
+
+        if not single_slot:
+            # Always erase otadata so it won't keep booting an old slot
+            print(f"🧹 Erasing otadata @ {otadata_off:#x} size {otadata_size:#x} ...")
+            with span("erase_otadata", baud=s.baud):
+                s.erase_region(otadata_off, otadata_size)
+
+        # Dual: flash BOTH slots so whichever is active boots the new firmware
+        for name, offset in slots:
+            if delta and not erase_full:
+                print(f"⚡ Delta flashing {name} @ {offset:#x} (baud {s.baud}) ...")
+                with span(f"write {name}", baud=s.baud, mode="delta") as sp:
+                    sp["bytes"] = s.write_delta(offset, img.data, img.block_md5s[delta_block], delta_block)
+            else:
+                print(f"⚡ Flashing {name} @ {offset:#x} (baud {s.baud}) ...")
+                with span(f"write {name}", baud=s.baud, bytes=img.size):
+                    s.write_resumable(offset, img.data, img.block_md5s[0x10000], 0x10000, compressed=img.compressed)
+
+        for name, offset in slots:
+            print(f"🔍 Verifying {name} @ {offset:#x} ({verify}) ...")
+            with span(f"verify {name}", baud=s.baud, strategy=verify) as sp:
+                ok = s.verify(offset, img.data, digest=img.md5, strategy=verify, samples=verify_samples)
+                sp["result"] = "ok" if ok else "mismatch"
+            if not ok:
+                die(f"Verify failed for {name}.", kind=VerifyError)
+
+        if single_slot:
+            # Only now (slot verified) point the bootloader at it; until here the old otadata still applies
+            otadata = otadata_image([n for n, _, _ in layout["slots"]].index(single_slot), otadata_size)
+            print(f"🧭 Writing otadata @ {otadata_off:#x} -> boot {single_slot} ...")
+            with span("write otadata", baud=s.baud) as sp:
+                s.write(otadata_off, otadata)
+                ok = s.verify(otadata_off, otadata)
+                sp["result"] = "ok" if ok else "mismatch"
+            if not ok:
+                die("Verify failed for otadata.", kind=VerifyError)
+
+    if single_slot:
+        print(f"\n✅ Flash successful ({single_slot} written + verified, otadata selects it).")
     else:
-        die("otadata erase failed on all baud rates.")
+        print("\n✅ Flash successful (both slots written + verified).")
+    print("🔌 Unplug USB, wait 5–10s, plug back in.\n")
 
-    def write_slot(offset_hex: str):
-        for b in baud_list:
-            print(f"⚡ Flashing @ {offset_hex} (baud {b}) ...")
-            rc = run_esptool(["--port", port, "--baud", str(b), "write_flash", "-z", offset_hex, fw_path], silent=False)
-            if rc == 0:
-                return
-            print("⚠️ Flash failed at this baud, retrying lower...\n")
-            time.sleep(0.5)
-        die(f"Flashing failed for slot {offset_hex} on all baud rates.")
-
-    # Flash BOTH slots so whichever is active boots the new firmware
-    write_slot(APP0_OFFSET)
-    write_slot(APP1_OFFSET)
-
-    # Verify both at reliable baud
-    print(f"🔍 Verifying app0 @ {APP0_OFFSET} (baud {verify_baud}) ...")
-    rc = run_esptool(["--port", port, "--baud", str(verify_baud), "verify_flash", APP0_OFFSET, fw_path], silent=False)
-    if rc != 0:
-        die("Verify failed for app0.")
-
-    print(f"🔍 Verifying app1 @ {APP1_OFFSET} (baud {verify_baud}) ...")
-    rc = run_esptool(["--port", port, "--baud", str(verify_baud), "verify_flash", APP1_OFFSET, fw_path], silent=False)
-    if rc != 0:
-        die("Verify failed for app1.")
-
-    print("\n✅ Flash successful (both slots written + verified).")
+
+def run_laddered(link, label: str, make_args, phase: str = "esptool", device: dict = None) -> bool:
+    """Run one esptool step, starting at the link's learned baud and stepping down on failure."""
+    for attempt, b in enumerate(link.attempts(), 1):
+        check_cancel()
+        print(f"{label} (baud {b}) ...")
+        with span(phase, baud=b, attempt=attempt) as s:
+            rc = run_esptool(make_args(b), silent=False, device=device)
+            s["rc"] = rc
+        if rc == 0:
+            link.ok(b)
+            return True
+        link.failed(b)
+        print("⚠️ Failed at this baud, retrying lower...\n")
+        with span("retry_sleep"):
+            time.sleep(0.2)
+    return False
+
+
+def reset_args(connect_mode: str) -> list:
+    """esptool --before/--after for a connect mode ([] keeps esptool's default reset)."""
+    if not connect_mode or connect_mode == "default-reset":
+        return []
+    args = ["--before", connect_mode.replace("-", "_")]
+    if connect_mode.startswith("no-reset"):
+        args += ["--after", "no_reset"]  # no modem lines to reset with afterwards either
+    return args
+
+
+def run_file(folder: str, suffix: str = ".bin") -> str:
+    """Empty file of its own in the cache folder for one esptool run (parallel workers never share it)."""
+    import tempfile
+    from autogen_flash_cache import cache_dir
+    with tempfile.NamedTemporaryFile(dir=cache_dir(folder), prefix=f"{os.getpid()}-", suffix=suffix, delete=False) as f:
+        return f.name
+
+def remove_quietly(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def subprocess_layout(conn: list, link, fallback: dict = None) -> dict:
+    """Partition table via one esptool read_flash (no MAC cache on this path); fallback / built-in layout on failure."""
+    from autogen_flash_partitions import PARTITION_TABLE_OFFSET, PARTITION_TABLE_SIZE, ota_layout, parse_partition_table
+    path = run_file("partitions")
+    try:
+        if run_laddered(link, "🗂️ Reading partition table",
+                        lambda b: conn + ["--baud", str(b), "read_flash", f"{PARTITION_TABLE_OFFSET:#x}",
+                                          f"{PARTITION_TABLE_SIZE:#x}", path], "partition_table"):
+            with open(path, "rb") as f:
+                return ota_layout(parse_partition_table(f.read()))
+        print("⚠️ Partition table read failed, using the fallback layout.")
+    except Exception as ex:
+        print(f"⚠️ Partition table not usable ({ex}), using the fallback layout.")
+    finally:
+        remove_quietly(path)
+    return fallback or default_layout()
+
+
+def flash_subprocess(port: str, fw_path: str, link, erase_full: bool, connect_mode: str = "default-reset",
+                     single_slot: str = None, partition_table: str = "device", fingerprint: dict = None):
+    """Legacy path: one `python -m esptool` run per step."""
+    from autogen_flash_fingerprint import chip_arg, flash_size_known, flash_size_name
+    verify_baud = 115200  # reliable on your Mac/CP2102
+    fp = fingerprint or {}
+    conn = ["--port", port] + reset_args(connect_mode)
+    if fp.get("chip"):
+        conn += ["--chip", chip_arg(fp["chip"])]
+    # Only touches the image header at the bootloader offset, never for the app slots
+    size_args = ["--flash-size", flash_size_name(fp["flash_size"])] if flash_size_known(fp) else []
+    seen = {}  # fingerprint fields esptool prints along the way
+    fallback = None
+    from autogen_flash_bundle import is_bundle, open_bundle
+    if is_bundle(fw_path):
+        # esptool wants a plain file: the bundle's app image, extracted once per SHA-256
+        bundle = open_bundle(fw_path)
+        fw_path, fallback = bundle.app_path(), bundle.layout()
+    layout = subprocess_layout(conn, link, fallback) if partition_table == "device" else (fallback or default_layout())
+    from autogen_flash_partitions import describe
+    print(f"🗂️ Layout: {describe(layout)}")
+    otadata, otadata_size = f"{layout['otadata']:#x}", f"{layout['otadata_size']:#x}"
+    slots = [(n, f"{o:#x}") for n, o, _ in layout["slots"] if single_slot in (None, n)]
+    fw_size = os.path.getsize(fw_path)
+    for name, _, size in layout["slots"]:
+        if single_slot in (None, name) and fw_size > size:
+            die(f"Firmware ({fw_size} bytes) does not fit {name} ({size:#x} bytes) on this device.", kind=FirmwareError)
+
+    # Optional full erase (kept for compatibility). No on-device MD5 from the esptool CLI here,
+    # so no erase planning either: this engine still erases the whole chip
+    if erase_full:
+        if not run_laddered(link, "🧽 Erasing FULL flash",
+                            lambda b: conn + ["--baud", str(b), "erase_flash"], "erase_flash"):
+            die("Erase failed on all baud rates.", kind=WriteError)
+
+    # Always erase otadata so it won't keep booting an old slot (single slot: rewritten at the end)
+    if not single_slot and not run_laddered(link, f"🧹 Erasing otadata @ {otadata} size {otadata_size}",
+                                            lambda b: conn + ["--baud", str(b), "erase_region", otadata, otadata_size],
+                                            "erase_otadata"):
+        die("otadata erase failed on all baud rates.", kind=WriteError)
+
+    def write_slot(name: str, offset_hex: str, path: str = fw_path):
+        if not run_laddered(link, f"⚡ Flashing @ {offset_hex}",
+                            lambda b: conn + ["--baud", str(b), "write_flash", "-z"] + size_args + [offset_hex, path],
+                            f"write {name}", device=seen):
+            die(f"Flashing failed for slot {offset_hex} on all baud rates.", kind=WriteError)
+
+    def verify_slots(pairs, path: str = fw_path):
+        """One verify_flash run (one connect) for all (name, offset_hex) pairs."""
+        names = "+".join(n for n, _ in pairs)
+        print(f"🔍 Verifying {names} @ {', '.join(o for _, o in pairs)} (baud {verify_baud}) ...")
+        with span(f"verify {names}", baud=verify_baud) as s:
+            args = [a for _, o in pairs for a in (o, path)]
+            rc = s["rc"] = run_esptool(conn + ["--baud", str(verify_baud), "verify_flash"] + args, silent=False)
+        if rc != 0:
+            die(f"Verify failed for {names}.", kind=VerifyError)
+
+    # Dual: flash BOTH slots so whichever is active boots the new firmware
+    for name, offset_hex in slots:
+        write_slot(name, offset_hex)
+
+    # Verify at reliable baud (on-device MD5 only; sample / full readback need the session engine)
+    verify_slots(slots)
+
+    if single_slot:
+        index = [n for n, _, _ in layout["slots"]].index(single_slot)
+        ota_path = run_file("otadata", f"-{single_slot}.bin")
+        try:
+            with open(ota_path, "wb") as f:
+                f.write(otadata_image(index, layout["otadata_size"]))
+            print(f"🧭 otadata -> boot {single_slot}")
+            write_slot("otadata", otadata, ota_path)
+            verify_slots([("otadata", otadata)], ota_path)
+        finally:
+            remove_quietly(ota_path)
+        print(f"\n✅ Flash successful ({single_slot} written + verified, otadata selects it).")
+    else:
+        print("\n✅ Flash successful (both slots written + verified).")
+    if seen.get("mac"):
+        remember_fingerprint(port, seen)
     print("🔌 Unplug USB, wait 5–10s, plug back in.\n")
 
 # -------------------- entry --------------------
 
-def main(firmware_override=None):
+def warm_up(cfg=None, firmware_override=None) -> dict:
+    """
+    The slow first-use work, done ahead of time and quietly: pyserial, esptool,
+    config, firmware image (checked + deflated or mapped). Runs in a background
+    thread (GUI: while the window is already up). Never raises; returns cfg.
+    """
+    with startup.step("import pyserial"):
+        try:
+            import serial.tools.list_ports  # noqa: F401
+        except Exception:
+            pass
+    with startup.step("import esptool"):
+        try:
+            import esptool  # noqa: F401
+        except Exception:
+            pass
+    if cfg is None:
+        with startup.step("load config"):
+            cfg = prepare_cfg()
+    fw_path = find_firmware(cfg, firmware_override)
+    if fw_path:
+        try:
+            with startup.step("check image"):
+                from autogen_flash_bundle import is_bundle, open_bundle
+                if is_bundle(fw_path):
+                    open_bundle(fw_path).verify()  # memoized for check_firmware()
+                elif cfg.get("validate_image", True):
+                    from autogen_flash_image import validate_image
+                    validate_image(fw_path)  # result memoized for check_firmware()
+            with startup.step("load firmware"):
+                from autogen_flash_cache import load_firmware
+                load_firmware(fw_path)
+        except Exception:
+            pass
+    return cfg
+
+def warm_up_in_background(cfg=None, firmware_override=None):
+    import threading
+    t = threading.Thread(target=warm_up, args=(cfg, firmware_override), name="warm-up", daemon=True)
+    t.start()
+    return t
+
+def parse_cli(argv):
+    """tool [firmware.bin] [--timings] [--trace FILE] [--startup-profile] [--watch] | tool stats ... (unknown args, e.g. macOS -psn_*, are ignored)."""
+    import argparse
+    ap = argparse.ArgumentParser(prog="autogen_flash", add_help=True)
+    ap.add_argument("firmware", nargs="?")
+    ap.add_argument("--timings", action="store_true", help="print a per-phase timing table at the end")
+    ap.add_argument("--trace", metavar="FILE", help="write a Chrome trace (JSON) of all phases")
+    ap.add_argument("--startup-profile", action="store_true",
+                    help="report import / init times up to ready-to-flash, then exit (nothing is flashed)")
+    ap.add_argument("--watch", action="store_true",
+                    help="stay running and flash every controller as soon as it is plugged in")
+    args, _ = ap.parse_known_args(argv)
+    return args
+
+def run(firmware_override=None, argv=None, port=None):
+    """
+    One tool run (GUI: Start Flash). Failures raise FlashError, reported
+    already; stats / watch return their exit code.
+    """
+    startup.mark("import autogen_flash")
     print("======================================")
     print("   AutoGen X USB Flash Tool")
     print("======================================\n")
 
-    cfg = load_cfg()
-    if "baud_try" not in cfg:
-        cfg["baud_try"] = [cfg.get("baud", 921600), 460800, 230400, 115200]
+    with startup.step("load config"):
+        cfg = prepare_cfg()
 
-    # Support drag-drop / CLI: tool <firmware.bin>
-    if firmware_override is None and len(sys.argv) >= 2:
-        firmware_override = sys.argv[1]
+    # Support drag-drop / CLI: tool <firmware.bin> [--timings] [--trace FILE]
+    if argv is None:
+        argv = sys.argv[1:] if firmware_override is None else []
+    if argv[:1] == ["stats"]:
+        from autogen_flash_metrics import main as metrics_main
+        return metrics_main(argv)
+    args = parse_cli(argv)
+    if firmware_override is None:
+        firmware_override = args.firmware
+    show_timings = args.timings or bool(cfg.get("timings", False))
+    trace_file = args.trace or cfg.get("trace_file") or None
 
-    flash(cfg, firmware_override=firmware_override)
+    if args.startup_profile:
+        warm_up(cfg, firmware_override)
+        with startup.step("list ports"):
+            list_port_info()
+        print(startup.report() + f"\n  ready after {startup.elapsed() * 1000:.0f} ms\n")
+        return
+
+    if args.watch:
+        from autogen_flash_watch import main as watch_main
+        return watch_main([firmware_override] if firmware_override else [])
+
+    # Hand the job to the local flash daemon if one is running (everything is warm there).
+    # Not for --timings / --trace: the daemon's phases can't be traced from here
+    if cfg.get("use_daemon", True) and not (show_timings or trace_file):
+        try:
+            from autogen_flash_daemon import flash_via_daemon, daemon_port
+            fw_path = resolve_firmware_path(cfg, firmware_override)
+            if flash_via_daemon(fw_path, port, daemon_port_=daemon_port(cfg), cfg=cfg):
+                return
+        except ImportError:
+            pass
+
+    import autogen_flash_trace
+    timings = autogen_flash_trace.start("flash") if (show_timings or trace_file) else None
+    # esptool import + firmware prep overlap with the port search instead of following it
+    warm_up_in_background(cfg, firmware_override)
+    try:
+        # Same core as the async API: the flash runs on its own thread, its output is relayed here
+        import asyncio
+        from autogen_flash_async import flash_device
+        from autogen_flash_events import relay
+
+        def echo(ev):
+            if ev["type"] == "log":
+                print(ev["text"], file=sys.stderr if ev["stream"] == "stderr" else sys.stdout, flush=True)
+            else:
+                relay(ev)  # progress for this thread's capture (GUI)
+
+        # Ctrl+C cancels the task: the flash thread stops at its next block before this returns
+        asyncio.run(flash_device(port, firmware_override, cfg, on_event=echo))
+    finally:
+        if timings:
+            autogen_flash_trace.stop()
+            if show_timings:
+                print("\n⏱️ Timings (seconds)\n" + timings.summary() + "\n")
+            if trace_file:
+                try:
+                    timings.export(trace_file)
+                    print(f"🧾 Trace written to {trace_file}")
+                except Exception as ex:
+                    print(f"⚠️ Could not write trace {trace_file}: {ex}")
 
     try:
         # GUI build: disabled interactive wait
@@ -349,5 +1155,25 @@ def main(firmware_override=None):
     except Exception:
         pass
 
+def main(firmware_override=None, argv=None, port=None):
+    """CLI entry: run() with a FlashError / Ctrl+C turned into the exit code."""
+    try:
+        rc = run(firmware_override, argv, port)
+    except FlashError:
+        rc = 1  # die() already printed the ❌ reason
+    except KeyboardInterrupt:
+        print("\n🛑 Cancelled.", file=sys.stderr)
+        rc = 130
+    if rc:
+        raise SystemExit(rc)
+
 if __name__ == "__main__":
-    main()
+    if is_frozen():
+        # --watch starts spawn workers: in the EXE they re-run this script and must
+        # turn into pool workers here, not into another tool run
+        import multiprocessing
+        multiprocessing.freeze_support()
+    # Started as a script this file is __main__; the other modules import it as
+    # autogen_flash. Run that one instance (one FlashError, one port cache).
+    import autogen_flash
+    autogen_flash.main()
@@ -0,0 +1,183 @@
+# ============================================================
+# AutoGen X async flashing API
+# - `await flash_device(port, image)`: one controller, awaitable from an
+#   event loop; flash_many() drives dozens of them from the same loop
+# - Each device's esptool link runs on its own worker thread (esptool /
+#   pyserial I/O is blocking); the event loop itself never waits on a port
+# - Failures raise typed exceptions (FlashError and subclasses from
+#   autogen_flash), never SystemExit
+# - `async for ev in job`: the job's log lines and progress events
+#   (autogen_flash_events format, log lines as {"type": "log"}; the
+#   job's thread runs under autogen_flash_events.capture_output)
+# - Cancelling the awaiting task (Ctrl+C in asyncio.run) or job.cancel()
+#   stops the worker at its next block; flash_device() returns only once
+#   the port is released
+#
+#   job = start_flash("/dev/ttyUSB0", "firmware.bin")
+#   async for ev in job:
+#       ...
+#   result = await job          # {"port", "ok", "seconds", "device"}
+#
+# autogen_flash.run() (CLI + GUI) flashes through flash_device().
+# Frozen Windows builds run esptool in-process for the subprocess engine and
+# redirect the process-wide stdout meanwhile: flash several devices at once
+# there with "engine": "session".
+# ============================================================
+
+import asyncio
+import sys
+import threading
+import time
+
+import autogen_flash
+from autogen_flash import (ConfigError, DeviceNotFoundError, FirmwareError, FlashCancelled,  # noqa: F401 (re-exported)
+                           FlashError, VerifyError, WriteError)
+from autogen_flash_events import cancel_scope, capture_output  # noqa: F401 (capture_output re-exported)
+
+
+# -------------------- jobs --------------------
+
+class FlashJob:
+    """
+    One controller being flashed. `async for ev in job` streams its events
+    (ending with {"type": "done"} or {"type": "error"}); `await job` returns the
+    result dict or raises the FlashError.
+    """
+
+    def __init__(self, port, image, cfg, loop):
+        self.port = port
+        self.image = image
+        self.cfg = cfg
+        self.loop = loop
+        self.queue = asyncio.Queue()
+        self.future = loop.create_future()
+        self.stopped = asyncio.Event()  # the worker thread is done with the port
+        self.cancel_event = threading.Event()
+        self.state = "queued"  # queued / running / done / error / cancelled
+
+    def push(self, ev: dict):
+        """Thread-safe: queue an event for the async iterator."""
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, ev)
+
+    def cancel(self):
+        """Thread-safe: stop the flash at its next block (await job then raises CancelledError)."""
+        self.cancel_event.set()
+
+    def run(self):
+        """Worker thread body: the blocking flash sequence for this port."""
+        self.state = "running"
+        t0 = time.monotonic()
+        result, error = None, None
+        try:
+            with capture_output(self.push), cancel_scope(self.cancel_event):
+                autogen_flash.flash(self.cfg, firmware_override=self.image, port=self.port)
+            port = self.port or autogen_flash._CACHED_PORT
+            result = {"port": port, "ok": True, "seconds": round(time.monotonic() - t0, 2),
+                      "device": autogen_flash.device_fingerprint(port) if port else {}}
+        except BaseException as ex:
+            error = ex  # FlashError: die() already printed the ❌ line
+        self.state = "cancelled" if isinstance(error, FlashCancelled) else "error" if error else "done"
+        self.push({"type": "error" if error else "done", "port": self.port, "text": str(error or "")})
+        self.push(None)  # end of the event stream
+        self.loop.call_soon_threadsafe(self._settle, result, error)
+
+    def _settle(self, result, error):
+        self.stopped.set()
+        if self.future.done():
+            return
+        if isinstance(error, FlashCancelled):
+            self.future.cancel()
+        elif error is not None:
+            self.future.set_exception(error)
+        else:
+            self.future.set_result(result)
+
+    async def events(self):
+        while True:
+            ev = await self.queue.get()
+            if ev is None:
+                return
+            yield ev
+
+    def __aiter__(self):
+        return self.events()
+
+    def __await__(self):
+        # shielded: a cancelled awaiter must not settle the job while its thread still owns the port
+        return asyncio.shield(self.future).__await__()
+
+
+def start_flash(port: str = None, image: str = None, cfg: dict = None) -> FlashJob:
+    """
+    Start flashing `image` (default: from the config) to `port` (None: auto-detect)
+    and return its FlashJob right away. Call from a running event loop.
+    """
+    loop = asyncio.get_running_loop()
+    job = FlashJob(port, image, cfg if cfg is not None else autogen_flash.prepare_cfg(), loop)
+    threading.Thread(target=job.run, name=f"flash {port or 'auto'}", daemon=True).start()
+    return job
+
+
+async def flash_device(port: str = None, image: str = None, cfg: dict = None, on_event=None) -> dict:
+    """Flash one controller; on_event(ev) sees every event. Returns the result, raises FlashError."""
+    job = start_flash(port, image, cfg)
+    try:
+        if on_event is not None:
+            async for ev in job:
+                on_event(ev)
+        return await job
+    except asyncio.CancelledError:
+        job.cancel()
+        await job.stopped.wait()  # the worker stops at its next block; the port is free after this
+        raise
+
+
+async def flash_many(ports, image: str = None, cfg: dict = None, limit: int = None, on_event=None) -> list:
+    """
+    Flash every port concurrently (at most `limit` at a time). Returns one entry
+    per port, in order: the result dict or the exception it failed with.
+    on_event(port, ev) sees every event of every job.
+    """
+    cfg = cfg if cfg is not None else autogen_flash.prepare_cfg()
+    gate = asyncio.Semaphore(limit or len(ports) or 1)
+
+    async def one(port):
+        async with gate:
+            return await flash_device(port, image, cfg, on_event and (lambda ev: on_event(port, ev)))
+
+    return await asyncio.gather(*(one(p) for p in ports), return_exceptions=True)
+
+
+# -------------------- CLI --------------------
+
+def main(argv=None) -> int:
+    """python autogen_flash_async.py [firmware] --port P [--port P ...]: flash them all from one loop."""
+    import argparse
+    ap = argparse.ArgumentParser(description="AutoGen X: flash several controllers concurrently")
+    ap.add_argument("firmware", nargs="?", help="firmware .bin / .agx (default: from version.json)")
+    ap.add_argument("--port", action="append", required=True, help="serial port (repeat for more devices)")
+    ap.add_argument("--limit", type=int, help="at most this many at the same time")
+    args = ap.parse_args(argv)
+
+    def show(port, ev):
+        if ev["type"] == "log" and ev["text"].strip():
+            print(f"[{port}] {ev['text']}", flush=True)
+
+    t0 = time.monotonic()
+    try:
+        results = asyncio.run(flash_many(args.port, args.firmware, limit=args.limit, on_event=show))
+    except KeyboardInterrupt:
+        print("\n🛑 Cancelled (every port released).")
+        return 130
+    print()
+    for port, r in zip(args.port, results):
+        if isinstance(r, BaseException):
+            print(f"❌ {port}: {type(r).__name__}: {r}")
+        else:
+            print(f"✅ {port}: {r['seconds']:.1f}s")
+    print(f"⏱️ {len(args.port)} device(s) in {time.monotonic() - t0:.1f}s")
+    return 0 if all(not isinstance(r, BaseException) for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+# ============================================================
+# AutoGen X end-to-end benchmark (simulated device, no hardware)
+# - Full runs of the real flow: probe, otadata erase, app0 + app1
+#   write, verify — against autogen_flash_sim.SimulatedESP on a pty
+# - Matrix: firmware sizes x baud ladders x engines x OTA modes (x repeats)
+# - Per-phase seconds from autogen_flash_trace, then the simulated
+#   flash is checked byte for byte (--erase: also that nothing else
+#   is left on it)
+#
+#   python autogen_flash_bench.py
+#   python autogen_flash_bench.py --sizes 512K,1M --ladder 921600,460800 --ladder 460800 \
+#       --max-baud 460800 --latency 0.004 --engine both --ota both --json bench.json
+# ============================================================
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+DEFAULT_LADDER = [921600, 460800, 230400, 115200]
+
+# Partition tables written to the simulated flash (name, type, subtype, offset, size), Arduino-ESP32 layouts
+LAYOUTS = {
+    "default": [("nvs", 1, 0x02, 0x9000, 0x5000), ("otadata", 1, 0x00, 0xE000, 0x2000),
+                ("app0", 0, 0x10, 0x10000, 0x140000), ("app1", 0, 0x11, 0x150000, 0x140000),
+                ("spiffs", 1, 0x82, 0x290000, 0x170000)],
+    "min-spiffs": [("nvs", 1, 0x02, 0x9000, 0x5000), ("otadata", 1, 0x00, 0xE000, 0x2000),
+                   ("app0", 0, 0x10, 0x10000, 0x1E0000), ("app1", 0, 0x11, 0x1F0000, 0x1E0000),
+                   ("spiffs", 1, 0x82, 0x3D0000, 0x30000)],
+}
+
+def parse_size(text: str) -> int:
+    """'512K', '1M', '1.25M', '0x140000' or plain bytes."""
+    t = text.strip().upper()
+    if t.startswith("0X"):
+        return int(t, 16)
+    mult = {"K": 1024, "M": 1024 * 1024}.get(t[-1:], 1)
+    return int(float(t.rstrip("KM")) * mult)
+
+
+def make_firmware(size: int, seed: int = 1) -> bytes:
+    """
+    Deterministic stand-in ESP32 app image (valid header, segments,
+    checksum and SHA-256, so it passes the pre-flight check) of about
+    `size` bytes that deflates roughly like a real one (~70 %): random
+    code-like runs mixed with zero padding and tables.
+    """
+    import hashlib
+    import struct
+    from autogen_flash_image import _xor_bytes
+
+    rng = random.Random(seed)
+    body = bytearray()
+    while len(body) < size:
+        r = rng.random()
+        if r < 0.55:
+            body += rng.randbytes(rng.randint(64, 512))
+        elif r < 0.8:
+            body += bytes(rng.randint(16, 256))
+        else:
+            body += rng.randbytes(4) * rng.randint(8, 64)
+
+    nseg = 4
+    overhead = 24 + 8 * nseg + 16 + 32
+    payload = max(4 * nseg, (size - overhead) // (4 * nseg) * 4 * nseg)
+    seg_len = payload // nseg
+    img = bytearray(struct.pack("<BBBBI", 0xE9, nseg, 2, 0x20, 0x400D0000))
+    img += struct.pack("<B3sHBHH4sB", 0xEE, bytes(3), 0, 0, 0, 0xFFFF, bytes(4), 1)
+    checksum = 0xEF
+    for i in range(nseg):
+        seg = bytes(body[i * seg_len:(i + 1) * seg_len])
+        img += struct.pack("<II", 0x3F400020 + i * 0x100000, seg_len) + seg
+        checksum ^= _xor_bytes(seg)
+    img += bytes(15 - len(img) % 16) + bytes([checksum])
+    img += hashlib.sha256(img).digest()
+    return bytes(img)
+
+
+def used_device(sim, parts, seed: int = 1):
+    """Content of a controller that has been in use: bootloader, NVS, an older app in both slots, some SPIFFS."""
+    rnd = random.Random(seed)
+    by_name = {p["name"]: p for p in parts}
+    fill = [(0x1000, 0x5000)]
+    if "nvs" in by_name:
+        fill.append((by_name["nvs"]["offset"], 0x3000))
+    for name in ("app0", "app1"):
+        if name in by_name:
+            fill.append((by_name[name]["offset"], min(by_name[name]["size"], 0xC8000)))
+    if "spiffs" in by_name:
+        fill.append((by_name["spiffs"]["offset"], 0x24000))
+    for offset, size in fill:
+        sim.flash[offset:offset + size] = rnd.randbytes(size)
+
+
+def run_one(fw_path: str, data: bytes, ladder, engine: str, sim_opts: dict, verbose: bool = False,
+            ota_mode: str = "dual", layout: str = "default", erase: bool = False, verify: str = "md5") -> dict:
+    """One full flash run against a fresh simulated device. Returns a result row."""
+    import autogen_flash
+    import autogen_flash_trace
+    from autogen_flash_partitions import PARTITION_TABLE_OFFSET, build_partition_table, ota_layout
+    from autogen_flash_sim import SimulatedESP
+
+    parts = [{"name": n, "type": t, "subtype": st, "offset": o, "size": sz} for n, t, st, o, sz in LAYOUTS[layout]]
+    expect = ota_layout(parts)
+    table = build_partition_table(parts)
+
+    cfg = dict(autogen_flash.prepare_cfg(), baud_try=list(ladder), engine=engine, erase=erase, delta=False,
+               connect_mode="no-reset", use_daemon=False, ota_mode=ota_mode, ota_slot="app0", verify=verify)
+    row = {"size": len(data), "ladder": list(ladder), "engine": engine, "ota": ota_mode, "layout": layout,
+           "ok": False, "error": ""}
+    sink = sys.stdout if verbose else io.StringIO()
+
+    with SimulatedESP(**sim_opts) as sim:
+        if erase:
+            used_device(sim, parts)
+        sim.flash[PARTITION_TABLE_OFFSET:PARTITION_TABLE_OFFSET + len(table)] = table
+        timings = autogen_flash_trace.start("bench")
+        try:
+            with contextlib.redirect_stdout(sink), contextlib.redirect_stderr(sink):
+                with autogen_flash_trace.span("probe"):
+                    found = autogen_flash.probe_esp(sim.port, timeout=8)
+                if not found:
+                    autogen_flash.die(f"Probe did not find the simulated device on {sim.port}",
+                                      kind=autogen_flash.DeviceNotFoundError)
+                autogen_flash.flash(cfg, firmware_override=fw_path, port=sim.port)
+            row["ok"] = True
+        except autogen_flash.FlashError as ex:
+            row["error"] = str(ex)
+        except Exception as ex:
+            row["error"] = f"{type(ex).__name__}: {ex}"
+        finally:
+            autogen_flash_trace.stop()
+
+        if row["ok"]:
+            n = len(data)
+            slots = [o for _, o, _ in expect["slots"][:1 if ota_mode == "single" else 2]]
+            otadata = sim.flash[expect["otadata"]:expect["otadata"] + expect["otadata_size"]]
+            expected = autogen_flash.otadata_image(0, len(otadata)) if ota_mode == "single" else b"\xff" * len(otadata)
+            if any(sim.flash[o:o + n] != data for o in slots):
+                row["ok"], row["error"] = False, "flash content mismatch"
+            elif otadata != expected:
+                row["ok"], row["error"] = False, "otadata wrong"
+            elif erase:
+                # Clean slate: everything outside the written slots / otadata reads 0xFF
+                kept = sorted([(o, o + n) for o in slots] + [(expect["otadata"], expect["otadata"] + len(otadata))])
+                pos = 0
+                for start, end in kept + [(len(sim.flash), len(sim.flash))]:
+                    if sim.flash[pos:start].count(0xFF) != start - pos:
+                        row["ok"], row["error"] = False, f"not erased between {pos:#x} and {start:#x}"
+                        break
+                    pos = max(pos, end)
+        row["sim"] = {k: v for k, v in sim.stats.items() if k != "commands"}
+
+    for col, seconds in autogen_flash_trace.phase_seconds(timings.spans).items():
+        row[col] = round(seconds, 3)
+    row["total"] = round(timings.total(), 3)
+    bauds = [s["args"].get("baud") for s in timings.spans if s["name"].startswith("write") and s["args"].get("baud")]
+    row["baud"] = bauds[-1] if bauds else None
+    nslots = 1 if ota_mode == "single" else 2
+    row["kbps"] = round(nslots * len(data) * 8 / 1000 / row["write"], 1) if row["ok"] and row["write"] else None
+    return row
+
+
+def run_matrix(sizes, ladders, engines, repeat: int = 1, sim_opts: dict = None, verbose: bool = False,
+               seed: int = 1, ota_modes=("dual",), layout: str = "default", bundle: bool = False,
+               erase: bool = False, verify: str = "md5") -> list:
+    results = []
+    with tempfile.TemporaryDirectory(prefix="autogenx-bench-") as tmp:
+        # Own cache folder: learned bauds / firmware cache of this station stay untouched
+        os.environ["AUTOGENX_CACHE_DIR"] = os.path.join(tmp, "cache")
+        for size in sizes:
+            data = make_firmware(size, seed)
+            fw_path = os.path.join(tmp, f"firmware_{size}.bin")
+            with open(fw_path, "wb") as f:
+                f.write(data)
+            if bundle:
+                # Release bundle with the same partition table the simulated device carries
+                from autogen_flash_bundle import build_bundle
+                parts = [{"name": n, "type": t, "subtype": st, "offset": o, "size": sz} for n, t, st, o, sz in LAYOUTS[layout]]
+                fw_path = fw_path[:-4] + ".agx"
+                build_bundle(fw_path[:-4] + ".bin", fw_path, {"name": "bench", "version": str(size)}, parts)
+            for ladder in ladders:
+                for engine in engines:
+                    for ota in ota_modes:
+                        for i in range(repeat):
+                            print(f"▶️ {size // 1024}KB  ladder={','.join(map(str, ladder))}  engine={engine}  ota={ota}"
+                                  f"  run {i + 1}/{repeat} ...", flush=True)
+                            t = time.monotonic()
+                            row = run_one(fw_path, data, ladder, engine, dict(sim_opts or {}), verbose, ota, layout, erase, verify)
+                            row["run"] = i + 1
+                            results.append(row)
+                            state = "ok" if row["ok"] else f"FAILED: {row['error']}"
+                            print(f"   {time.monotonic() - t:.1f}s  {state}")
+    return results
+
+
+def print_report(results):
+    cols = ("size", "engine", "ota", "ladder", "baud", "probe", "connect", "ptable", "erase", "write", "verify", "total",
+            "kbps", "ok")
+    print()
+    print(f"{'size':>7} {'engine':<10} {'ota':<6} {'ladder':<24} {'baud':>7} {'probe':>6} {'conn':>6} {'ptable':>6} "
+          f"{'erase':>6} {'write':>7} {'verify':>6} {'total':>7} {'kbit/s':>7}  ok")
+    print("-" * 126)
+    for r in results:
+        d = {c: r.get(c) for c in cols}
+        ladder = ",".join(str(b // 1000) + "k" for b in d["ladder"])
+        print(f"{d['size'] // 1024:>6}K {d['engine']:<10} {d['ota']:<6} {ladder:<24} {d['baud'] or '-':>7} {d['probe']:>6.2f} "
+              f"{d['connect']:>6.2f} {d['ptable']:>6.2f} {d['erase']:>6.2f} {d['write']:>7.2f} {d['verify']:>6.2f} {d['total']:>7.2f} "
+              f"{d['kbps'] or '-':>7}  {'✅' if d['ok'] else '❌ ' + r['error']}")
+    print()
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="AutoGen X end-to-end flash benchmark on a simulated ESP32")
+    ap.add_argument("--sizes", default="256K,1M", help="firmware sizes, comma separated (default 256K,1M)")
+    ap.add_argument("--ladder", action="append", metavar="B1,B2,...",
+                    help="baud ladder to test (repeatable; default 921600,460800,230400,115200)")
+    ap.add_argument("--engine", choices=["session", "subprocess", "both"], default="session")
+    ap.add_argument("--ota", choices=["dual", "single", "both"], default="dual", help="OTA slot mode(s) to run")
+    ap.add_argument("--layout", choices=sorted(LAYOUTS), default="default",
+                    help="partition table on the simulated device")
+    ap.add_argument("--bundle", action="store_true", help="flash from a .agx release bundle instead of the .bin")
+    ap.add_argument("--erase", action="store_true",
+                    help='"erase": true on a used device (old app, NVS, SPIFFS); checks the clean slate')
+    ap.add_argument("--verify", choices=["md5", "sample", "full"], default="md5", help="verify strategy (session engine)")
+    ap.add_argument("--repeat", type=int, default=1)
+    ap.add_argument("--max-baud", type=int, help="simulated adapter ceiling (faster rates lose every frame)")
+    ap.add_argument("--latency", type=float, default=0.002, help="seconds per reply (default 0.002)")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="probability a host frame is lost")
+    ap.add_argument("--stall-at", type=int, help="stall the device once after this many bytes written")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--json", metavar="FILE", help="write all result rows as JSON")
+    ap.add_argument("--verbose", action="store_true", help="show the flash tool output of every run")
+    args = ap.parse_args(argv)
+
+    if not hasattr(os, "openpty"):
+        print("❌ The simulator needs a pseudo-terminal (Linux / macOS).")
+        return 2
+
+    sizes = [parse_size(s) for s in args.sizes.split(",") if s.strip()]
+    ladders = [[int(b) for b in l.split(",")] for l in (args.ladder or [])] or [DEFAULT_LADDER]
+    engines = ["session", "subprocess"] if args.engine == "both" else [args.engine]
+    ota_modes = ["dual", "single"] if args.ota == "both" else [args.ota]
+    sim_opts = {"max_baud": args.max_baud, "latency": args.latency, "error_rate": args.error_rate,
+                "stall_at": args.stall_at, "seed": args.seed}
+
+    results = run_matrix(sizes, ladders, engines, args.repeat, sim_opts, args.verbose, args.seed, ota_modes, args.layout,
+                         args.bundle, args.erase, args.verify)
+    print_report(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"sim": sim_opts, "results": results}, f, indent=1)
+        print(f"🧾 Results written to {args.json}")
+    return 0 if all(r["ok"] for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+# ============================================================
+# AutoGen X firmware bundle (.agx)
+# - One release file instead of firmware.bin + version.json: app image,
+#   its deflate stream, per-block MD5s, target partition layout and a
+#   manifest (name, version, chip, SHA-256, config)
+# - A plain zip with every member STORED: members are contiguous in the
+#   file, so the tool mmaps the bundle and flashes straight from slices
+#   of it (no unpacking, no compression or hashing on the station)
+# - Built once on the release machine:
+#
+#   python autogen_flash_bundle.py build firmware.bin --config version.json \
+#       --partitions partitions.bin -o firmware.agx
+#   python autogen_flash_bundle.py info firmware.agx --verify
+#
+# Members: manifest.json, app.bin, app.deflate
+# ============================================================
+
+import hashlib
+import json
+import mmap
+import os
+import sys
+import time
+import zlib
+
+BUNDLE_NAME = "firmware.agx"
+FORMAT = 1
+ZIP_MAGIC = b"PK\x03\x04"
+RELEASE_KEYS = ("name", "version", "chip")
+
+# In-process memo: (path, size, mtime_ns) -> Bundle (keeps its mapping alive)
+_BUNDLES = {}
+
+
+class BundleError(Exception):
+    """Not a usable firmware bundle."""
+
+
+def is_bundle(path: str) -> bool:
+    """True for a zip container (an app image starts with 0xE9, never 'PK')."""
+    try:
+        with open(path, "rb") as f:
+            return f.read(4) == ZIP_MAGIC
+    except OSError:
+        return False
+
+
+class Bundle:
+    """An opened .agx: manifest plus zero-copy views of app.bin / app.deflate."""
+
+    def __init__(self, path: str):
+        import zipfile  # here, not at import: load_cfg() imports this module on every start
+        self.path = os.path.abspath(path)
+        try:
+            with open(self.path, "rb") as f:
+                self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            members = {}
+            with zipfile.ZipFile(self._mm) as zf:
+                for zi in zf.infolist():
+                    if zi.compress_type != zipfile.ZIP_STORED:
+                        raise BundleError(f"member {zi.filename} is compressed (bundles must be STORED)")
+                    # Local header: 30 bytes + name + extra, then the data
+                    hdr = self._mm[zi.header_offset:zi.header_offset + 30]
+                    start = zi.header_offset + 30 + int.from_bytes(hdr[26:28], "little") + int.from_bytes(hdr[28:30], "little")
+                    members[zi.filename] = memoryview(self._mm)[start:start + zi.file_size]
+        except BundleError:
+            raise
+        except Exception as ex:
+            raise BundleError(f"cannot open bundle {path}: {ex}")
+
+        try:
+            self.manifest = json.loads(bytes(members["manifest.json"]))
+            self.data = members["app.bin"]
+            self.compressed = members["app.deflate"]
+        except Exception as ex:
+            raise BundleError(f"bundle {path} is incomplete: {ex}")
+        if self.manifest.get("format") != FORMAT:
+            raise BundleError(f"bundle format {self.manifest.get('format')} not supported (expected {FORMAT})")
+        if len(self.data) != self.manifest["size"] or len(self.compressed) != self.manifest["compressed_size"]:
+            raise BundleError("bundle member sizes do not match its manifest (truncated?)")
+        self.verified = False  # verify() passed on this mapping
+
+    @property
+    def config(self) -> dict:
+        """version.json the release was built with."""
+        return dict(self.manifest.get("config") or {})
+
+    def release(self) -> dict:
+        return {k: self.manifest[k] for k in RELEASE_KEYS if self.manifest.get(k)}
+
+    def describe(self) -> str:
+        m = self.manifest
+        return f"{m.get('name', '?')} {m.get('version', '')} for {m.get('chip')}, {m['size']} bytes, sha256 {m['sha256'][:12]}"
+
+    def layout(self):
+        """OTA layout of the partition table the release targets (None if the bundle has none)."""
+        if not self.manifest.get("partitions"):
+            return None
+        from autogen_flash_partitions import ota_layout
+        return ota_layout(self.manifest["partitions"], source="bundle")
+
+    def image(self):
+        """FirmwareImage over the mapped members (nothing recomputed)."""
+        from autogen_flash_cache import FirmwareImage
+        m = self.manifest
+        img = FirmwareImage(self.path, self.data, m["sha256"], m["md5"], self.compressed,
+                            {int(k): v for k, v in m["block_md5s"].items()})
+        img.layout = self.layout()
+        return img
+
+    def app_path(self) -> str:
+        """The app image as a plain file for esptool (subprocess engine): extracted once per SHA-256 into the cache."""
+        from autogen_flash_cache import _write_atomic, cache_dir
+        p = os.path.join(cache_dir("firmware", self.manifest["sha256"]), "image.bin")
+        if not (os.path.exists(p) and os.path.getsize(p) == len(self.data)):
+            _write_atomic(p, self.data)
+        return p
+
+    def verify(self):
+        """Full integrity check: members against the manifest hashes (done once per mapping before flashing)."""
+        from autogen_flash_cache import key_lock
+        with key_lock(("bundle", self.path)):  # the warm-up thread may be at it already
+            if not self.verified:
+                self._verify()
+
+    def _verify(self):
+        m = self.manifest
+        if hashlib.sha256(self.data).hexdigest() != m["sha256"]:
+            raise BundleError("app.bin does not match the manifest SHA-256")
+        if zlib.decompress(self.compressed) != self.data:
+            raise BundleError("app.deflate does not inflate to app.bin")
+        for bs, md5s in m["block_md5s"].items():
+            bs = int(bs)
+            if [hashlib.md5(self.data[i:i + bs]).hexdigest() for i in range(0, len(self.data), bs)] != md5s:
+                raise BundleError(f"per-block MD5s ({bs} bytes) do not match app.bin")
+        self.verified = True
+
+
+def open_bundle(path: str) -> Bundle:
+    """Bundle for path, mapped once per file version in this process."""
+    path = os.path.abspath(path)
+    st = os.stat(path)
+    key = (path, st.st_size, st.st_mtime_ns)
+    if key not in _BUNDLES:
+        for old in [k for k in _BUNDLES if k[0] == path]:
+            del _BUNDLES[old]  # replaced on disk
+        _BUNDLES[key] = Bundle(path)
+    return _BUNDLES[key]
+
+
+def find_bundle(dirs, name: str = BUNDLE_NAME):
+    """First bundle called `name` in dirs, None if there is none (or it is unusable)."""
+    for d in dirs:
+        p = os.path.join(d, name)
+        if os.path.exists(p) and is_bundle(p):
+            try:
+                return open_bundle(p)
+            except BundleError as ex:
+                print(f"⚠️ Ignoring {p}: {ex}")
+    return None
+
+
+# -------------------- build (release machine) --------------------
+
+def build_bundle(fw_path: str, out_path: str, config: dict = None, partitions=None) -> dict:
+    """Write a bundle for the app image at fw_path. Returns its manifest. Raises ImageError / BundleError."""
+    import zipfile
+    from autogen_flash_cache import BLOCK_SIZES, _block_md5s
+    from autogen_flash_image import parse_image
+
+    with open(fw_path, "rb") as f:
+        data = f.read()
+    info = parse_image(data)
+    config = dict(config or {})
+    chip = config.get("chip") or info["chip"]
+    if chip.upper() != info["chip"].upper():
+        raise BundleError(f"image is built for {info['chip']}, config says {chip}")
+    comp = zlib.compress(data, 9)
+
+    manifest = {
+        "format": FORMAT,
+        "name": config.get("name", "AutoGen X"),
+        "version": config.get("version", ""),
+        "chip": info["chip"],
+        "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "source": os.path.basename(fw_path),
+        "size": len(data),
+        "sha256": hashlib.sha256(data).hexdigest(),
+        "md5": hashlib.md5(data).hexdigest(),
+        "compressed_size": len(comp),
+        "block_md5s": {str(bs): _block_md5s(data, bs) for bs in BLOCK_SIZES},
+        "image": dict(info, sha256=hashlib.sha256(data).hexdigest()),
+        "partitions": partitions,
+        "config": {k: v for k, v in config.items() if k != "firmware"},
+    }
+    if partitions:
+        from autogen_flash_partitions import ota_layout
+        slot = min(size for _, _, size in ota_layout(partitions)["slots"])
+        if len(data) > slot:
+            raise BundleError(f"image ({len(data)} bytes) does not fit the {slot:#x} app slot of its partition table")
+
+    tmp = f"{out_path}.{os.getpid()}.tmp"
+    with zipfile.ZipFile(tmp, "w", zipfile.ZIP_STORED) as zf:
+        zf.writestr("manifest.json", json.dumps(manifest, indent=1))
+        zf.writestr("app.bin", data)
+        zf.writestr("app.deflate", comp)
+    os.replace(tmp, out_path)
+    return manifest
+
+
+def main(argv=None) -> int:
+    import argparse
+    ap = argparse.ArgumentParser(description="AutoGen X firmware bundle (.agx) tool")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build", help="build a bundle from an app image")
+    b.add_argument("firmware", help="app image (.bin)")
+    b.add_argument("-o", "--output", default=BUNDLE_NAME)
+    b.add_argument("--config", metavar="version.json", help="tool config to ship with the release")
+    b.add_argument("--partitions", metavar="partitions.bin", help="partition table binary the release targets")
+    b.add_argument("--name")
+    b.add_argument("--version")
+    i = sub.add_parser("info", help="show a bundle's manifest")
+    i.add_argument("bundle")
+    i.add_argument("--verify", action="store_true", help="re-hash everything in the bundle")
+    args = ap.parse_args(argv)
+
+    from autogen_flash_image import ImageError
+    from autogen_flash_partitions import PartitionError
+    try:
+        if args.cmd == "build":
+            config = {}
+            if args.config:
+                with open(args.config, "r", encoding="utf-8") as f:
+                    config = json.load(f)
+            config.update({k: v for k, v in (("name", args.name), ("version", args.version)) if v})
+            parts = None
+            if args.partitions:
+                from autogen_flash_partitions import parse_partition_table
+                with open(args.partitions, "rb") as f:
+                    parts = parse_partition_table(f.read())
+            m = build_bundle(args.firmware, args.output, config, parts)
+            print(f"✅ {args.output}: {m['name']} {m['version']} ({m['chip']}), {m['size']} bytes "
+                  f"-> {m['compressed_size']} deflated, sha256 {m['sha256'][:12]}"
+                  f"{', partition table included' if parts else ''}")
+        else:
+            bundle = Bundle(args.bundle)
+            m = bundle.manifest
+            print(f"🎁 {bundle.describe()}")
+            print(f"   created {m.get('created')} from {m.get('source')}, {len(m['image']['segments'])} segments, "
+                  f"deflate {m['compressed_size']} bytes")
+            layout = bundle.layout()
+            if layout:
+                from autogen_flash_partitions import describe
+                print(f"   layout: {describe(layout)}")
+            if args.verify:
+                bundle.verify()
+                print("✅ Bundle verified.")
+    except (BundleError, ImageError, PartitionError, OSError, ValueError) as ex:
+        print(f"❌ {ex}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
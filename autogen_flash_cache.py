@@ -0,0 +1,209 @@
+# ============================================================
+# AutoGen X local cache
+# - Content-addressed firmware cache (keyed by SHA-256 of the .bin)
+# - Holds the deflated stream, per-block MD5s and whole-image MD5
+#   (a .agx release bundle already carries them: autogen_flash_bundle)
+# ============================================================
+
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+import zlib
+
+# Block sizes we keep per-block MD5s for (flash sector / flash block)
+BLOCK_SIZES = (0x1000, 0x10000)
+
+# In-process memo: (path, size, mtime_ns) -> FirmwareImage
+_IMAGES = {}
+
+# One lock per firmware: a warm-up thread and the flash itself never hash / deflate the same file twice
+_KEY_LOCKS = {}
+_KEY_LOCKS_LOCK = threading.Lock()
+
+
+def key_lock(key) -> threading.Lock:
+    """Process-wide lock for one cache key (firmware file version, SHA-256 ...)."""
+    with _KEY_LOCKS_LOCK:
+        return _KEY_LOCKS.setdefault(key, threading.Lock())
+
+
+def cache_dir(*parts) -> str:
+    """
+    Per-user cache folder (the .app / EXE folder may be read-only):
+    - AUTOGENX_CACHE_DIR if set
+    - Windows: %LOCALAPPDATA%\\AutoGenX\\cache
+    - macOS:   ~/Library/Caches/AutoGenX
+    - Linux:   $XDG_CACHE_HOME/autogenx (or ~/.cache/autogenx)
+    """
+    base = os.environ.get("AUTOGENX_CACHE_DIR")
+    if not base:
+        if os.name == "nt":
+            base = os.path.join(os.environ.get("LOCALAPPDATA") or os.path.expanduser("~"), "AutoGenX", "cache")
+        elif sys.platform == "darwin":
+            base = os.path.join(os.path.expanduser("~"), "Library", "Caches", "AutoGenX")
+        else:
+            base = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"), "autogenx")
+    p = os.path.join(base, *parts)
+    os.makedirs(p, exist_ok=True)
+    return p
+
+
+def _write_atomic(path: str, data: bytes):
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+class FirmwareImage:
+    """Firmware bytes plus everything derived from them that flashing needs."""
+
+    def __init__(self, path: str, data: bytes, sha256: str, md5: str, compressed: bytes, block_md5s: dict):
+        self.path = path
+        self.data = data
+        self.sha256 = sha256
+        self.md5 = md5
+        self.compressed = compressed
+        self.block_md5s = block_md5s  # {block_size: [md5 hex, ...]}
+        self.layout = None  # OTA layout the release targets (bundles only)
+
+    @property
+    def size(self) -> int:
+        return len(self.data)
+
+
+def _block_md5s(data: bytes, block_size: int):
+    return [hashlib.md5(data[i:i + block_size]).hexdigest() for i in range(0, len(data), block_size)]
+
+
+def load_firmware(path: str) -> FirmwareImage:
+    """
+    Return the FirmwareImage for path, compressing/hashing it only the first
+    time a given SHA-256 is seen on this station (a .agx bundle: never). Cache problems never block
+    flashing: anything unreadable is just recomputed.
+    """
+    path = os.path.abspath(path)
+    st = os.stat(path)
+    memo_key = (path, st.st_size, st.st_mtime_ns)
+    if memo_key in _IMAGES:
+        return _IMAGES[memo_key]
+    with key_lock(memo_key):
+        if memo_key not in _IMAGES:  # whoever held the lock may have just built it
+            _IMAGES[memo_key] = _load_firmware(path)
+    return _IMAGES[memo_key]
+
+
+def _load_firmware(path: str) -> FirmwareImage:
+    # Release bundle: everything was precomputed when it was built
+    from autogen_flash_bundle import is_bundle, open_bundle
+    if is_bundle(path):
+        return open_bundle(path).image()
+
+    with open(path, "rb") as f:
+        data = f.read()
+    sha256 = hashlib.sha256(data).hexdigest()
+
+    img = None
+    try:
+        d = cache_dir("firmware", sha256)
+        meta_p, defl_p = os.path.join(d, "meta.json"), os.path.join(d, "image.deflate")
+    except Exception:
+        d = None
+
+    if d and os.path.exists(meta_p) and os.path.exists(defl_p):
+        try:
+            with open(meta_p, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            with open(defl_p, "rb") as f:
+                comp = f.read()
+            if meta.get("size") == len(data) and hashlib.md5(comp).hexdigest() == meta.get("deflate_md5"):
+                blocks = {int(k): v for k, v in meta["block_md5s"].items()}
+                img = FirmwareImage(path, data, sha256, meta["md5"], comp, blocks)
+        except Exception:
+            img = None
+
+    if img is None:
+        comp = zlib.compress(data, 9)
+        blocks = {bs: _block_md5s(data, bs) for bs in BLOCK_SIZES}
+        img = FirmwareImage(path, data, sha256, hashlib.md5(data).hexdigest(), comp, blocks)
+        if d:
+            try:
+                meta = {
+                    "sha256": sha256,
+                    "size": len(data),
+                    "md5": img.md5,
+                    "deflate_md5": hashlib.md5(comp).hexdigest(),
+                    "compressed_size": len(comp),
+                    "block_md5s": {str(k): v for k, v in blocks.items()},
+                }
+                _write_atomic(defl_p, comp)
+                _write_atomic(meta_p, json.dumps(meta).encode("utf-8"))
+            except Exception:
+                pass
+    return img
+
+
+# -------------------- small JSON stores --------------------
+
+class JsonStore:
+    """
+    One JSON object on disk in the cache folder. Every update re-reads the
+    file first so parallel station workers lose as little as possible.
+    """
+
+    def __init__(self, name: str):
+        self.path = os.path.join(cache_dir(), f"{name}.json")
+
+    def load(self) -> dict:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                d = json.load(f)
+            return d if isinstance(d, dict) else {}
+        except Exception:
+            return {}
+
+    def get(self, key: str, default=None):
+        return self.load().get(key, default)
+
+    def update(self, key: str, **fields) -> dict:
+        d = self.load()
+        entry = dict(d.get(key) or {})
+        entry.update({k: v for k, v in fields.items() if v is not None})
+        d[key] = entry
+        try:
+            _write_atomic(self.path, json.dumps(d, indent=1, sort_keys=True).encode("utf-8"))
+        except Exception:
+            pass
+        return entry
+
+
+# -------------------- known devices (USB identity -> port) --------------------
+
+def usb_key(info: dict):
+    """'VID:PID:serial@location' for a list_port_info() entry, None for non-USB ports."""
+    if not info or info.get("vid") is None:
+        return None
+    return f"{info['vid']:04x}:{info.get('pid') or 0:04x}:{info.get('serial_number') or ''}@{info.get('location') or ''}"
+
+
+def known_devices(infos) -> list:
+    """Ports from `infos` whose USB identity was a confirmed ESP before, most recent first."""
+    d = JsonStore("devices").load()
+    hits = []
+    for info in infos:
+        entry = d.get(usb_key(info) or "")
+        if entry:
+            hits.append((entry.get("seen", 0), info["device"], entry))
+    hits.sort(reverse=True)
+    return [(dev, entry) for _, dev, entry in hits]
+
+
+def remember_device(info: dict, **fields):
+    """Record port/chip/flash_size/baud for a USB identity (no-op for non-USB ports)."""
+    key = usb_key(info)
+    if not key:
+        return None
+    return JsonStore("devices").update(key, port=info.get("device"), seen=time.time(), **fields)
@@ -0,0 +1,413 @@
+#!/usr/bin/env python3
+# ============================================================
+# AutoGen X flash daemon
+# - Long-lived local service: imports, config, firmware cache,
+#   device cache and prepared serial sessions stay warm
+# - JSON-lines API on 127.0.0.1 (one JSON object per line)
+# - Only for this user: every connection starts with the random token the
+#   daemon writes to daemon/token-<port> (0600) in the cache folder;
+#   connections that open like an HTTP request (browser fetch) are dropped
+# - autogen_flash.run() (CLI + GUI) uses it when it is running
+# - A job's output is captured per thread (autogen_flash_events.capture_output)
+#   and streamed to its subscribers
+#
+# CLI:
+#   python autogen_flash_daemon.py serve
+#   python autogen_flash_daemon.py flash [firmware.bin] [--port P]
+#   python autogen_flash_daemon.py devices | jobs | stop
+#
+# Requests (reply is one JSON line unless noted):
+#   {"op": "auth", "token": T}            first line of every connection
+#   {"op": "ping"}
+#   {"op": "devices", "probe": false}
+#   {"op": "prepare", "port": P}          open + keep a FlashSession for P
+#   {"op": "flash", "firmware": path, "port": P or null, "cfg": {...}}  -> {"job": id}
+#                                         (cfg: the client's config; default the daemon's)
+#   {"op": "subscribe", "job": id}        streams log lines + progress events until the job ends
+#                                         ({"type": "error", "text", "kind": FlashError subclass})
+#   {"op": "jobs"} / {"op": "reload"} / {"op": "shutdown"}
+# Running jobs plus the last KEEP_JOBS finished ones are kept (output included).
+# ============================================================
+
+import argparse
+import hmac
+import itertools
+import json
+import os
+import secrets
+import socket
+import socketserver
+import sys
+import threading
+import time
+
+DEFAULT_PORT = 47811
+KEEP_JOBS = 20  # finished jobs (with their output) kept for "jobs" / a late "subscribe"
+
+# First bytes of a connection that is really an HTTP request (e.g. a web page's fetch())
+_HTTP_METHODS = (b"GET ", b"POST ", b"PUT ", b"HEAD ", b"OPTIONS ", b"DELETE ", b"PATCH ", b"CONNECT ", b"TRACE ")
+
+
+def daemon_port(cfg=None) -> int:
+    env = os.environ.get("AUTOGENX_DAEMON_PORT")
+    if env:
+        return int(env)
+    return int((cfg or {}).get("daemon_port", DEFAULT_PORT))
+
+
+def token_path(port: int) -> str:
+    from autogen_flash_cache import cache_dir
+    return os.path.join(cache_dir("daemon"), f"token-{port}")
+
+
+def write_token(port: int) -> str:
+    """New random token for this daemon run, readable by this user only."""
+    token = secrets.token_hex(16)
+    path = token_path(port)
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(token)
+    return token
+
+
+def read_token(port: int):
+    try:
+        with open(token_path(port), "r", encoding="utf-8") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+# -------------------- server --------------------
+
+class Job:
+    def __init__(self, jid: int, firmware: str, port: str = None, cfg: dict = None):
+        self.id = jid
+        self.firmware = firmware
+        self.port = port
+        self.cfg = cfg
+        self.state = "queued"  # queued / running / done / error
+        self.error = ""
+        self.events = []
+        self.started = time.time()
+        self.cond = threading.Condition()
+
+    def emit(self, ev: dict):
+        with self.cond:
+            self.events.append(ev)
+            self.cond.notify_all()
+
+    def finish(self, state: str, error: str = "", kind: str = None):
+        """kind: the FlashError subclass name, so the client can raise the same type."""
+        self.state, self.error = state, error
+        self.emit(dict({"type": state, "text": error}, **({"kind": kind} if kind else {})))
+
+    def info(self) -> dict:
+        return {"job": self.id, "state": self.state, "port": self.port,
+                "firmware": self.firmware, "error": self.error, "started": self.started}
+
+
+class FlashDaemon:
+    def __init__(self, cfg=None):
+        import autogen_flash
+        self.af = autogen_flash
+        self.cfg = cfg or autogen_flash.prepare_cfg()
+        self.jobs = {}
+        self.ids = itertools.count(1)
+        self.sessions = {}  # port -> open FlashSession (prepared ahead of a job)
+        self.port_locks = {}
+        self.lock = threading.Lock()
+        self.token = None
+        self.server = None
+
+    # ----- jobs -----
+
+    def submit(self, firmware: str, port: str = None, cfg: dict = None) -> Job:
+        """cfg: the client's config for this job (default: the daemon's)."""
+        cfg = cfg or self.cfg
+        # Resolve now so a bad path fails the request, not a background thread
+        fw_path = self.af.resolve_firmware_path(cfg, firmware)
+        self.af.check_firmware(cfg, fw_path)
+        try:
+            from autogen_flash_cache import load_firmware
+            load_firmware(fw_path)  # warm: compressed + hashed once per firmware
+        except Exception:
+            pass
+        job = Job(next(self.ids), fw_path, port, cfg)
+        with self.lock:
+            self.jobs[job.id] = job
+        threading.Thread(target=self._run, args=(job,), daemon=True).start()
+        return job
+
+    def _run(self, job: Job):
+        from autogen_flash_events import capture_output
+        lock = self.port_locks.setdefault(job.port, threading.Lock())  # None: one auto-detect job at a time
+        try:
+            # What the job thread prints / emits goes to its subscribers, not the daemon console
+            with capture_output(job.emit), lock:
+                job.state = "running"
+                if not job.port:
+                    # a new unit may sit on another port: re-detect (device cache keeps this fast)
+                    self.af._CACHED_PORT = None
+                session = self.sessions.pop(job.port, None) if job.port else None
+                self.af.flash(job.cfg, firmware_override=job.firmware, port=job.port, session=session)
+            job.finish("done")
+        except self.af.FlashError as ex:
+            job.finish("error", str(ex), kind=type(ex).__name__)
+        except Exception as ex:
+            job.finish("error", f"{type(ex).__name__}: {ex}")
+        finally:
+            self._prune()
+
+    def _prune(self):
+        """Forget all but the last KEEP_JOBS finished jobs (a daemon runs for a whole shift)."""
+        with self.lock:
+            ended = [j for j in self.jobs.values() if j.state in ("done", "error")]
+            for j in ended[:-KEEP_JOBS]:
+                del self.jobs[j.id]
+
+    # ----- requests -----
+
+    def handle(self, req: dict, send):
+        op = req.get("op")
+        if op == "ping":
+            send({"ok": True, "pid": os.getpid(), "version": self.cfg.get("version", "")})
+        elif op == "devices":
+            out = []
+            try:
+                from autogen_flash_cache import known_devices
+                known = dict(known_devices(self.af.list_port_info()))
+            except Exception:
+                known = {}
+            for p in self.af.list_port_info():
+                d = dict(p, known=known.get(p["device"]), prepared=p["device"] in self.sessions)
+                if req.get("probe"):
+                    d["esp"] = bool(self.af.fast_probe(p["device"]))
+                out.append(d)
+            send({"ok": True, "devices": out})
+        elif op == "prepare":
+            port = req["port"]
+            if port not in self.sessions:
+                from autogen_flash_link import LinkModel
+                from autogen_flash_session import FlashSession
+                link = LinkModel.for_port(port, self.cfg.get("baud_try", [921600]), self.af.port_info(port))
+                mode = self.cfg.get("connect_mode", "default-reset")
+                chip = self.af.device_fingerprint(port).get("chip")
+                self.sessions[port] = FlashSession(port, link=link, connect_mode=mode, chip=chip).open()
+            send({"ok": True, "port": port})
+        elif op == "flash":
+            job = self.submit(req.get("firmware"), req.get("port"), req.get("cfg"))
+            send({"ok": True, "job": job.id})
+        elif op == "subscribe":
+            with self.lock:
+                job = self.jobs.get(int(req.get("job", 0)))
+            if not job:
+                send({"ok": False, "error": "unknown job"})
+                return
+            i = int(req.get("since", 0))
+            while True:
+                with job.cond:
+                    while i >= len(job.events):
+                        job.cond.wait(1.0)
+                    evs = job.events[i:]
+                i += len(evs)
+                for ev in evs:
+                    send(ev)
+                    if ev["type"] in ("done", "error"):
+                        return
+        elif op == "jobs":
+            with self.lock:
+                jobs = [j.info() for j in self.jobs.values()]
+            send({"ok": True, "jobs": jobs})
+        elif op == "reload":
+            self.cfg = self.af.prepare_cfg()
+            send({"ok": True})
+        elif op == "shutdown":
+            send({"ok": True})
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+        else:
+            send({"ok": False, "error": f"unknown op {op!r}"})
+
+    def serve(self, port: int = None):
+        daemon = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                def send(obj):
+                    self.wfile.write((json.dumps(obj) + "\n").encode("utf-8"))
+                    self.wfile.flush()
+                if not daemon.authorized(self.rfile.readline(4096), send):
+                    return
+                for line in self.rfile:
+                    if not line.strip():
+                        continue
+                    try:
+                        daemon.handle(json.loads(line), send)
+                    except daemon.af.FlashError as ex:
+                        send({"ok": False, "error": str(ex), "kind": type(ex).__name__})
+                    except Exception as ex:
+                        send({"ok": False, "error": f"{type(ex).__name__}: {ex}"})
+
+        class Server(socketserver.ThreadingTCPServer):
+            daemon_threads = True
+            allow_reuse_address = True
+
+        port = port or daemon_port(self.cfg)
+        with Server(("127.0.0.1", port), Handler) as srv:
+            self.server = srv
+            self.token = write_token(port)
+            print(f"🛰️ AutoGen X flash daemon listening on 127.0.0.1:{port} (pid {os.getpid()})")
+            try:
+                srv.serve_forever()
+            finally:
+                for s in self.sessions.values():
+                    s.close(reset=True)
+                try:
+                    os.remove(token_path(port))
+                except OSError:
+                    pass
+
+    def authorized(self, first: bytes, send) -> bool:
+        """The connection's first line must be {"op": "auth", "token": <this run's token>}."""
+        if first.lstrip().startswith(_HTTP_METHODS):
+            return False  # a browser / HTTP client: no reply at all
+        try:
+            req = json.loads(first)
+            ok = req.get("op") == "auth" and hmac.compare_digest(str(req.get("token", "")), self.token or "")
+        except Exception:
+            ok = False
+        send({"ok": ok} if ok else {"ok": False, "error": "not authorized"})
+        return ok
+
+
+# -------------------- client --------------------
+
+class DaemonClient:
+    def __init__(self, port: int = None, timeout: float = 0.3):
+        port = port or daemon_port()
+        token = read_token(port)
+        if not token:
+            raise ConnectionRefusedError("no daemon token (daemon not running for this user)")
+        self.sock = socket.create_connection(("127.0.0.1", port), timeout=timeout)
+        self.sock.settimeout(None)
+        self.rfile = self.sock.makefile("r", encoding="utf-8")
+        if not self.request("auth", token=token).get("ok"):
+            self.close()
+            raise ConnectionRefusedError("daemon rejected the token")
+
+    def close(self):
+        try:
+            self.sock.close()
+        except Exception:
+            pass
+
+    def request(self, op: str, **kw) -> dict:
+        self.sock.sendall((json.dumps(dict(kw, op=op)) + "\n").encode("utf-8"))
+        return json.loads(self.rfile.readline())
+
+    def events(self, job: int):
+        """Yield job events as they happen (log lines, then done/error)."""
+        self.sock.sendall((json.dumps({"op": "subscribe", "job": job}) + "\n").encode("utf-8"))
+        for line in self.rfile:
+            ev = json.loads(line)
+            yield ev
+            if ev.get("type") in ("done", "error") or ev.get("ok") is False:
+                return
+
+
+def connect(port: int = None):
+    """DaemonClient if a daemon answers on localhost, else None."""
+    try:
+        c = DaemonClient(port)
+    except OSError:
+        return None
+    try:
+        if c.request("ping").get("ok"):
+            return c
+    except Exception:
+        pass
+    c.close()
+    return None
+
+
+def _error_kind(reply: dict):
+    """The FlashError subclass the daemon reported (FlashError if unknown)."""
+    import autogen_flash
+    kind = getattr(autogen_flash, str(reply.get("kind") or ""), None)
+    return kind if isinstance(kind, type) and issubclass(kind, autogen_flash.FlashError) else autogen_flash.FlashError
+
+
+def flash_via_daemon(fw_path: str, port: str = None, daemon_port_: int = None, cfg: dict = None):
+    """
+    Run a flash job on the daemon (with the caller's cfg), printing its output as it arrives.
+    Returns None if no daemon is running, True on success; raises the job's
+    FlashError (same subclass) on failure.
+    """
+    import autogen_flash
+    c = connect(daemon_port_)
+    if c is None:
+        return None
+    try:
+        print("🛰️ Using flash daemon (job output follows)\n")
+        r = c.request("flash", firmware=os.path.abspath(fw_path), port=port, cfg=cfg)
+        if not r.get("ok"):
+            autogen_flash.die(r.get("error") or "Daemon refused the job.", kind=_error_kind(r))
+        from autogen_flash_events import emit
+        reported = False
+        for ev in c.events(r["job"]):
+            if ev.get("type") in ("phase", "progress", "wrote"):
+                emit(ev)  # local sinks (GUI progress bar) see daemon progress too
+            elif ev.get("type") == "log":
+                print(ev["text"], file=sys.stderr if ev.get("stream") == "stderr" else sys.stdout)
+                reported = reported or ev["text"].startswith("❌")
+            elif ev.get("type") == "error" or ev.get("ok") is False:
+                text = ev.get("text") or ev.get("error") or "Flash failed."
+                if reported:
+                    raise _error_kind(ev)(text)  # the job already printed its ❌ reason
+                autogen_flash.die(text, kind=_error_kind(ev))
+        return True
+    finally:
+        c.close()
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="AutoGen X flash daemon")
+    ap.add_argument("cmd", choices=["serve", "flash", "devices", "jobs", "stop"])
+    ap.add_argument("firmware", nargs="?")
+    ap.add_argument("--port", help="serial port for flash (default: auto-detect)")
+    ap.add_argument("--listen", type=int, help=f"TCP port on 127.0.0.1 (default {DEFAULT_PORT})")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "serve":
+        FlashDaemon().serve(args.listen)
+        return 0
+
+    if args.cmd == "flash":
+        import autogen_flash
+        try:
+            cfg = autogen_flash.prepare_cfg()
+            fw_path = autogen_flash.resolve_firmware_path(cfg, args.firmware)
+            if flash_via_daemon(fw_path, args.port, args.listen, cfg) is None:
+                autogen_flash.die("Flash daemon is not running (start it with: autogen_flash_daemon.py serve).")
+        except autogen_flash.FlashError:
+            return 1  # die() / the job already printed the ❌ reason
+        return 0
+
+    c = connect(args.listen)
+    if c is None:
+        print("Flash daemon is not running.")
+        return 1
+    try:
+        op = {"devices": "devices", "jobs": "jobs", "stop": "shutdown"}[args.cmd]
+        print(json.dumps(c.request(op), indent=2, ensure_ascii=False))
+    finally:
+        c.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
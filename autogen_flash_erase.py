@@ -0,0 +1,113 @@
+# ============================================================
+# AutoGen X erase planner
+# - "erase": true means a clean slate: after flashing, every byte the
+#   tool did not write reads 0xFF (same end state as erase_flash)
+# - Instead of erasing the whole chip: skip what the writes erase anyway
+#   (app slots, otadata), find what is already blank by on-device MD5
+#   (whole free regions first, 64 KB blocks only where dirty) and erase
+#   the rest as the fewest, largest erase_region runs
+# ============================================================
+
+import hashlib
+
+SECTOR = 0x1000
+BLOCK = 0x10000
+
+# size -> MD5 of that many 0xFF bytes
+_BLANK_MD5 = {}
+
+
+def align_up(n: int, a: int = SECTOR) -> int:
+    return (n + a - 1) // a * a
+
+
+def blank_md5(size: int) -> str:
+    """MD5 of `size` erased (0xFF) bytes, memoized."""
+    if size not in _BLANK_MD5:
+        h = hashlib.md5()
+        chunk = b"\xff" * BLOCK
+        for pos in range(0, size, BLOCK):
+            h.update(chunk[:min(BLOCK, size - pos)])
+        _BLANK_MD5[size] = h.hexdigest()
+    return _BLANK_MD5[size]
+
+
+def merge(ranges) -> list:
+    """Sorted, merged [start, end) ranges."""
+    out = []
+    for start, end in sorted(r for r in ranges if r[1] > r[0]):
+        if out and start <= out[-1][1]:
+            out[-1][1] = max(out[-1][1], end)
+        else:
+            out.append([start, end])
+    return [(s, e) for s, e in out]
+
+
+def subtract(total, holes) -> list:
+    """[start, end) ranges of total that are not covered by holes."""
+    start, end = total
+    out = []
+    for hs, he in merge(holes):
+        if he <= start or hs >= end:
+            continue
+        if hs > start:
+            out.append((start, hs))
+        start = max(start, he)
+    if start < end:
+        out.append((start, end))
+    return out
+
+
+def find_dirty(md5, start: int, end: int, stats: dict) -> list:
+    """
+    Sector-aligned [start, end) ranges inside [start, end) that are not blank.
+    One MD5 for the whole range; a dirty range is looked at per 64 KB block
+    (a dirty block is erased whole, one block erase either way), pieces of
+    blocks at the range edges per sector.
+    """
+    stats["checks"] += 1
+    if md5(start, end - start) == blank_md5(end - start):
+        return []
+    if end - start <= SECTOR or (start % BLOCK == 0 and end - start == BLOCK):
+        return [(start, end)]
+    edges = list(range(start - start % BLOCK + BLOCK, end, BLOCK))
+    if edges:
+        pieces = zip([start] + edges, edges + [end])
+    else:
+        pieces = [(p, p + SECTOR) for p in range(start, end, SECTOR)]  # inside one block
+    runs = []
+    for s, e in pieces:
+        runs += find_dirty(md5, s, e, stats)
+    return merge(runs)
+
+
+def plan_erase(md5, flash_size: int, covered) -> dict:
+    """
+    Erase plan for a clean slate. md5(offset, size) -> hex digest of the
+    device flash (FlashSession.md5); covered: (offset, size) regions the
+    flash sequence erases itself (writes, otadata erase).
+
+    Returns {"runs": [(offset, size), ...], "checks", "covered", "blank", "erase"} (bytes).
+    """
+    flash_size = flash_size // SECTOR * SECTOR
+    holes = [(o - o % SECTOR, align_up(o + size)) for o, size in covered]
+    rest = subtract((0, flash_size), holes)
+    stats = {"checks": 0}
+    runs = []
+    for start, end in rest:
+        runs += find_dirty(md5, start, end, stats)
+    runs = merge(runs)
+    erase = sum(e - s for s, e in runs)
+    return {
+        "runs": [(s, e - s) for s, e in runs],
+        "checks": stats["checks"],
+        "covered": flash_size - sum(e - s for s, e in rest),
+        "blank": sum(e - s for s, e in rest) - erase,
+        "erase": erase,
+    }
+
+
+def describe_plan(plan: dict) -> str:
+    kb = lambda n: f"{n // 1024}KB"
+    return (f"{kb(plan['blank'])} already blank, {kb(plan['covered'])} rewritten by the flash, "
+            f"erasing {kb(plan['erase'])} in {len(plan['runs'])} region(s) ({plan['checks']} MD5 checks)")
@@ -0,0 +1,241 @@
+# ============================================================
+# AutoGen X progress events
+# - esptool output parsed line by line into structured events
+# - Sinks subscribe with add_sink() (events of every thread)
+# - capture_output(fn): what one thread prints and emits goes to fn
+#   (a GUI run, a daemon job, an async job) instead of the console; the
+#   other threads keep the real stdout/stderr
+# - cancel_scope(event): set the event and the thread's flash stops at the
+#   next block / esptool line with FlashCancelled (check_cancel())
+#
+# Event dicts:
+#   {"type": "line",     "text": str}
+#   {"type": "phase",    "phase": "connect" | "erase" | "write" | "verify" | "reset"}
+#   {"type": "progress", "phase": str, "address": int, "percent": float,
+#                        "bytes": int | None, "total": int | None,
+#                        "kbps": float | None, "eta": float | None}
+#   {"type": "wrote",    "bytes": int, "compressed": int | None,
+#                        "address": int, "seconds": float, "kbps": float}
+#   {"type": "log",      "text": str, "stream": "stdout" | "stderr"}   (captured output)
+# ============================================================
+
+import contextlib
+import re
+import sys
+import threading
+import time
+
+from autogen_flash_fingerprint import parse_line
+
+_SINKS = []
+_LOCK = threading.Lock()
+_BOUND = threading.local()  # .fn: where this thread's output + events go (capture_output); .cancel: its stop flag
+_INSTALLED = False
+
+# esptool "it talked to a chip" markers (run_esptool treats these as success)
+MARKERS = ("Connected to ESP", "Chip type:", "Detecting chip type")
+# ...unless one of these shows up: the chip answered but the operation failed
+FAILURES = ("A fatal error occurred", "Verify failed", "MD5 of file does not match")
+
+_PHASES = (
+    ("Connecting", "connect"),
+    ("Erasing", "erase"),
+    ("Compressed ", "write"),
+    ("Writing at", "write"),
+    ("Verifying", "verify"),
+    ("Hard resetting", "reset"),
+)
+
+# v4: "Writing at 0x00010000... (3 %)"
+# v5: "Writing at 0x00010000 [=====>      ]  12.3%  135168/1099232 bytes..."
+_RE_WRITING = re.compile(r"Writing at (0x[0-9a-fA-F]+).*?(\d+(?:\.\d+)?)\s*%(?:\s+(\d+)/(\d+) bytes)?")
+_RE_WROTE = re.compile(
+    r"Wrote (\d+) bytes(?: \((\d+) compressed\))? at (0x[0-9a-fA-F]+) in ([\d.]+) seconds"
+    r"(?: \(effective ([\d.]+) kbit/s\))?"
+)
+
+
+def add_sink(fn):
+    with _LOCK:
+        if fn not in _SINKS:
+            _SINKS.append(fn)
+
+
+def remove_sink(fn):
+    with _LOCK:
+        if fn in _SINKS:
+            _SINKS.remove(fn)
+
+
+def emit(event: dict):
+    """Send an event to every sink (and the thread's capture); a broken sink never breaks flashing."""
+    with _LOCK:
+        sinks = list(_SINKS)
+    bound = getattr(_BOUND, "fn", None)
+    if bound is not None and event.get("type") != "line":  # lines reach it as printed output
+        sinks.append(bound)
+    for fn in sinks:
+        try:
+            fn(event)
+        except Exception:
+            pass
+
+
+# -------------------- per-thread capture --------------------
+
+class _Output:
+    """stdout/stderr stand-in: lines printed on a capturing thread become "log" events."""
+
+    def __init__(self, real, stream: str):
+        self.real = real
+        self.stream = stream
+        self.local = threading.local()
+
+    def write(self, s):
+        fn = getattr(_BOUND, "fn", None)
+        if fn is None:
+            return self.real.write(s)
+        buf = getattr(self.local, "buf", "") + s
+        while "\n" in buf:
+            line, buf = buf.split("\n", 1)
+            fn({"type": "log", "text": line, "stream": self.stream})
+        self.local.buf = buf
+        return len(s)
+
+    def end_line(self, fn):
+        """Hand over what this thread printed without a final newline."""
+        buf, self.local.buf = getattr(self.local, "buf", ""), ""
+        if buf:
+            fn({"type": "log", "text": buf, "stream": self.stream})
+
+    def flush(self):
+        self.real.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.real, name)  # encoding, isatty(), fileno() ...
+
+
+def _install():
+    """Put the routing streams in front of stdout/stderr once; threads that capture nothing don't notice."""
+    global _INSTALLED
+    with _LOCK:
+        if not _INSTALLED:
+            sys.stdout = _Output(sys.stdout, "stdout")
+            sys.stderr = _Output(sys.stderr, "stderr")
+            _INSTALLED = True
+
+
+@contextlib.contextmanager
+def capture_output(fn):
+    """Everything printed / emitted on the calling thread goes to fn(event) instead of the console."""
+    _install()
+    prev = getattr(_BOUND, "fn", None)
+    _BOUND.fn = fn
+    try:
+        yield
+    finally:
+        for out in (sys.stdout, sys.stderr):
+            if isinstance(out, _Output):
+                out.end_line(fn)
+        _BOUND.fn = prev
+
+
+def relay(event: dict):
+    """An event another thread emitted (its sinks saw it already): only to this thread's capture."""
+    fn = getattr(_BOUND, "fn", None)
+    if fn is not None:
+        fn(event)
+
+
+# -------------------- cancellation --------------------
+
+class FlashCancelled(BaseException):
+    """
+    The run was stopped from outside (Ctrl+C, a cancelled async job). A
+    BaseException like KeyboardInterrupt: the link-retry and engine-fallback
+    handlers (except Exception) let it through.
+    """
+
+
+@contextlib.contextmanager
+def cancel_scope(event):
+    """check_cancel() on the calling thread raises FlashCancelled once event (threading.Event) is set."""
+    prev = getattr(_BOUND, "cancel", None)
+    _BOUND.cancel = event
+    try:
+        yield
+    finally:
+        _BOUND.cancel = prev
+
+
+def check_cancel():
+    """Called between blocks / operations: stop here if this thread's run was cancelled."""
+    event = getattr(_BOUND, "cancel", None)
+    if event is not None and event.is_set():
+        raise FlashCancelled("flash cancelled")
+
+
+def progress_event(phase: str, address: int, done: int, total: int, started: float) -> dict:
+    """Progress event with kbit/s and ETA from bytes done since `started` (time.monotonic())."""
+    dt = time.monotonic() - started
+    pct = done * 100.0 / total if total else 0.0
+    timed = dt > 0.05 and done  # too early to say anything about speed
+    kbps = done * 8 / 1000 / dt if timed else None
+    eta = dt * (total - done) / done if timed else None
+    return {"type": "progress", "phase": phase, "address": address, "percent": round(pct, 1),
+            "bytes": done, "total": total, "kbps": kbps and round(kbps, 1), "eta": eta and round(eta, 1)}
+
+
+class EsptoolOutputParser:
+    """Feed esptool output lines; get events back and the success-marker state."""
+
+    def __init__(self, total: int = None):
+        self.total = total  # bytes being written, if the caller knows
+        self.phase = None
+        self.connected = False
+        self.failed = False
+        self.device = {}  # fingerprint fields seen in the output (autogen_flash_fingerprint)
+        self.started = time.monotonic()
+
+    def feed(self, line: str) -> list:
+        events = [{"type": "line", "text": line}]
+        if not self.connected and any(m in line for m in MARKERS):
+            self.connected = True
+        if not self.failed and any(m in line for m in FAILURES):
+            self.failed = True
+        parse_line(line, self.device)
+
+        for needle, phase in _PHASES:
+            if needle in line:
+                if phase != self.phase:
+                    self.phase = phase
+                    self.started = time.monotonic()
+                    events.append({"type": "phase", "phase": phase})
+                break
+
+        m = _RE_WRITING.search(line)
+        if m:
+            pct = float(m.group(2))
+            done = int(m.group(3)) if m.group(3) else None
+            total = int(m.group(4)) if m.group(4) else self.total
+            if done is None and total:
+                done = int(total * pct / 100)
+            if done is not None and total:
+                ev = progress_event("write", int(m.group(1), 16), done, total, self.started)
+                ev["percent"] = pct
+            else:
+                dt = time.monotonic() - self.started
+                ev = {"type": "progress", "phase": "write", "address": int(m.group(1), 16), "percent": pct,
+                      "bytes": None, "total": None, "kbps": None,
+                      "eta": round(dt * (100 - pct) / pct, 1) if pct else None}
+            events.append(ev)
+            return events
+
+        m = _RE_WROTE.search(line)
+        if m:
+            secs = float(m.group(4))
+            n = int(m.group(1))
+            kbps = float(m.group(5)) if m.group(5) else (n * 8 / 1000 / secs if secs else 0.0)
+            events.append({"type": "wrote", "bytes": n, "compressed": int(m.group(2)) if m.group(2) else None,
+                           "address": int(m.group(3), 16), "seconds": secs, "kbps": round(kbps, 1)})
+        return events
@@ -0,0 +1,134 @@
+# ============================================================
+# AutoGen X device fingerprint
+# - Chip, revision, MAC, flash ID and flash size of one controller,
+#   learned once (first probe / first session) instead of every step
+# - Stored per MAC in the cache folder (fingerprints.json); the USB
+#   identity -> MAC link lives in devices.json
+# - Later steps get explicit --chip / --flash-size, the session skips
+#   the SPI flash ID read for a MAC it already knows
+# ============================================================
+
+import re
+import time
+
+# JEDEC capacity byte -> esptool flash size name
+FLASH_SIZES = {0x12: "256KB", 0x13: "512KB", 0x14: "1MB", 0x15: "2MB", 0x16: "4MB",
+               0x17: "8MB", 0x18: "16MB", 0x19: "32MB", 0x1A: "64MB"}
+
+# esptool v4 / v5 output (flash-id and the banner every command prints)
+_RE_DETECTED = re.compile(r"(?:Detecting chip type\.\.\.|Connected to)\s+(ESP[\w-]*)")
+_RE_CHIP = re.compile(r"(?:Chip is|Chip type:)\s+(\S.*?)\s*\(revision (v[\d.]+)\)")
+_RE_MAC = re.compile(r"^\s*MAC:\s+([0-9a-fA-F]{2}(?::[0-9a-fA-F]{2}){5})")
+_RE_MANUFACTURER = re.compile(r"^\s*Manufacturer:\s+([0-9a-fA-F]+)")
+_RE_DEVICE = re.compile(r"^\s*Device:\s+([0-9a-fA-F]{4})")
+_RE_FLASH_SIZE = re.compile(r"Detected flash size:\s+(\d+[KM]B)")
+
+
+def flash_size_name(nbytes: int) -> str:
+    """4194304 -> '4MB'."""
+    if nbytes >= 1024 * 1024:
+        return f"{nbytes // (1024 * 1024)}MB"
+    return f"{nbytes // 1024}KB"
+
+
+def flash_size_bytes(name: str) -> int:
+    """'4MB' -> 4194304."""
+    return int(name[:-2]) * (1024 * 1024 if name.upper().endswith("MB") else 1024)
+
+
+def size_from_flash_id(flash_id: int):
+    """Flash size in bytes from a JEDEC ID (None if the capacity byte is unknown)."""
+    name = FLASH_SIZES.get((flash_id >> 16) & 0xFF)
+    return flash_size_bytes(name) if name else None
+
+
+def flash_size_known(fp: dict) -> bool:
+    """
+    fp has a real flash size: one that agrees with its JEDEC ID. Older
+    versions stored a made-up 4MB when the capacity byte was unknown (and the
+    cache never drops a field), so a size the ID doesn't back counts as unknown.
+    """
+    size = fp.get("flash_size")
+    if not size:
+        return False
+    return fp.get("flash_id") is None or size_from_flash_id(fp["flash_id"]) == size
+
+
+def chip_arg(chip: str) -> str:
+    """esptool --chip value for a chip name: 'ESP32-S3' -> 'esp32s3'."""
+    return chip.lower().replace("-", "")
+
+
+def parse_line(line: str, fp: dict):
+    """Pick fingerprint fields out of one line of esptool output into fp."""
+    m = _RE_DETECTED.search(line)
+    if m:
+        fp["chip"] = m.group(1)
+        return
+    m = _RE_CHIP.search(line)
+    if m:
+        fp["description"], fp["revision"] = m.group(1), m.group(2)
+        return
+    m = _RE_MAC.match(line)
+    if m and "mac" not in fp:  # the first MAC line is the base MAC
+        fp["mac"] = m.group(1).lower()
+        return
+    m = _RE_MANUFACTURER.match(line)
+    if m:
+        fp["_manufacturer"] = int(m.group(1), 16)
+        return
+    m = _RE_DEVICE.match(line)
+    if m and "_manufacturer" in fp:
+        dev = int(m.group(1), 16)
+        fp["flash_id"] = fp.pop("_manufacturer") | ((dev >> 8) & 0xFF) << 8 | (dev & 0xFF) << 16
+        return
+    m = _RE_FLASH_SIZE.search(line)
+    if m:
+        fp["flash_size"] = flash_size_bytes(m.group(1))
+
+
+def from_loader(esp, mac: str, flash_id: int) -> dict:
+    """Fingerprint of a connected esptool loader (chip description costs a few eFuse reads: first sight only)."""
+    fp = {"chip": esp.CHIP_NAME, "mac": mac, "flash_id": flash_id, "flash_size": size_from_flash_id(flash_id)}
+    try:
+        m = _RE_CHIP.search("Chip is " + esp.get_chip_description())
+        if m:
+            fp["description"], fp["revision"] = m.group(1), m.group(2)
+    except Exception:
+        pass
+    return fp
+
+
+def load(mac: str):
+    """Stored fingerprint for a MAC, None if this controller was never seen."""
+    if not mac:
+        return None
+    try:
+        from autogen_flash_cache import JsonStore
+        return JsonStore("fingerprints").get(mac.lower())
+    except Exception:
+        return None
+
+
+def save(fp: dict):
+    """Store/merge a fingerprint under its MAC (no-op without one)."""
+    if not fp or not fp.get("mac"):
+        return None
+    try:
+        from autogen_flash_cache import JsonStore
+        fields = {k: v for k, v in fp.items() if not k.startswith("_")}
+        fields["seen"] = time.time()
+        return JsonStore("fingerprints").update(fp["mac"].lower(), **fields)
+    except Exception:
+        return None
+
+
+def describe(fp: dict) -> str:
+    parts = [fp.get("description") or fp.get("chip") or "?"]
+    if fp.get("revision"):
+        parts.append(fp["revision"])
+    if flash_size_known(fp):
+        parts.append(f"flash {flash_size_name(fp['flash_size'])}")
+    if fp.get("mac"):
+        parts.append(fp["mac"])
+    return ", ".join(parts)
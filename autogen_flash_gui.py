@@ -1,37 +1,65 @@
+import autogen_flash_startup as startup  # first: the --startup-profile clock starts here
 import threading
 import queue
+import re
+import time
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 import traceback
-# PYI_BOOTSTRAP_AUTOGEN_FLASH
-import os, sys, importlib.util
+import os, sys
 
-def _import_autogen_flash():
+startup.mark("import tkinter")
+
+# The flashing module (and esptool behind it) loads in the warm-up thread once the window is up
+_flash_module = None
+_flash_module_lock = threading.Lock()
+
+def flash_module():
+    global _flash_module
+    with _flash_module_lock:
+        if _flash_module is None:
+            import autogen_flash  # the builds bundle it (--hidden-import autogen_flash)
+            _flash_module = autogen_flash
+        return _flash_module
+
+# esptool / session progress output: rewritten in place instead of appended
+PROGRESS_RE = re.compile(r"^\s*(Writing at|Reading from|Verifying|Erasing)\b.*\d\s*%")
+LOG_FILES_KEPT = 20
+PUMP_MAX_MESSAGES = 20000  # per tick; the rest waits for the next one
+
+
+def open_log_file():
+    """New timestamped log file in the cache folder (oldest ones pruned). None if not writable."""
     try:
-        import autogen_flash  # normal import
-        return autogen_flash
-    except ModuleNotFoundError:
-        # PyInstaller onefile: load bundled autogen_flash.py from _MEIPASS
-        base = getattr(sys, "_MEIPASS", None)
-        if not base:
-            raise
-        path = os.path.join(base, "autogen_flash_pyi.py")
-        spec = importlib.util.spec_from_file_location("autogen_flash", path)
-        mod = importlib.util.module_from_spec(spec)
-        spec.loader.exec_module(mod)
-        sys.modules["autogen_flash"] = mod
-        return mod
-
-autogen_flash = _import_autogen_flash()
+        from autogen_flash_cache import cache_dir
+        d = cache_dir("logs")
+        old = sorted(f for f in os.listdir(d) if f.startswith("flash-") and f.endswith(".log"))
+        for f in old[:max(0, len(old) - LOG_FILES_KEPT + 1)]:
+            try:
+                os.remove(os.path.join(d, f))
+            except OSError:
+                pass
+        path = os.path.join(d, time.strftime("flash-%Y%m%d-%H%M%S.log"))
+        return open(path, "a", encoding="utf-8", errors="replace")
+    except Exception:
+        return None
+
+
 class App(tk.Tk):
-    def __init__(self):
+    def __init__(self, profile: bool = False):
         super().__init__()
+        self.profile = profile  # --startup-profile: report once warm, then close
         self.title("AutoGen X Flash Tool")
         self.geometry("860x560")
         self.minsize(740, 440)
 
         self.q = queue.Queue()
         self.fw_path = None
+        self.max_lines = 5000  # gui_log_lines from the config once the warm-up has loaded it
+        self.progress_at_end = False  # last widget line is a progress line (next one replaces it)
+        self.cfg = None
+        self.watcher = None   # PortWatcher while "Auto-flash on plug-in" is on
+        self.flasher = None   # its autogen_flash_watch.AutoFlasher (plug-in rules, one unit at a time)
 
         top = ttk.Frame(self, padding=12)
         top.pack(fill="x")
@@ -48,6 +76,13 @@ class App(tk.Tk):
         self.btn = ttk.Button(btns, text="Start Flash", command=self.start)
         self.btn.pack(side="left")
 
+        self.auto = tk.BooleanVar(value=False)
+        self.chk_auto = ttk.Checkbutton(btns, text="Auto-flash on plug-in", variable=self.auto, command=self.toggle_auto)
+        self.chk_auto.pack(side="left", padx=(8, 0))
+
+        self.bar = ttk.Progressbar(self, mode="determinate", maximum=100)
+        self.bar.pack(fill="x", padx=12, pady=(0, 8))
+
         sep = ttk.Separator(self)
         sep.pack(fill="x")
 
@@ -62,41 +97,162 @@ class App(tk.Tk):
         self.txt.insert("end", "3) Click Start Flash\n\n")
         self.txt.configure(state="disabled")
 
+        startup.mark("create window")
         self.after(100, self.pump)
+        self.after_idle(self.on_shown)
+
+    def on_shown(self):
+        startup.mark("show window")
+        threading.Thread(target=self.warm_up, name="warm-up", daemon=True).start()
+
+    def warm_up(self):
+        """Background: flashing module, pyserial, esptool, config, firmware (nothing here blocks the window)."""
+        try:
+            with startup.step("import autogen_flash"):
+                af = flash_module()
+            cfg = af.warm_up()
+            self.cfg = cfg
+            self.max_lines = max(100, int(cfg.get("gui_log_lines", 5000)))
+        except Exception:
+            pass
+        self.q.put({"type": "warm"})
 
     def log(self, s: str):
+        self.log_lines(s.split("\n"))
+
+    def log_lines(self, lines):
+        """
+        Append a batch of lines with ONE widget update. Runs of progress lines
+        collapse to the newest, which replaces a progress line already at the end.
+        """
+        batch = []
+        for line in lines:
+            is_prog = bool(PROGRESS_RE.match(line))
+            if is_prog and batch and batch[-1][1]:
+                batch[-1] = (line, True)
+            else:
+                batch.append((line, is_prog))
+        if not batch:
+            return
+        batch = batch[-self.max_lines:]
+
         self.txt.configure(state="normal")
-        self.txt.insert("end", s + "\n")
+        if batch[0][1] and self.progress_at_end:
+            self.txt.delete("end-2l linestart", "end-1c")
+        self.txt.insert("end", "".join(line + "\n" for line, _ in batch))
+        self.progress_at_end = batch[-1][1]
+
+        # Cap the buffer; trim 10 % extra so this doesn't run on every batch
+        lines_now = int(self.txt.index("end-1c").split(".")[0])
+        if lines_now > self.max_lines:
+            self.txt.delete("1.0", f"{lines_now - self.max_lines * 9 // 10}.0")
         self.txt.see("end")
         self.txt.configure(state="disabled")
 
     def pump(self):
+        """Drain the queue once per tick: log lines are coalesced, only the newest progress is drawn."""
+        lines, progress = [], None
         try:
-            while True:
+            for _ in range(PUMP_MAX_MESSAGES):
                 msg = self.q.get_nowait()
                 t = msg.get("type")
                 if t == "log":
-                    self.log(msg["text"])
-                elif t == "status":
+                    lines.extend(msg["text"].split("\n"))
+                    continue
+                if t == "progress":
+                    progress = msg
+                    continue
+                if t == "warm":
+                    if self.profile:
+                        report = startup.report() + f"\n  ready after {startup.elapsed() * 1000:.0f} ms"
+                        print(report)
+                        lines.extend(report.split("\n"))
+                        self.after(200, self.destroy)
+                    continue
+                # anything else must appear after the lines / progress queued before it
+                self.log_lines(lines)
+                lines = []
+                if progress is not None:
+                    self.show_progress(progress)
+                    progress = None
+                if t == "status":
                     self.status.config(text=msg["text"])
-                elif t == "done":
-                    self.btn.config(state="normal")
-                    self.btn_fw.config(state="normal")
-                    self.status.config(text="✅ Done.")
-                    messagebox.showinfo("AutoGen X", "✅ Flash successful.")
-                elif t == "error":
-                    self.btn.config(state="normal")
-                    self.btn_fw.config(state="normal")
-                    self.status.config(text="❌ Failed.")
-                    messagebox.showerror("AutoGen X", msg["text"])
+                elif t in ("done", "error"):
+                    self.finish(t, msg.get("text", ""))
+                elif t == "auto_start":
+                    self.status.config(text=f"Flashing {msg['port']}... do not unplug USB.")
+                elif t == "auto_done":
+                    r = msg["result"]
+                    state = "✅ Done" if r["ok"] else "❌ Failed"
+                    self.status.config(text=f"{state} ({r['port']}). Unplug it and plug in the next controller.")
         except queue.Empty:
             pass
-        self.after(120, self.pump)
+        self.log_lines(lines)
+        if progress is not None:
+            self.show_progress(progress)
+        self.after(50, self.pump)
+
+    def finish(self, t: str, text: str):
+        self.btn.config(state="normal")
+        self.btn_fw.config(state="normal")
+        if t == "done":
+            self.status.config(text="✅ Done.")
+            messagebox.showinfo("AutoGen X", "✅ Flash successful.")
+        else:
+            self.status.config(text="❌ Failed.")
+            messagebox.showerror("AutoGen X", text)
+
+    # -------------------- auto-flash on plug-in --------------------
+
+    def toggle_auto(self):
+        if not self.auto.get():
+            if self.watcher:
+                self.watcher.stop()
+                self.flasher.close(wait=False)  # a unit being flashed finishes, queued ones are dropped
+                self.watcher = self.flasher = None
+            self.btn.config(state="normal")
+            self.btn_fw.config(state="normal")
+            self.q.put({"type": "status", "text": "Auto-flash off."})
+            return
+        if not self.fw_path:
+            self.auto.set(False)
+            messagebox.showwarning("AutoGen X", "Please select the firmware.bin first.")
+            return
+        af = flash_module()
+        from autogen_flash_watch import AutoFlasher, PortWatcher
+        cfg = self.cfg or af.prepare_cfg()
+        # Same plug-in rules as the watch CLI; no dialogs, output in the window, one unit at a time
+        self.flasher = AutoFlasher(cfg, self.fw_path, jobs=1, cooldown=float(cfg.get("watch_cooldown", 5)),
+                                   job=self.auto_job, log=lambda text: self.q.put({"type": "log", "text": text}),
+                                   on_finish=lambda r: self.q.put({"type": "auto_done", "result": r}))
+        self.watcher = PortWatcher(self.flasher.on_arrival, self.flasher.on_removal,
+                                   poll=float(cfg.get("watch_poll", 0.25))).start()
+        self.btn.config(state="disabled")
+        self.btn_fw.config(state="disabled")
+        self.q.put({"type": "log", "text": "👀 Auto-flash on: every controller plugged in now is flashed right away."})
+        self.q.put({"type": "status", "text": "Waiting for a controller... plug it in via USB."})
+
+    def auto_job(self, cfg, fw_path: str, port: str) -> dict:
+        """AutoFlasher job (its worker thread): one plug-in, flashed like a Start Flash click."""
+        self.q.put({"type": "auto_start", "port": port})
+        t0 = time.monotonic()
+        ok, text = self.run_flash(port)
+        return {"port": port, "ok": ok, "error": text, "seconds": round(time.monotonic() - t0, 2)}
+
+    def show_progress(self, ev: dict):
+        self.bar["value"] = ev.get("percent") or 0
+        what = "Verifying" if ev.get("phase") == "verify" else "Writing"
+        text = f"{what} @ {ev.get('address', 0):#x}: {ev.get('percent', 0):.0f}%"
+        if ev.get("kbps"):
+            text += f"  {ev['kbps']:.0f} kbit/s"
+        if ev.get("eta") is not None:
+            text += f"  ETA {ev['eta']:.0f}s"
+        self.status.config(text=text + "  — do not unplug USB.")
 
     def pick_firmware(self):
         path = filedialog.askopenfilename(
             title="Select firmware.bin",
-            filetypes=[("Firmware", "*.bin"), ("All files", "*.*")]
+            filetypes=[("Firmware", "*.bin *.agx"), ("All files", "*.*")]
         )
         if path:
             self.fw_path = path
@@ -115,23 +271,44 @@ class App(tk.Tk):
         threading.Thread(target=self.worker, daemon=True).start()
 
     def worker(self):
-        try:
-            orig_print = __builtins__.print
+        ok, text = self.run_flash()
+        self.q.put({"type": "done"} if ok else {"type": "error", "text": text})
 
-            def gui_print(*args, **kwargs):
-                text = " ".join(str(a) for a in args)
-                self.q.put({"type": "log", "text": text})
+    def run_flash(self, port: str = None):
+        """Flashing thread: one run(), its output in the log view + a log file. Returns (ok, error text)."""
+        logf = open_log_file()
+        if logf:
+            self.q.put({"type": "log", "text": f"🧾 Full log: {logf.name}\n"})
 
-            __builtins__.print = gui_print
+        def gui_log(ev):
+            if ev.get("type") == "progress":
+                self.q.put(ev)  # drawn by the Tk thread
+            if ev.get("type") != "log":
+                return
+            self.q.put({"type": "log", "text": ev["text"]})
+            if logf:
+                try:
+                    logf.write(ev["text"] + "\n")  # every line, including each progress update
+                except Exception:
+                    pass
 
-            autogen_flash.main(firmware_override=self.fw_path)
-
-            __builtins__.print = orig_print
-            self.q.put({"type": "done"})
-        except SystemExit as e:
-            self.q.put({"type": "error", "text": str(e)})
+        from autogen_flash_events import capture_output
+        af = flash_module()
+        try:
+            # Everything this thread prints (and the flash thread relays) lands in the log view
+            with capture_output(gui_log):
+                af.run(firmware_override=self.fw_path, port=port)
+            return True, ""
+        except af.FlashError as e:
+            return False, str(e)
         except Exception:
-            self.q.put({"type": "error", "text": traceback.format_exc()})
+            return False, traceback.format_exc()
+        finally:
+            if logf:
+                try:
+                    logf.close()
+                except Exception:
+                    pass
 
 if __name__ == "__main__":
-    App().mainloop()
+    App(profile="--startup-profile" in sys.argv[1:]).mainloop()
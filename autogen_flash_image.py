@@ -0,0 +1,185 @@
+# ============================================================
+# AutoGen X firmware image pre-flight check
+# - Parses the ESP app image (.bin) BEFORE the device is touched:
+#   magic, segment table, chip ID, XOR checksum, appended SHA-256,
+#   size against the OTA slot
+# - Reads the file through mmap (no copy of the image)
+# - Result cached by SHA-256 of the file (in-process + cache folder)
+#
+# Layout (esp_image_format.h):
+#   header      8 B  magic 0xE9, segment count, flash mode, size/freq, entry
+#   ext header 16 B  wp pin, drive(3), chip_id, min rev, min/max rev full,
+#                    reserved(4), hash_appended
+#   segments         [load addr, length] + data, `segment count` times
+#   padding          to 16-byte alignment, last byte = XOR checksum (seed 0xEF)
+#   SHA-256     32 B of everything above, if hash_appended
+# ============================================================
+
+import hashlib
+import mmap
+import os
+import struct
+
+IMAGE_MAGIC = 0xE9
+MAX_SEGMENTS = 16
+HEADER = struct.Struct("<BBBBI")
+EXT_HEADER = struct.Struct("<B3sHBHH4sB")
+SEGMENT = struct.Struct("<II")
+
+CHIP_IDS = {
+    0: "ESP32",
+    2: "ESP32-S2",
+    5: "ESP32-C3",
+    9: "ESP32-S3",
+    12: "ESP32-C2",
+    13: "ESP32-C6",
+    16: "ESP32-H2",
+    18: "ESP32-P4",
+    20: "ESP32-C61",
+    23: "ESP32-C5",
+}
+
+# In-process memo: (path, size, mtime_ns) -> sha256
+_HASHES = {}
+_RESULTS = {}
+
+
+class ImageError(Exception):
+    """The file is not a flashable app image for this target."""
+
+
+def _xor_bytes(buf) -> int:
+    """XOR of all bytes, folded as one big integer (fast for megabytes)."""
+    n = len(buf)
+    if not n:
+        return 0
+    width = 1 << (n - 1).bit_length()  # power-of-two bytes; zero padding doesn't change XOR
+    x = int.from_bytes(buf, "little")
+    while width > 1:
+        width //= 2
+        x = (x >> (width * 8)) ^ (x & ((1 << (width * 8)) - 1))
+    return x
+
+
+def parse_image(buf) -> dict:
+    """Parse + check an app image held in a bytes-like object. Raises ImageError."""
+    size = len(buf)
+    if size < HEADER.size + EXT_HEADER.size:
+        raise ImageError(f"file is only {size} bytes (truncated?)")
+    magic, nseg, flash_mode, size_freq, entry = HEADER.unpack_from(buf, 0)
+    if magic != IMAGE_MAGIC:
+        raise ImageError(f"bad magic byte {magic:#04x} (expected {IMAGE_MAGIC:#04x}): not an ESP app image")
+    if not 0 < nseg <= MAX_SEGMENTS:
+        raise ImageError(f"implausible segment count {nseg}")
+    _, _, chip_id, min_rev, min_rev_full, max_rev_full, _, hash_appended = EXT_HEADER.unpack_from(buf, HEADER.size)
+
+    pos = HEADER.size + EXT_HEADER.size
+    checksum = 0xEF
+    segments = []
+    for i in range(nseg):
+        if pos + SEGMENT.size > size:
+            raise ImageError(f"truncated in segment {i} header @ {pos:#x}")
+        addr, length = SEGMENT.unpack_from(buf, pos)
+        pos += SEGMENT.size
+        if pos + length > size:
+            raise ImageError(f"segment {i} ({length} bytes @ {addr:#010x}) runs past end of file (truncated?)")
+        checksum ^= _xor_bytes(buf[pos:pos + length])
+        segments.append({"addr": addr, "length": length})
+        pos += length
+
+    pos += 15 - pos % 16  # checksum sits in the last byte of the 16-byte aligned block
+    if pos >= size:
+        raise ImageError("truncated before the checksum byte")
+    if buf[pos] != checksum:
+        raise ImageError(f"checksum mismatch (image {buf[pos]:#04x}, computed {checksum:#04x}): corrupt file")
+    pos += 1
+
+    if hash_appended == 1:
+        if pos + 32 > size:
+            raise ImageError("truncated: appended SHA-256 missing")
+        if hashlib.sha256(buf[:pos]).digest() != bytes(buf[pos:pos + 32]):
+            raise ImageError("appended SHA-256 does not match the image: corrupt file")
+        pos += 32
+
+    return {
+        "chip_id": chip_id,
+        "chip": CHIP_IDS.get(chip_id, f"chip id {chip_id}"),
+        "entry": entry,
+        "flash_mode": flash_mode,
+        "size_freq": size_freq,
+        "min_rev": min_rev_full or min_rev * 100,
+        "max_rev": max_rev_full,
+        "segments": segments,
+        "hash_appended": hash_appended == 1,
+        "image_len": pos,
+        "file_size": size,
+        "trailing": size - pos,  # e.g. a secure boot signature block
+    }
+
+
+def _sha256_file(path: str, mm) -> str:
+    st = os.stat(path)
+    key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    if key not in _HASHES:
+        _HASHES[key] = hashlib.sha256(mm).hexdigest()
+    return _HASHES[key]
+
+
+def validate_image(path: str, chip: str = None, slot_size: int = None) -> dict:
+    """
+    Check the app image at path. chip: expected chip name ("ESP32"),
+    slot_size: bytes available in the OTA slot. Returns the parsed info
+    (plus sha256); raises ImageError with a readable reason.
+    """
+    try:
+        f = open(path, "rb")
+    except OSError as ex:
+        raise ImageError(f"cannot open: {ex}")
+    with f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise ImageError("file is empty")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            from autogen_flash_cache import key_lock
+            # Serialized per file: the warm-up thread and the flash may get here together
+            with key_lock(("validate", os.path.abspath(path))):
+                sha256 = _sha256_file(path, mm)
+                info = _RESULTS.get(sha256)
+                if info is None:
+                    info = _load_cached(sha256)
+                if info is None:
+                    try:
+                        info = parse_image(mm)
+                    except ImageError as ex:
+                        info = {"error": str(ex)}
+                    info["sha256"] = sha256
+                    _store_cached(sha256, info)
+                _RESULTS[sha256] = info
+
+    if info.get("error"):
+        raise ImageError(info["error"])
+    return check_target(info, chip, slot_size)
+
+
+def check_target(info: dict, chip: str = None, slot_size: int = None) -> dict:
+    """Parsed image info against the expected chip / slot size. Raises ImageError."""
+    if chip and info["chip"].upper() != chip.upper():
+        raise ImageError(f"built for {info['chip']}, this tool flashes {chip}")
+    if slot_size and info["file_size"] > slot_size:
+        raise ImageError(f"{info['file_size']} bytes does not fit the {slot_size:#x} ({slot_size} bytes) app slot")
+    return info
+
+
+def _load_cached(sha256: str):
+    try:
+        from autogen_flash_cache import JsonStore
+        return JsonStore("images").get(sha256)
+    except Exception:
+        return None
+
+
+def _store_cached(sha256: str, info: dict):
+    try:
+        from autogen_flash_cache import JsonStore
+        JsonStore("images").update(sha256, **info)
+    except Exception:
+        pass
@@ -0,0 +1,86 @@
+# ============================================================
+# AutoGen X link model
+# - Remembers which baud actually works on this USB adapter
+# - Every operation starts at the learned rate, not at the top
+# - Steps down on link errors, tries one step up after a clean streak
+# - Rate + streak persisted per adapter (VID:PID:serial) in the cache
+#   folder: a rate lost to one bad run is won back a few runs later
+# ============================================================
+
+
+def adapter_key(info: dict):
+    """'VID:PID:serial' of the USB-UART adapter, None for non-USB ports."""
+    if not info or info.get("vid") is None:
+        return None
+    return f"{info['vid']:04x}:{info.get('pid') or 0:04x}:{info.get('serial_number') or ''}"
+
+
+class LinkModel:
+    """Shared baud choice for every phase of one flash run."""
+
+    PROMOTE_AFTER = 3  # clean operations (across runs) before trying the next faster rate
+
+    def __init__(self, baud_list, start=None, key=None, streak: int = 0):
+        self.ladder = sorted({int(b) for b in baud_list}, reverse=True)
+        self.index = self.ladder.index(start) if start in self.ladder else 0
+        self.key = key
+        self.streak = streak if start in self.ladder else 0
+        self.bad = set()  # rates that failed during this run: never promote back to them
+
+    @classmethod
+    def for_port(cls, port: str, baud_list, info: dict = None):
+        """LinkModel starting at the last rate that worked on this port's adapter."""
+        key = adapter_key(info) if info else None
+        entry = {}
+        if key:
+            try:
+                from autogen_flash_cache import JsonStore
+                entry = JsonStore("links").get(key) or {}
+            except Exception:
+                entry = {}
+        start = entry.get("baud")
+        link = cls(baud_list, start=start, key=key, streak=int(entry.get("streak") or 0))
+        if start in link.ladder:
+            print(f"📶 Starting at learned baud {start} for adapter {key}")
+        return link
+
+    @property
+    def baud(self) -> int:
+        return self.ladder[self.index]
+
+    def attempts(self) -> list:
+        """Rates to try for the next operation, best guess first."""
+        i = self.index
+        if self.streak >= self.PROMOTE_AFTER and i > 0 and self.ladder[i - 1] not in self.bad:
+            i -= 1
+        return self.ladder[i:]
+
+    def ok(self, baud: int):
+        i = self.ladder.index(baud)
+        if i != self.index:
+            self.streak = 0
+        self.index = i
+        self.streak += 1
+        self._save(baud=baud)
+
+    def failed(self, baud: int):
+        """A link error (timeout / garbled reply after sync) at this rate: step down."""
+        self.bad.add(baud)
+        self.streak = 0
+        i = self.ladder.index(baud)
+        self.index = min(i + 1, len(self.ladder) - 1)
+        self._save(baud=self.baud, failed=baud)
+
+    def _save(self, baud=None, failed=None):
+        if not self.key:
+            return
+        try:
+            from autogen_flash_cache import JsonStore
+            store = JsonStore("links")
+            entry = store.get(self.key) or {}
+            fails = dict(entry.get("fails") or {})
+            if failed is not None:
+                fails[str(failed)] = fails.get(str(failed), 0) + 1
+            store.update(self.key, baud=baud, streak=self.streak, fails=fails)
+        except Exception:
+            pass
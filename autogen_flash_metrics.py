@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+# ============================================================
+# AutoGen X flash metrics
+# - Every flash() run becomes one JSON line in the cache folder
+#   (metrics/runs.jsonl, append-only): device MAC, port, USB adapter +
+#   hub location, firmware hash, phase seconds, baud, retries, outcome
+# - Lines are queued and appended in batches by a background thread:
+#   recording never waits for the disk
+# - `stats` reports cycle time p50/p95, throughput per adapter + baud
+#   and failure rates per adapter / hub port / firmware
+#
+# CLI:
+#   python autogen_flash_metrics.py stats [--days N] [--firmware SHA] [--json]
+#   python autogen_flash.py stats ...
+# Config: "metrics": false turns recording off
+# ============================================================
+
+import atexit
+import json
+import os
+import queue
+import socket
+import sys
+import threading
+import time
+
+from autogen_flash_trace import PHASES, phase_seconds
+
+BATCH_LINES = 50      # append once this many runs are queued ...
+BATCH_SECONDS = 2.0   # ... or after this long
+
+
+def metrics_path() -> str:
+    from autogen_flash_cache import cache_dir
+    return os.path.join(cache_dir("metrics"), "runs.jsonl")
+
+
+# -------------------- batched writer --------------------
+
+class _Writer:
+    """Background appender: record() only queues; lines hit the file in batches."""
+
+    def __init__(self):
+        self.q = queue.Queue()
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.thread = None
+
+    def put(self, rec: dict):
+        self.q.put(json.dumps(rec, separators=(",", ":")))
+        if self.thread is None:
+            with self.lock:
+                if self.thread is None:
+                    self.thread = threading.Thread(target=self.run, name="metrics-writer", daemon=True)
+                    self.thread.start()
+                    atexit.register(self.flush)
+        if self.q.qsize() >= BATCH_LINES:
+            self.wake.set()
+
+    def run(self):
+        while True:
+            self.wake.wait(BATCH_SECONDS)
+            self.wake.clear()
+            self.flush()
+
+    def flush(self):
+        """Append everything queued so far (also at exit and at the end of a station worker job)."""
+        with self.lock:
+            lines = []
+            while True:
+                try:
+                    lines.append(self.q.get_nowait())
+                except queue.Empty:
+                    break
+            if not lines:
+                return
+            try:
+                # One write per batch in append mode: parallel station workers don't interleave lines
+                with open(metrics_path(), "a", encoding="utf-8") as f:
+                    f.write("".join(line + "\n" for line in lines))
+            except Exception:
+                pass  # metrics never break flashing
+
+
+_WRITER = _Writer()
+
+
+def record(rec: dict):
+    _WRITER.put(rec)
+
+
+def flush():
+    _WRITER.flush()
+
+
+# -------------------- one run --------------------
+
+class RunRecorder:
+    """Collects one flash() run; finish() queues its record."""
+
+    def __init__(self, cfg: dict):
+        import autogen_flash_trace
+        self.enabled = bool(cfg.get("metrics", True))
+        self.info = {"name": cfg.get("name", ""), "version": cfg.get("version", ""),
+                     "engine": cfg.get("engine", "session"), "ota": cfg.get("ota_mode", "dual"),
+                     "verify": cfg.get("verify", "md5"), "erase": bool(cfg.get("erase", False)), "fallback": False}
+        # Phase seconds come from the trace spans; a private (this thread's) trace if nobody else runs one
+        self.own_trace = autogen_flash_trace.active() is None
+        self.timings = autogen_flash_trace.start_local("flash") if self.own_trace else autogen_flash_trace.active()
+        self.t_start = time.monotonic()
+        self.tid = threading.get_ident()
+
+    def set(self, **kw):
+        self.info.update(kw)
+
+    def finish(self, ok: bool, error: str = ""):
+        import autogen_flash_trace
+        if self.own_trace:
+            autogen_flash_trace.stop_local()
+        if not self.enabled:
+            return
+        try:
+            record(self.build(ok, error))
+        except Exception:
+            pass
+
+    def build(self, ok: bool, error: str) -> dict:
+        t0 = self.t_start - self.timings.t0
+        spans = [s for s in self.timings.spans if s["tid"] == self.tid and s["start"] >= t0 - 1e-6]
+        phases = phase_seconds(spans)
+        writes = [s for s in spans if s["name"].startswith("write ") and s["name"] != "write otadata"]
+        slots = len({s["name"] for s in writes})
+        bauds = [s["args"].get("baud") for s in writes if s["args"].get("baud")]
+        attempts = {}
+        for s in spans:
+            if s["args"].get("attempt"):
+                attempts[s["name"]] = max(attempts.get(s["name"], 1), s["args"]["attempt"])
+        opens = sum(1 for s in spans if s["name"] == "session_open")
+        retries = (sum(n - 1 for n in attempts.values()) + max(0, opens - 1)
+                   + sum(1 for s in spans if s["name"] == "reconnect"))
+
+        info = dict(self.info)
+        port_info = info.pop("port_info", None) or {}
+        fp = info.pop("fingerprint", None) or {}
+        sha, nbytes = info.pop("firmware", ""), info.pop("bytes", 0)
+        seconds = time.monotonic() - self.t_start
+        write_s = phases["write"]
+        rec = {
+            "ts": round(time.time(), 3),
+            "station": socket.gethostname(),
+            "ok": ok,
+            "error": error,
+            "port": info.pop("port", port_info.get("device")),
+            "usb": (f"{port_info['vid']:04x}:{port_info.get('pid') or 0:04x}" if port_info.get("vid") is not None else None),
+            "usb_serial": port_info.get("serial_number"),
+            "location": port_info.get("location"),
+            "mac": fp.get("mac"),
+            "chip": fp.get("chip"),
+            "firmware": sha,
+            "bytes": nbytes,
+            "baud": bauds[-1] if bauds else None,
+            "retries": retries,
+            "seconds": round(seconds, 3),
+            "phases": {k: round(v, 3) for k, v in phases.items()},
+            "kbps": round(nbytes * slots * 8 / 1000 / write_s, 1) if ok and write_s and slots else None,
+        }
+        rec.update(info)
+        return rec
+
+
+# -------------------- stats --------------------
+
+def load_runs(path: str = None, since: float = 0, firmware: str = "") -> list:
+    runs = []
+    try:
+        with open(path or metrics_path(), "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    r = json.loads(line)
+                except ValueError:
+                    continue  # a line cut short by a crash
+                if r.get("ts", 0) >= since and (not firmware or str(r.get("firmware", "")).startswith(firmware)):
+                    runs.append(r)
+    except OSError:
+        pass
+    return runs
+
+
+def percentile(values, p: float):
+    """Nearest-rank percentile (None for no values)."""
+    values = sorted(v for v in values if v is not None)
+    if not values:
+        return None
+    k = max(0, min(len(values) - 1, -(-len(values) * p // 100) - 1))
+    return values[int(k)]
+
+
+def summarize(runs) -> dict:
+    ok = [r for r in runs if r.get("ok")]
+    cycle = [r["seconds"] for r in ok]
+    return {
+        "runs": len(runs),
+        "failed": len(runs) - len(ok),
+        "fail_rate": round((len(runs) - len(ok)) / len(runs), 3) if runs else 0.0,
+        "p50": percentile(cycle, 50),
+        "p95": percentile(cycle, 95),
+        "kbps_p50": percentile([r.get("kbps") for r in ok], 50),
+        "retries": round(sum(r.get("retries", 0) for r in runs) / len(runs), 2) if runs else 0.0,
+    }
+
+
+def group(runs, key) -> dict:
+    out = {}
+    for r in runs:
+        out.setdefault(key(r), []).append(r)
+    return {k: summarize(v) for k, v in sorted(out.items(), key=lambda kv: -len(kv[1]))}
+
+
+def stats(runs) -> dict:
+    return {
+        "total": summarize(runs),
+        "phases_p50": {col: percentile([r["phases"].get(col) for r in runs if r.get("ok") and r.get("phases")], 50)
+                       for _, col in PHASES},
+        "adapter_baud": group(runs, lambda r: f"{r.get('usb') or 'non-USB'} @ {r.get('baud') or '-'}"),
+        "hub_port": group(runs, lambda r: f"{r.get('station', '?')} {r.get('location') or r.get('port') or '?'}"),
+        "firmware": group(runs, lambda r: f"{r.get('version') or '?'} {str(r.get('firmware') or '')[:12]}"),
+    }
+
+
+def print_stats(st: dict):
+    def fmt(v, spec=".1f"):
+        return "-" if v is None else format(v, spec)
+
+    t = st["total"]
+    print(f"📊 {t['runs']} runs, {t['failed']} failed ({t['fail_rate'] * 100:.1f} %), "
+          f"cycle p50 {fmt(t['p50'])}s p95 {fmt(t['p95'])}s, {t['retries']} retries/run")
+    print("   phase p50 (s): " + "  ".join(f"{k} {fmt(v, '.2f')}" for k, v in st["phases_p50"].items()))
+    for title, key in (("Adapter @ baud", "adapter_baud"), ("Hub port", "hub_port"), ("Firmware", "firmware")):
+        rows = st[key]
+        w = max([len(k) for k in rows] + [len(title)])
+        print(f"\n{title:<{w}} {'runs':>6} {'fail %':>7} {'p50 s':>7} {'p95 s':>7} {'kbit/s':>7} {'retry':>6}")
+        print("-" * (w + 45))
+        for k, s in rows.items():
+            print(f"{k:<{w}} {s['runs']:>6} {s['fail_rate'] * 100:>7.1f} {fmt(s['p50']):>7} {fmt(s['p95']):>7} "
+                  f"{fmt(s['kbps_p50'], '.0f'):>7} {s['retries']:>6}")
+    print()
+
+
+def main(argv=None) -> int:
+    import argparse
+    ap = argparse.ArgumentParser(description="AutoGen X flash metrics")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    s = sub.add_parser("stats", help="cycle time, throughput and failure rates of the recorded runs")
+    s.add_argument("--days", type=float, help="only runs of the last N days")
+    s.add_argument("--firmware", default="", help="only runs of this firmware (SHA-256 prefix)")
+    s.add_argument("--file", help="runs file (default: the station's metrics/runs.jsonl)")
+    s.add_argument("--json", action="store_true", help="print the numbers as JSON")
+    args = ap.parse_args(argv)
+
+    since = time.time() - args.days * 86400 if args.days else 0
+    runs = load_runs(args.file, since, args.firmware)
+    if not runs:
+        print(f"No flash runs recorded yet ({args.file or metrics_path()}).")
+        return 1
+    st = stats(runs)
+    if args.json:
+        print(json.dumps(st, indent=2))
+    else:
+        print_stats(st)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+# ============================================================
+# AutoGen X partition table
+# - Parses the ESP-IDF partition table the device carries at 0x8000
+# - Derives the OTA layout (otadata + app slots) from it, so one tool
+#   serves hardware revisions with different layouts
+# - Cached per device MAC with the table's MD5: a later flash of the
+#   same unit costs one on-device MD5 instead of a read
+#
+# Entry (32 B): magic AA 50, type, subtype, offset, size, label[16], flags
+# MD5 entry:    magic EB EB, 14 x FF, MD5 of the entries before it
+# ============================================================
+
+import hashlib
+import struct
+
+PARTITION_TABLE_OFFSET = 0x8000
+PARTITION_TABLE_SIZE   = 0xC00
+
+ENTRY = struct.Struct("<2sBBII16sI")
+MAGIC = b"\xaa\x50"
+MD5_MAGIC = b"\xeb\xeb"
+
+TYPE_APP, TYPE_DATA = 0x00, 0x01
+SUBTYPE_OTA_0 = 0x10   # app ota_0 .. ota_15 = 0x10 .. 0x1F
+SUBTYPE_OTADATA = 0x00  # data "ota"
+
+
+class PartitionError(Exception):
+    """No usable partition table / OTA layout."""
+
+
+def parse_partition_table(buf) -> list:
+    """List of partition dicts (name, type, subtype, offset, size, flags). Checks the MD5 entry if present."""
+    parts = []
+    for pos in range(0, len(buf) - ENTRY.size + 1, ENTRY.size):
+        raw = bytes(buf[pos:pos + ENTRY.size])
+        if raw[:2] == MD5_MAGIC:
+            if hashlib.md5(bytes(buf[:pos])).digest() != raw[16:32]:
+                raise PartitionError("partition table MD5 mismatch (corrupt table)")
+            continue
+        if raw[:2] != MAGIC:
+            break  # 0xFF padding: end of table
+        _, ptype, subtype, offset, size, label, flags = ENTRY.unpack(raw)
+        parts.append({"name": label.split(b"\0", 1)[0].decode("ascii", "replace"), "type": ptype,
+                      "subtype": subtype, "offset": offset, "size": size, "flags": flags})
+    if not parts:
+        raise PartitionError("no partition table (blank or erased)")
+    return parts
+
+
+def build_partition_table(parts) -> bytes:
+    """Binary table (with MD5 entry, 0xFF padded) from partition dicts: the inverse of parse."""
+    out = b""
+    for p in parts:
+        out += ENTRY.pack(MAGIC, p["type"], p["subtype"], p["offset"], p["size"],
+                          p["name"].encode("ascii")[:16], p.get("flags", 0))
+    out += MD5_MAGIC + b"\xff" * 14 + hashlib.md5(out).digest()
+    return out + b"\xff" * (PARTITION_TABLE_SIZE - len(out))
+
+
+def ota_layout(parts, source: str = "device") -> dict:
+    """
+    {"otadata": offset, "otadata_size": size, "slots": [("app0", offset, size), ("app1", ...)],
+     "source": source}. app0/app1 are ota_0/ota_1 (the names ota_slot in version.json uses).
+    """
+    otadata = next((p for p in parts if p["type"] == TYPE_DATA and p["subtype"] == SUBTYPE_OTADATA), None)
+    apps = sorted((p for p in parts if p["type"] == TYPE_APP and SUBTYPE_OTA_0 <= p["subtype"] <= SUBTYPE_OTA_0 + 15),
+                  key=lambda p: p["subtype"])
+    if otadata is None or len(apps) < 2:
+        names = ", ".join(p["name"] for p in parts)
+        raise PartitionError(f"table has no otadata + ota_0/ota_1 ({names})")
+    return {"otadata": otadata["offset"], "otadata_size": otadata["size"],
+            "slots": [(f"app{i}", p["offset"], p["size"]) for i, p in enumerate(apps[:2])],
+            "source": source}
+
+
+def describe(layout: dict) -> str:
+    slots = ", ".join(f"{n}={o:#x}+{s:#x}" for n, o, s in layout["slots"])
+    return f"otadata={layout['otadata']:#x}+{layout['otadata_size']:#x}, {slots} ({layout['source']})"
+
+
+def device_layout(session) -> dict:
+    """
+    OTA layout of the device behind an open FlashSession. Known MAC with the
+    same on-device table MD5: parsed table comes from the cache (one MD5
+    command); otherwise the table is read, parsed and cached.
+    """
+    from autogen_flash_cache import JsonStore
+    store = JsonStore("partitions")
+    md5 = session.md5(PARTITION_TABLE_OFFSET, PARTITION_TABLE_SIZE)
+    entry = store.get(session.mac) if session.mac else None
+    if entry and entry.get("md5") == md5 and entry.get("partitions"):
+        return ota_layout(entry["partitions"], source="cached")
+
+    parts = parse_partition_table(session.read(PARTITION_TABLE_OFFSET, PARTITION_TABLE_SIZE))
+    layout = ota_layout(parts)
+    if session.mac:
+        store.update(session.mac, md5=md5, partitions=parts)
+    return layout
@@ -0,0 +1,336 @@
+# ============================================================
+# AutoGen X flash session
+# - ONE esptool ESPLoader connection for the whole flash sequence
+# - Stub uploaded once, baud switched once
+# - erase / write / verify all run over the same link
+# - A cancelled run (autogen_flash_events.cancel_scope) stops between
+#   operations / blocks, never in the middle of one
+# ============================================================
+
+import hashlib
+import random
+import time
+import zlib
+
+from autogen_flash_events import check_cancel
+from autogen_flash_trace import span
+
+
+VERIFY_STRATEGIES = ("md5", "sample", "full")
+STUB_FLASH_SIZE = 4 * 1024 * 1024  # told to the stub when the real size is unknown
+
+
+class SessionError(Exception):
+    """Raised when the persistent esptool session cannot do its job."""
+
+
+def _esptool():
+    """Import esptool lazily (raises SessionError if it is not available)."""
+    try:
+        import esptool
+        from esptool import loader
+    except Exception as ex:
+        raise SessionError(f"esptool not available: {ex}")
+    return esptool, loader
+
+
+def _detect_chip(esptool, port, baud, connect_mode, connect_attempts):
+    # esptool >= 4 exposes detect_chip in esptool.cmds, older builds at top level
+    try:
+        from esptool.cmds import detect_chip
+    except Exception:
+        detect_chip = esptool.detect_chip
+    return detect_chip(port, baud, connect_mode, False, connect_attempts)
+
+
+class FlashSession:
+    """
+    Persistent connection to one ESP device.
+
+    Usage:
+        with FlashSession(port, baud_list) as s:
+            s.erase_region(0xE000, 0x2000)
+            s.write(0x10000, data)
+            s.verify(0x10000, data)
+    """
+
+    ROM_BAUD = 115200
+
+    def __init__(self, port: str, baud_list=None, connect_mode: str = "default-reset", connect_attempts: int = 7, link=None,
+                 chip: str = None):
+        self.port = port
+        self.baud_list = list(baud_list or [921600, 460800, 230400, 115200])
+        self.link = link  # optional autogen_flash_link.LinkModel: learned start rate + feedback
+        self.connect_mode = connect_mode
+        self.connect_attempts = connect_attempts
+        self.chip_hint = chip  # from the device fingerprint: connect as this chip, no auto-detection
+        self.fingerprint = None
+        self.esp = None
+        self.baud = None
+        self.chip = None
+        self.flash_size = None
+        self.mac = None
+        self.acked = 0  # uncompressed bytes of the current write the stub has ACKed
+        self.synced = False  # the ROM answered during the current open() attempt
+
+    # -------------------- connection --------------------
+
+    def __enter__(self):
+        if self.esp is None:
+            self.open()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(reset=exc_type is None)
+        return False
+
+    def open(self):
+        """Connect, upload stub once and switch to the fastest baud that holds."""
+        esptool, _ = _esptool()
+        last = None
+        for b in (self.link.attempts() if self.link else self.baud_list):
+            check_cancel()
+            self.synced = False
+            try:
+                with span("session_open", baud=b):
+                    self._connect(esptool, b)
+                if self.link:
+                    self.link.ok(b)
+                return self
+            except Exception as ex:
+                last = ex
+                # Only a link that broke after the ROM answered says anything about this rate;
+                # no device / wrong chip hint / a reset glitch must not lower the learned baud
+                if self.link and self.synced:
+                    self.link.failed(b)
+                print(f"⚠️ Session at baud {b} failed: {ex}")
+                self.close(reset=False)
+                time.sleep(0.3)
+        raise SessionError(f"Could not open session on {self.port}: {last}")
+
+    def _loader(self, esptool):
+        if self.chip_hint:
+            esp = None
+            try:
+                from esptool.targets import CHIP_DEFS
+                from autogen_flash_fingerprint import chip_arg
+                esp = CHIP_DEFS[chip_arg(self.chip_hint)](self.port, self.ROM_BAUD)
+                esp.connect(self.connect_mode, self.connect_attempts)
+                return esp
+            except Exception:
+                self.chip_hint = None  # stale / wrong hint: auto-detect from the next attempt on
+                try:
+                    esp._port.close()
+                except Exception:
+                    pass
+                raise
+        return _detect_chip(esptool, self.port, self.ROM_BAUD, self.connect_mode, self.connect_attempts)
+
+    def _connect(self, esptool, baud: int):
+        from autogen_flash_fingerprint import flash_size_known, from_loader, load, save
+        esp = self._loader(esptool)
+        self.esp = esp
+        self.synced = True  # from here on a failure is the link's (stub upload / baud switch / reads)
+        if not esp.IS_STUB:
+            esp = esp.run_stub()
+            self.esp = esp
+        if baud != self.ROM_BAUD:
+            esp.change_baud(baud)
+        self.baud = baud
+        self.chip = esp.CHIP_NAME
+
+        try:
+            self.mac = ":".join(f"{b:02x}" for b in esp.read_mac())
+        except Exception:
+            self.mac = None
+
+        # Attach SPI flash + tell the stub how big it is (also proves the link at this baud).
+        # A controller seen before (same MAC + chip) skips the SPI flash ID read.
+        if esp.CHIP_NAME != "ESP8266":
+            esp.flash_spi_attach(0)
+        fp = load(self.mac)
+        if not (fp and fp.get("chip") == esp.CHIP_NAME and flash_size_known(fp)):
+            fp = from_loader(esp, self.mac, esp.flash_id())
+            save(fp)  # unknown JEDEC capacity stays None (no guess in the cache): read again next time
+        self.fingerprint = fp
+        self.flash_size = fp["flash_size"] if flash_size_known(fp) else None
+        esp.flash_set_parameters(self.flash_size or STUB_FLASH_SIZE)
+        size = f"{self.flash_size // (1024 * 1024)}MB" if self.flash_size else "size unknown"
+        print(f"🔗 Session open on {self.port}: {self.chip}, flash {size} @ baud {baud}")
+
+    def close(self, reset: bool = True):
+        esp, self.esp = self.esp, None
+        if esp is None:
+            return
+        try:
+            if reset:
+                esp.hard_reset()
+        except Exception:
+            pass
+        try:
+            esp._port.close()
+        except Exception:
+            pass
+
+    def reconnect(self):
+        """Drop the link (no reset) and open it again, one baud lower if the model says so."""
+        if self.link and self.baud:
+            self.link.failed(self.baud)
+        self.close(reset=False)
+        time.sleep(0.3)
+        self.open()
+
+    def _require(self):
+        check_cancel()  # every operation starts here
+        if self.esp is None:
+            raise SessionError("Session is not open.")
+        return self.esp
+
+    # -------------------- flash operations --------------------
+
+    def erase_flash(self):
+        self._require().erase_flash()
+
+    def erase_region(self, offset: int, size: int):
+        self._require().erase_region(offset, size)
+
+    def write(self, offset: int, data: bytes, compressed: bytes = None):
+        """Write data at offset using the stub's deflate protocol."""
+        from autogen_flash_events import emit, progress_event
+        esp = self._require()
+        _, loader = _esptool()
+        comp = compressed if compressed is not None else zlib.compress(data, 9)
+
+        t0 = time.monotonic()
+        emit({"type": "phase", "phase": "write"})
+        esp.flash_defl_begin(len(data), len(comp), offset)
+        decomp = zlib.decompressobj()
+        self.acked = 0
+        block_size = esp.FLASH_WRITE_SIZE
+        timeout = loader.DEFAULT_TIMEOUT
+        total = len(comp)
+        next_pct = 10
+        seq = 0
+        for pos in range(0, total, block_size):
+            check_cancel()
+            block = comp[pos:pos + block_size]
+            esp.flash_defl_block(block, seq, timeout=timeout)
+            # stub ACKs immediately, the NEXT block has to wait for this one to be written
+            unc = len(decomp.decompress(block))
+            self.acked += unc
+            timeout = max(loader.DEFAULT_TIMEOUT, loader.timeout_per_mb(loader.ERASE_WRITE_TIMEOUT_PER_MB, unc))
+            seq += 1
+            emit(progress_event("write", offset + self.acked, self.acked, len(data), t0))
+            pct = (pos + len(block)) * 100 // total
+            if pct >= next_pct:
+                print(f"   Writing at {offset + (pos + len(block)) * len(data) // total:#010x}... ({pct} %)")
+                next_pct = pct - pct % 10 + 10
+
+        # Make sure the last block is committed before anything else runs
+        esp.read_reg(esp.CHIP_DETECT_MAGIC_REG_ADDR, timeout=timeout)
+        dt = time.monotonic() - t0
+        kbit = len(data) / dt * 8 / 1000 if dt > 0 else 0
+        print(f"   Wrote {len(data)} bytes ({len(comp)} compressed) at {offset:#010x} in {dt:.1f} seconds (effective {kbit:.1f} kbit/s)...")
+        emit({"type": "wrote", "bytes": len(data), "compressed": len(comp), "address": offset,
+              "seconds": round(dt, 2), "kbps": round(kbit, 1)})
+
+    def write_resumable(self, offset: int, data: bytes, block_md5s, block_size: int = 0x10000,
+                        compressed: bytes = None, attempts: int = 4):
+        """
+        write() with block-level checkpoints: after a link error the session
+        reconnects, checks the blocks already sent by on-device MD5 and only
+        re-sends from the first block that is not on the flash yet.
+        """
+        start = 0
+        for attempt in range(1, attempts + 1):
+            try:
+                self.write(offset + start, data[start:], compressed if start == 0 else None)
+                return
+            except Exception as ex:
+                if attempt == attempts:
+                    raise SessionError(f"Write @ {offset:#x} failed after {attempts} attempts: {ex}")
+                sent = start + self.acked
+                print(f"⚠️ Link error at {offset + sent:#x} ({ex}), reconnecting...")
+                with span("reconnect", attempt=attempt):
+                    self.reconnect()
+                    start = self.resume_point(offset, data, block_md5s, block_size, start, sent)
+                print(f"↪️ Resuming @ {offset + start:#x} ({start * 100 // len(data)} % already on flash)")
+
+    def resume_point(self, offset: int, data: bytes, block_md5s, block_size: int, start: int, sent: int) -> int:
+        """First block (between start and sent) whose on-device MD5 does not match."""
+        for i in range(start // block_size, min(sent, len(data)) // block_size):
+            if self.md5(offset + i * block_size, block_size) != block_md5s[i]:
+                return i * block_size
+        return (min(sent, len(data)) // block_size) * block_size
+
+    def changed_blocks(self, offset: int, data: bytes, block_md5s, block_size: int = 0x1000):
+        """
+        Ask the stub for the MD5 of every block of the slot and return the
+        indexes whose content differs from the local (precomputed) hashes.
+        """
+        changed = []
+        for i, expected in enumerate(block_md5s):
+            start = i * block_size
+            size = min(block_size, len(data) - start)
+            if self.md5(offset + start, size) != expected:
+                changed.append(i)
+        return changed
+
+    def write_delta(self, offset: int, data: bytes, block_md5s, block_size: int = 0x1000) -> int:
+        """
+        Write only the blocks that differ from what is already on the device.
+        Adjacent changed blocks are merged into one write. Returns bytes written.
+        """
+        changed = self.changed_blocks(offset, data, block_md5s, block_size)
+        nblocks = len(block_md5s)
+        print(f"   Delta: {len(changed)}/{nblocks} blocks of {block_size // 1024}KB differ")
+
+        # Merge consecutive block indexes into [first, last] runs
+        runs = []
+        for i in changed:
+            if runs and runs[-1][1] == i - 1:
+                runs[-1][1] = i
+            else:
+                runs.append([i, i])
+
+        written = 0
+        for first, last in runs:
+            start = first * block_size
+            chunk = data[start:(last + 1) * block_size]
+            self.write(offset + start, chunk)
+            written += len(chunk)
+        return written
+
+    def md5(self, offset: int, size: int) -> str:
+        return self._require().flash_md5sum(offset, size).lower()
+
+    def verify(self, offset: int, data: bytes, digest: str = None, strategy: str = "md5", samples: int = 8,
+               block_size: int = 0x1000) -> bool:
+        """
+        Check the region against the local data:
+          md5     on-device MD5 vs the local digest (precomputed per firmware; nothing is read back)
+          sample  read back `samples` random blocks (plus the first and last) and compare the bytes
+          full    read back everything (audits: runs at the session baud, minutes for big images)
+        """
+        if strategy == "sample":
+            n = -(-len(data) // block_size)
+            picks = sorted({0, n - 1} | set(random.sample(range(n), min(samples, n))))
+            return all(self.read(offset + i * block_size, len(data[i * block_size:(i + 1) * block_size]))
+                       == bytes(data[i * block_size:(i + 1) * block_size]) for i in picks)
+        if strategy == "full":
+            return self.read(offset, len(data), progress=True) == bytes(data)
+        expected = digest or hashlib.md5(data).hexdigest()
+        return self.md5(offset, len(data)) == expected.lower()
+
+    def read(self, offset: int, size: int, progress: bool = False) -> bytes:
+        if not progress:
+            return self._require().read_flash(offset, size)
+        from autogen_flash_events import emit, progress_event
+        t0 = time.monotonic()
+        emit({"type": "phase", "phase": "verify"})
+
+        def progress_fn(done, total, *_):
+            check_cancel()
+            emit(progress_event("verify", offset + done, done, total, t0))
+
+        return self._require().read_flash(offset, size, progress_fn=progress_fn)
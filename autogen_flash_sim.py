@@ -0,0 +1,461 @@
+#!/usr/bin/env python3
+# ============================================================
+# AutoGen X simulated ESP32 (ROM loader + flasher stub)
+# - Speaks the esptool serial protocol on a Linux/macOS pty
+# - In-memory flash: SYNC, READ/WRITE_REG, stub upload, SPI attach,
+#   compressed + plain writes, erase, MD5, READ_FLASH
+# - Link model: baud-limited wire time, per-reply latency, flash
+#   erase/program time, adapter baud ceiling, dropped frames, stalls
+#
+#   with SimulatedESP(max_baud=460800, latency=0.002) as sim:
+#       cfg["connect_mode"] = "no-reset"   # a pty has no DTR/RTS
+#       autogen_flash.flash(cfg, port=sim.port)
+#       assert sim.flash[0x10000:0x10000 + n] == data
+#
+# Every SYNC is treated as if the host had pulsed EN/IO0 (there are no
+# modem lines to reset with): the device drops back to the ROM at 115200.
+# ============================================================
+
+import hashlib
+import os
+import random
+import select
+import struct
+import sys
+import threading
+import time
+import zlib
+
+# esptool command opcodes (esptool/loader.py ESP_CMDS)
+FLASH_BEGIN      = 0x02
+FLASH_DATA       = 0x03
+FLASH_END        = 0x04
+MEM_BEGIN        = 0x05
+MEM_END          = 0x06
+MEM_DATA         = 0x07
+SYNC             = 0x08
+WRITE_REG        = 0x09
+READ_REG         = 0x0A
+SPI_SET_PARAMS   = 0x0B
+SPI_ATTACH       = 0x0D
+CHANGE_BAUDRATE  = 0x0F
+FLASH_DEFL_BEGIN = 0x10
+FLASH_DEFL_DATA  = 0x11
+FLASH_DEFL_END   = 0x12
+SPI_FLASH_MD5    = 0x13
+ERASE_FLASH      = 0xD0
+ERASE_REGION     = 0xD1
+READ_FLASH       = 0xD2
+
+ROM_BAUD = 115200
+SECTOR = 0x1000
+BLOCK = 0x10000
+
+# ESP32 registers esptool reads while connecting
+CHIP_MAGIC_REG = 0x40001000
+CHIP_MAGIC     = 0x00F01D83
+UART_CLKDIV_REG = 0x3FF40014
+EFUSE_BASE      = 0x3FF5A000
+SPI_BASE        = 0x3FF42000
+SPI_CMD_REG     = SPI_BASE + 0x00
+SPI_USR2_REG    = SPI_BASE + 0x24
+SPI_W0_REG      = SPI_BASE + 0x80
+SPIFLASH_RDID   = 0x9F
+
+ERR_INVALID_MSG = 0x05  # ROM "unsupported command / invalid message"
+ERR_CHECKSUM    = 0x07
+
+
+class SimulatedESP:
+    """
+    One simulated ESP32 behind a pseudo-terminal. `port` is the device
+    path to hand to autogen_flash / esptool (connect with "no-reset").
+
+    Link/timing knobs:
+      max_baud        highest rate the "adapter" holds; above it every frame is lost
+      latency         seconds added before each reply (USB-UART latency timer)
+      error_rate      probability that a host frame is lost on the wire
+      stall_at        go silent once this many flash bytes were written (one shot)
+      stall_s         how long the stall lasts
+      sector_erase_s / block_erase_s / program_bps   SPI flash timing
+      realtime=False  skip all sleeps (protocol/correctness runs)
+    """
+
+    def __init__(self, flash_size: int = 4 * 1024 * 1024, mac: str = "24:0a:c4:00:00:01",
+                 max_baud: int = None, latency: float = 0.0, error_rate: float = 0.0,
+                 stall_at: int = None, stall_s: float = 2.0,
+                 sector_erase_s: float = 0.03, block_erase_s: float = 0.15, program_bps: int = 600_000,
+                 realtime: bool = True, seed: int = None, trace: bool = False):
+        self.flash = bytearray(b"\xff" * flash_size)
+        self.flash_size = flash_size
+        self.mac = bytes(int(x, 16) for x in mac.split(":"))
+        self.max_baud = max_baud
+        self.latency = latency
+        self.error_rate = error_rate
+        self.stall_at = stall_at
+        self.stall_s = stall_s
+        self.sector_erase_s = sector_erase_s
+        self.block_erase_s = block_erase_s
+        self.program_bps = program_bps
+        self.realtime = realtime
+        self.rng = random.Random(seed)
+        self.trace = trace
+
+        self.stats = {"frames_in": 0, "frames_out": 0, "bytes_in": 0, "bytes_out": 0,
+                      "dropped": 0, "syncs": 0, "stub_uploads": 0, "written": 0, "erased": 0,
+                      "commands": {}}
+        self.master = self.slave = None
+        self.port = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._rx = bytearray()
+        self._frames = []
+        self._reset_device()
+
+    # -------------------- lifecycle --------------------
+
+    def start(self):
+        import pty
+        import tty
+        self.master, self.slave = pty.openpty()
+        tty.setraw(self.slave)  # no echo / CR translation before pyserial opens it
+        self.port = os.ttyname(self.slave)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._serve, name="sim-esp", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(2.0)
+        for fd in (self.master, self.slave):
+            try:
+                os.close(fd)
+            except Exception:
+                pass
+        self.master = self.slave = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
+
+    def _reset_device(self):
+        """Power-on / EN reset: ROM loader at 115200, stub gone, flash kept."""
+        self.baud = ROM_BAUD
+        self.stub = False
+        self.regs = {
+            CHIP_MAGIC_REG: CHIP_MAGIC,
+            UART_CLKDIV_REG: 40_000_000 // ROM_BAUD,  # esptool estimates a 40 MHz crystal from this
+            # BASE_MAC: EFUSE word 2 = CRC(8) pad(8) mac[0] mac[1], word 1 = mac[2..5]
+            EFUSE_BASE + 8: (self.mac[0] << 8) | self.mac[1],
+            EFUSE_BASE + 4: int.from_bytes(self.mac[2:6], "big"),
+        }
+        self._write = None  # active FLASH_BEGIN / FLASH_DEFL_BEGIN state
+        self._clock = time.monotonic()
+        self._busy = 0.0  # SPI flash busy (programming) until this monotonic time
+        self._stalled_until = 0.0
+
+    # -------------------- wire --------------------
+
+    def _wire(self, nbytes: int):
+        """Account for nbytes crossing the UART (10 bits per byte at the current baud)."""
+        self._delay(nbytes * 10 / self.baud)
+
+    def _delay(self, seconds: float):
+        if not self.realtime or seconds <= 0:
+            return
+        # Accumulate and sleep in >=2 ms steps: time.sleep() is too coarse for single frames
+        now = time.monotonic()
+        self._clock = max(self._clock, now) + seconds
+        if self._clock - now > 0.002:
+            time.sleep(self._clock - now)
+
+    def _flash_busy(self, seconds: float):
+        """Start background flash work (the stub keeps receiving meanwhile)."""
+        if self.realtime:
+            self._busy = max(self._busy, self._clock, time.monotonic()) + seconds
+
+    def _wait_flash(self):
+        base = max(self._clock, time.monotonic())
+        if self._busy > base:
+            self._delay(self._busy - base)
+
+    def _read_frame(self, timeout: float = 0.1):
+        """Next decoded SLIP frame from the host, or None."""
+        deadline = time.monotonic() + timeout
+        while not self._frames:
+            left = deadline - time.monotonic()
+            if left <= 0 or self._stop.is_set():
+                return None
+            r, _, _ = select.select([self.master], [], [], min(left, 0.05))
+            if not r:
+                continue
+            try:
+                chunk = os.read(self.master, 65536)
+            except OSError:
+                time.sleep(0.01)  # host side closed and not reopened yet
+                continue
+            self._rx += chunk
+            while True:
+                start = self._rx.find(b"\xc0")
+                if start < 0:
+                    self._rx.clear()
+                    break
+                end = self._rx.find(b"\xc0", start + 1)
+                if end < 0:
+                    del self._rx[:start]
+                    break
+                raw = bytes(self._rx[start + 1:end])
+                del self._rx[:end]  # keep the closing C0: it may open the next frame
+                if raw:
+                    self._frames.append((len(raw) + 2, raw.replace(b"\xdb\xdc", b"\xc0").replace(b"\xdb\xdd", b"\xdb")))
+        return self._frames.pop(0)
+
+    def _send(self, payload: bytes):
+        frame = b"\xc0" + payload.replace(b"\xdb", b"\xdb\xdd").replace(b"\xc0", b"\xdb\xdc") + b"\xc0"
+        self._wire(len(frame))
+        self.stats["frames_out"] += 1
+        self.stats["bytes_out"] += len(frame)
+        os.write(self.master, frame)
+
+    def _reply(self, op: int, val: int = 0, data: bytes = b"", status: int = 0, error: int = 0):
+        # ROM appends 4 status bytes (2 reserved), the stub 2
+        tail = bytes([status, error]) + (b"" if self.stub else b"\x00\x00")
+        body = data + tail
+        self._delay(self.latency)
+        self._send(struct.pack("<BBHI", 0x01, op, len(body), val) + body)
+
+    # -------------------- main loop --------------------
+
+    def _serve(self):
+        while not self._stop.is_set():
+            item = self._read_frame()
+            if item is None:
+                continue
+            nraw, frame = item
+            self.stats["frames_in"] += 1
+            self.stats["bytes_in"] += nraw
+            self._wire(nraw)
+            if len(frame) < 8 or frame[0] != 0x00:
+                continue
+            op, size, chk = struct.unpack("<xBHI", frame[:8])
+            data = frame[8:8 + size]
+
+            if time.monotonic() < self._stalled_until or self._lost(op):
+                self.stats["dropped"] += 1
+                continue
+            if op == SYNC:
+                self._reset_device()
+            self.stats["commands"][op] = self.stats["commands"].get(op, 0) + 1
+            if self.trace:
+                print(f"[sim] op={op:#04x} len={size} baud={self.baud} stub={self.stub}", file=sys.stderr)
+            try:
+                self._handle(op, data, chk)
+            except Exception as ex:
+                if self.trace:
+                    print(f"[sim] op={op:#04x} failed: {ex}", file=sys.stderr)
+                self._reply(op, status=1, error=ERR_INVALID_MSG)
+
+    def _lost(self, op: int) -> bool:
+        """Is this host frame garbled on the wire?"""
+        if op == SYNC:
+            return False  # SYNC means "host reset us": it always gets through at ROM baud
+        if self.max_baud and self.baud > self.max_baud:
+            return True
+        return self.error_rate > 0 and self.rng.random() < self.error_rate
+
+    # -------------------- commands --------------------
+
+    def _handle(self, op: int, data: bytes, chk: int):
+        self._wait_flash()  # one command at a time: the previous block must be programmed first
+        if op == SYNC:
+            self.stats["syncs"] += 1
+            # ROM answers one SYNC with eight replies; a running stub would answer with val 0
+            for _ in range(8):
+                self._reply(SYNC, val=0x20120707)
+        elif op == READ_REG:
+            (addr,) = struct.unpack("<I", data[:4])
+            self._reply(op, val=self.regs.get(addr, 0))
+        elif op == WRITE_REG:
+            addr, value, mask, _ = struct.unpack("<IIII", data[:16])
+            self._write_reg(addr, value, mask)
+            self._reply(op)
+        elif op == MEM_BEGIN:
+            self._reply(op)
+        elif op == MEM_DATA:
+            payload = data[16:]
+            self._reply(op, status=0 if _checksum(payload) == chk else 1,
+                        error=0 if _checksum(payload) == chk else ERR_CHECKSUM)
+        elif op == MEM_END:
+            no_entry, entry = struct.unpack("<II", data[:8])
+            self._reply(op)
+            if not no_entry and not self.stub:
+                # The uploaded "stub" starts and greets the host
+                self.stub = True
+                self.stats["stub_uploads"] += 1
+                self._send(b"OHAI")
+        elif op in (SPI_ATTACH, SPI_SET_PARAMS):
+            self._reply(op)
+        elif op == CHANGE_BAUDRATE:
+            new, _ = struct.unpack("<II", data[:8])
+            self._reply(op)  # still at the old rate
+            self.baud = new
+            self.regs[UART_CLKDIV_REG] = 40_000_000 // new
+        elif op in (FLASH_BEGIN, FLASH_DEFL_BEGIN):
+            self._begin_write(op, data)
+        elif op in (FLASH_DATA, FLASH_DEFL_DATA):
+            self._write_block(op, data, chk)
+        elif op in (FLASH_END, FLASH_DEFL_END):
+            self._write = None
+            self._reply(op)
+        elif op == SPI_FLASH_MD5:
+            addr, size = struct.unpack("<II", data[:8])
+            self._check_range(addr, size)
+            self._delay(size / 8_000_000)  # on-chip MD5 is fast but not free
+            digest = hashlib.md5(self.flash[addr:addr + size]).digest()
+            self._reply(op, data=digest if self.stub else digest.hex().encode("ascii"))
+        elif op == ERASE_FLASH and self.stub:
+            self._erase(0, self.flash_size)
+            self._reply(op)
+        elif op == ERASE_REGION and self.stub:
+            addr, size = struct.unpack("<II", data[:8])
+            self._check_range(addr, size)
+            self._erase(addr, size)
+            self._reply(op)
+        elif op == READ_FLASH and self.stub:
+            self._read_flash(*struct.unpack("<IIII", data[:16]))
+        else:
+            self._reply(op, status=1, error=ERR_INVALID_MSG)
+
+    def _write_reg(self, addr: int, value: int, mask: int):
+        old = self.regs.get(addr, 0)
+        self.regs[addr] = (old & ~mask) | (value & mask) if mask != 0xFFFFFFFF else value
+        if addr == SPI_CMD_REG and value & (1 << 18):
+            # SPI "user command" kicked off: complete it at once
+            cmd = self.regs.get(SPI_USR2_REG, 0) & 0xFF
+            if cmd == SPIFLASH_RDID:
+                size_id = self.flash_size.bit_length() - 1
+                self.regs[SPI_W0_REG] = 0x20 | (0x40 << 8) | (size_id << 16)  # XMC-style JEDEC id
+            else:
+                self.regs[SPI_W0_REG] = 0
+            self.regs[SPI_CMD_REG] = 0
+
+    def _check_range(self, addr: int, size: int):
+        if addr < 0 or addr + size > self.flash_size:
+            raise ValueError(f"range {addr:#x}+{size:#x} outside flash")
+
+    def _erase(self, addr: int, size: int):
+        self._delay(self._erase_time(addr, size))
+        self.flash[addr:addr + size] = b"\xff" * size
+        self.stats["erased"] += size
+
+    def _erase_time(self, addr: int, size: int) -> float:
+        """64 KB block erases where aligned, 4 KB sector erases for the rest."""
+        t, end = 0.0, addr + size
+        while addr < end:
+            if addr % BLOCK == 0 and end - addr >= BLOCK:
+                t += self.block_erase_s
+                addr += BLOCK
+            else:
+                t += self.sector_erase_s
+                addr += SECTOR
+        return t
+
+    def _begin_write(self, op: int, data: bytes):
+        size, _, _, offset = struct.unpack("<IIII", data[:16])
+        self._check_range(offset, size)
+        if not self.stub:
+            self._erase(offset, size)  # ROM erases the whole range up front
+        self._write = {"offset": offset, "pos": 0, "size": size, "seq": 0, "erased": None,
+                       "decomp": zlib.decompressobj() if op == FLASH_DEFL_BEGIN else None}
+        self._reply(op)
+
+    def _write_block(self, op: int, data: bytes, chk: int):
+        w = self._write
+        length, seq = struct.unpack("<II", data[:8])
+        payload = data[16:16 + length]
+        if w is None or _checksum(payload) != chk:
+            self._reply(op, status=1, error=ERR_CHECKSUM)
+            return
+        if seq != w["seq"]:
+            self._reply(op)  # a retry of a block we already have
+            return
+        out = w["decomp"].decompress(payload) if w["decomp"] else payload
+        start = w["offset"] + w["pos"]
+        self._check_range(start, len(out))
+        # The stub ACKs first and programs while the next block is on the wire
+        self._reply(op)
+        busy = len(out) / self.program_bps
+        if self.stub:
+            # the stub erases just ahead of what it programs
+            first_unerased = w["erased"] if w["erased"] is not None else start - start % SECTOR
+            end = start + len(out)
+            if end > first_unerased:
+                span_end = -(-end // SECTOR) * SECTOR
+                busy += self._erase_time(first_unerased, span_end - first_unerased)
+                w["erased"] = span_end
+                # whole sectors: the tail of the last one reads 0xFF afterwards as well
+                self.flash[first_unerased:span_end] = b"\xff" * (span_end - first_unerased)
+        self._flash_busy(busy)
+        self.flash[start:start + len(out)] = out
+        w["pos"] += len(out)
+        w["seq"] += 1
+        self.stats["written"] += len(out)
+        if self.stall_at is not None and self.stats["written"] >= self.stall_at:
+            self.stall_at = None
+            self._stalled_until = time.monotonic() + self.stall_s
+
+    def _read_flash(self, addr: int, size: int, packet: int, in_flight: int):
+        self._check_range(addr, size)
+        self._reply(READ_FLASH)
+        sent = acked = 0
+        while acked < size:
+            while sent < size and (sent - acked) // packet < in_flight:
+                chunk = self.flash[addr + sent:addr + min(sent + packet, size)]
+                self._send(bytes(chunk))
+                sent += len(chunk)
+            item = self._read_frame(timeout=3.0)
+            if item is None:
+                return  # host gave up
+            (acked,) = struct.unpack("<I", item[1][:4])
+        self._send(hashlib.md5(self.flash[addr:addr + size]).digest())
+
+
+def _checksum(data: bytes, state: int = 0xEF) -> int:
+    for b in data:
+        state ^= b
+    return state
+
+
+# -------------------- CLI --------------------
+
+def main(argv=None) -> int:
+    """Run a simulated device until Ctrl+C (point the flash tool / esptool at the printed port)."""
+    import argparse
+    ap = argparse.ArgumentParser(description="Simulated ESP32 ROM/stub loader on a pty")
+    ap.add_argument("--flash-mb", type=int, default=4)
+    ap.add_argument("--max-baud", type=int, help="highest baud the simulated adapter holds")
+    ap.add_argument("--latency", type=float, default=0.0, help="seconds added before each reply")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="probability a host frame is lost")
+    ap.add_argument("--trace", action="store_true")
+    args = ap.parse_args(argv)
+
+    sim = SimulatedESP(flash_size=args.flash_mb * 1024 * 1024, max_baud=args.max_baud,
+                       latency=args.latency, error_rate=args.error_rate, trace=args.trace).start()
+    print(f"🧪 Simulated ESP32 on {sim.port}  (esptool: --before no_reset --after no_reset)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sim.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
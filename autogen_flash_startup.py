@@ -0,0 +1,53 @@
+# ============================================================
+# AutoGen X startup profile
+# - Marks from the entry point to "ready": imports, window, config,
+#   firmware warm-up (stdlib only, import this first)
+# - `--startup-profile` on the CLI / GUI prints the table and exits
+# ============================================================
+
+import contextlib
+import threading
+import time
+
+T0 = time.perf_counter()
+_MARKS = []  # (name, start, end) in perf_counter seconds
+_LOCK = threading.Lock()
+_last = T0
+
+
+def mark(name: str):
+    """Record everything since the previous mark (or the import of this module) as `name`."""
+    global _last
+    now = time.perf_counter()
+    with _LOCK:
+        _MARKS.append((name, _last, now))
+        _last = now
+
+
+@contextlib.contextmanager
+def step(name: str):
+    """Record the duration of the block as `name` (works from any thread)."""
+    global _last
+    t = time.perf_counter()
+    try:
+        yield
+    finally:
+        now = time.perf_counter()
+        with _LOCK:
+            _MARKS.append((name, t, now))
+            _last = max(_last, now)
+
+
+def elapsed() -> float:
+    return time.perf_counter() - T0
+
+
+def report(title: str = "Startup profile") -> str:
+    """Table of all marks: own time and time since the entry point, in ms."""
+    with _LOCK:
+        marks = sorted(_MARKS, key=lambda m: m[2])
+    w = max([len(n) for n, _, _ in marks] + [10])
+    lines = [f"⏱️ {title} (ms)", f"  {'step':<{w}} {'own':>8} {'at':>8}"]
+    for name, start, end in marks:
+        lines.append(f"  {name:<{w}} {(end - start) * 1000:>8.1f} {(end - T0) * 1000:>8.1f}")
+    return "\n".join(lines)
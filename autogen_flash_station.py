@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# ============================================================
+# AutoGen X production station
+# - Finds EVERY ESP on every serial port
+# - Flashes them all at once (one worker process per port)
+# - One failing unit never aborts the others
+#
+# CLI:
+#   python autogen_flash_station.py [firmware.bin] [--ports P1 P2 ...] [--jobs N]
+# API:
+#   results = flash_station(cfg, firmware_override=None, ports=None)
+#   result = flash_one(cfg, fw_path, port)     one unit in a worker process (also the watcher's job)
+# ============================================================
+
+import argparse
+import multiprocessing
+import sys
+import time
+
+import autogen_flash
+
+
+def flash_one(cfg, fw_path: str, port: str) -> dict:
+    """Worker process body: flash one port, never raise. Returns {port, ok, error, seconds}."""
+    from autogen_flash_events import capture_output
+
+    def tagged(ev):
+        if ev.get("type") == "log":  # every line tagged with the worker's port
+            out = sys.__stderr__ if ev["stream"] == "stderr" else sys.__stdout__
+            out.write(f"[{port}] {ev['text']}\n")
+
+    t0 = time.monotonic()
+    result = {"port": port, "ok": False, "error": "", "seconds": 0.0}
+    try:
+        with capture_output(tagged):
+            autogen_flash.flash(cfg, firmware_override=fw_path, port=port)
+        result["ok"] = True
+    except autogen_flash.FlashError as ex:
+        result["error"] = str(ex)  # die() already printed the reason
+    except Exception as ex:
+        result["error"] = f"{type(ex).__name__}: {ex}"
+    finally:
+        result["seconds"] = round(time.monotonic() - t0, 2)
+        sys.__stdout__.flush()
+        from autogen_flash_metrics import flush
+        flush()  # pool workers exit without atexit handlers
+    return result
+
+
+def flash_station(cfg, firmware_override=None, ports=None, jobs: int = None) -> list:
+    """
+    Flash every ESP found (or the given ports) in parallel.
+    Returns one result dict per port: {port, ok, error, seconds}.
+    """
+    fw_path = autogen_flash.resolve_firmware_path(cfg, firmware_override)
+    autogen_flash.check_firmware(cfg, fw_path)  # a bad image stops the line before any unit is touched
+
+    # Compress + hash once in the parent so every worker hits the cache
+    try:
+        from autogen_flash_cache import load_firmware
+        load_firmware(fw_path)
+    except Exception:
+        pass
+
+    if not ports:
+        ports = autogen_flash.find_device_ports(probe_timeout=float(cfg.get("probe_timeout", 8)),
+                                                fast=bool(cfg.get("fast_probe", True)))
+    if not ports:
+        return []
+
+    print(f"🏭 Flashing {len(ports)} device(s): {', '.join(ports)}\n")
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(processes=jobs or len(ports)) as pool:
+        pending = [pool.apply_async(flash_one, (cfg, fw_path, p)) for p in ports]
+        results = []
+        for p, r in zip(ports, pending):
+            try:
+                results.append(r.get())
+            except Exception as ex:
+                results.append({"port": p, "ok": False, "error": f"worker crashed: {ex}", "seconds": 0.0})
+    return results
+
+
+def print_summary(results):
+    print("\n======================================")
+    print("   Station summary")
+    print("======================================")
+    for r in results:
+        mark = "✅" if r["ok"] else "❌"
+        line = f"{mark} {r['port']:<24} {r['seconds']:>7.1f}s"
+        if not r["ok"]:
+            line += f"  {r['error']}"
+        print(line)
+    ok = sum(1 for r in results if r["ok"])
+    print(f"\n{ok}/{len(results)} device(s) flashed OK.\n")
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Flash every connected AutoGen X controller in parallel.")
+    ap.add_argument("firmware", nargs="?", help="firmware .bin (default: from version.json)")
+    ap.add_argument("--ports", nargs="+", help="only flash these ports (skip detection)")
+    ap.add_argument("--jobs", type=int, help="max parallel workers (default: one per port)")
+    args = ap.parse_args(argv)
+
+    print("======================================")
+    print("   AutoGen X Flash Station")
+    print("======================================\n")
+
+    cfg = autogen_flash.prepare_cfg()
+    try:
+        results = flash_station(cfg, firmware_override=args.firmware, ports=args.ports, jobs=args.jobs)
+        if not results:
+            autogen_flash.die("No ESP devices found on any serial port.", kind=autogen_flash.DeviceNotFoundError)
+    except autogen_flash.FlashError:
+        return 1  # die() already printed the ❌ reason
+    print_summary(results)
+    return 0 if all(r["ok"] for r in results) else 1
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
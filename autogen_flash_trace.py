@@ -0,0 +1,142 @@
+# ============================================================
+# AutoGen X timing instrumentation
+# - Monotonic timers around every phase / attempt of a run
+# - Summary table (--timings) and Chrome trace JSON (--trace FILE,
+#   open in chrome://tracing or https://ui.perfetto.dev)
+#
+#   with span("write app0", baud=921600) as s:
+#       ...
+#       s["result"] = "ok"
+# ============================================================
+
+import contextlib
+import json
+import os
+import threading
+import time
+
+_ACTIVE = None  # Timings of the run in progress (None: spans cost nothing)
+
+# span name prefix -> phase column (metrics store, bench report)
+PHASES = (
+    ("find_device_port", "probe"),
+    ("probe", "probe"),  # the bench probes its simulated device directly
+    ("load_firmware", "prepare"),
+    ("session_open", "connect"),
+    ("partition_table", "ptable"),
+    ("erase", "erase"),
+    ("write", "write"),
+    ("verify", "verify"),
+)
+_LOCAL = threading.local()  # per-thread Timings: several runs at once in one process (async API, daemon)
+
+
+class Timings:
+    def __init__(self, name: str = "flash"):
+        self.name = name
+        self.t0 = time.monotonic()
+        self.wall0 = time.time()
+        self.spans = []
+        self.lock = threading.Lock()
+
+    def add(self, name: str, start: float, end: float, args: dict):
+        with self.lock:
+            self.spans.append({"name": name, "start": start - self.t0, "end": end - self.t0,
+                               "tid": threading.get_ident(), "args": args})
+
+    def total(self) -> float:
+        return time.monotonic() - self.t0
+
+    def totals(self) -> dict:
+        """Seconds per span name (per-port suffixes " @port" merged)."""
+        totals = {}
+        for s in self.spans:
+            key = s["name"].split(" @")[0]
+            totals[key] = totals.get(key, 0.0) + s["end"] - s["start"]
+        return totals
+
+    def summary(self) -> str:
+        """Human table: one row per span in start order, then per-name totals."""
+        rows = sorted(self.spans, key=lambda s: s["start"])
+        lines = [f"{'phase':<34} {'start':>8} {'secs':>8}  details", "-" * 72]
+        for s in rows:
+            det = "  ".join(f"{k}={v}" for k, v in s["args"].items())
+            lines.append(f"{s['name']:<34} {s['start']:>8.2f} {s['end'] - s['start']:>8.2f}  {det}")
+        lines.append("-" * 72)
+        for k, v in sorted(self.totals().items(), key=lambda kv: -kv[1]):
+            lines.append(f"{k:<34} {'':>8} {v:>8.2f}")
+        lines.append(f"{'TOTAL':<34} {'':>8} {self.total():>8.2f}")
+        return "\n".join(lines)
+
+    def chrome_trace(self) -> dict:
+        pid = os.getpid()
+        tids = {}
+        events = [{"name": "process_name", "ph": "M", "pid": pid, "args": {"name": self.name}}]
+        for s in self.spans:
+            tid = tids.setdefault(s["tid"], len(tids) + 1)
+            events.append({"name": s["name"], "ph": "X", "pid": pid, "tid": tid,
+                           "ts": round(s["start"] * 1e6), "dur": round((s["end"] - s["start"]) * 1e6),
+                           "args": s["args"]})
+        return {"traceEvents": events, "displayTimeUnit": "ms",
+                "otherData": {"started": self.wall0, "total_s": round(self.total(), 3)}}
+
+    def export(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.chrome_trace(), f, indent=1)
+
+
+def phase_seconds(spans) -> dict:
+    """Seconds per PHASES column; spans nested in one already counted (probe_ports in find_device_port) count once."""
+    out = {col: 0.0 for _, col in PHASES}
+    counted = {}  # (thread, column) -> end of what is counted so far
+    for s in sorted(spans, key=lambda s: s["start"]):
+        col = next((c for prefix, c in PHASES if s["name"].startswith(prefix)), None)
+        if col is None:
+            continue
+        key = (s.get("tid"), col)
+        last = counted.get(key, s["start"])
+        out[col] += max(0.0, s["end"] - max(s["start"], last))
+        counted[key] = max(last, s["end"])
+    return out
+
+
+def start(name: str = "flash") -> Timings:
+    global _ACTIVE
+    _ACTIVE = Timings(name)
+    return _ACTIVE
+
+
+def stop():
+    global _ACTIVE
+    t, _ACTIVE = _ACTIVE, None
+    return t
+
+
+def start_local(name: str = "flash") -> Timings:
+    """Timings for the calling thread only (wins over the process-wide one there)."""
+    _LOCAL.timings = Timings(name)
+    return _LOCAL.timings
+
+
+def stop_local():
+    t, _LOCAL.timings = getattr(_LOCAL, "timings", None), None
+    return t
+
+
+def active():
+    return getattr(_LOCAL, "timings", None) or _ACTIVE
+
+
+@contextlib.contextmanager
+def span(name: str, **args):
+    """Time a block; the yielded dict can be filled with extra details (result, rc...)."""
+    t = getattr(_LOCAL, "timings", None) or _ACTIVE
+    start_t = time.monotonic()
+    try:
+        yield args
+    except BaseException as ex:
+        args.setdefault("result", type(ex).__name__)
+        raise
+    finally:
+        if t is not None:
+            t.add(name, start_t, time.monotonic(), args)
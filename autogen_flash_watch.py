@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+# ============================================================
+# AutoGen X hot-plug watcher
+# - Tracks serial port arrivals / removals by diffing list_port_info()
+#   snapshots (cheap poll; udev events on Linux if pyudev is installed)
+# - A new port with a matching USB identity (known device, or a USB-UART
+#   VID:PID from "watch_usb_ids") goes straight into a flash job:
+#   no click, no probe of the other ports
+# - Jobs run in warm worker processes (several plug-ins flash at once);
+#   a unit is flashed again only after it was unplugged
+# - Cooldown: a port that comes back with the same USB serial right after
+#   its job ended is the unit re-enumerating after the tool's reset (native
+#   USB reports the MAC as serial) and is skipped; a different serial is a
+#   new unit, flashed at once; no serial to compare: checked again when the
+#   cooldown is over
+# - The GUI's "Auto-flash on plug-in" is the same AutoFlasher with its own
+#   job (one unit at a time, output in the window)
+#
+# CLI:
+#   python autogen_flash_watch.py [firmware.bin] [--jobs N] [--poll S] [--include-present]
+# API:
+#   PortWatcher(on_arrival, on_removal).start()
+#   flasher = AutoFlasher(cfg, fw_path); PortWatcher(flasher.on_arrival, flasher.on_removal).start()
+# Config: watch_poll (s), watch_jobs, watch_cooldown (s), watch_usb_ids ["vid:pid", ...]
+# ============================================================
+
+import argparse
+import multiprocessing
+import sys
+import threading
+import time
+
+import autogen_flash
+
+# USB-UART bridges / native USB of ESP32 boards
+DEFAULT_USB_IDS = [
+    "10c4:ea60",  # Silicon Labs CP210x
+    "1a86:7523",  # WCH CH340
+    "1a86:55d4",  # WCH CH9102
+    "0403:6001",  # FTDI FT232R
+    "0403:6015",  # FTDI FT231X
+    "303a:1001",  # Espressif USB-Serial/JTAG
+]
+
+
+def _udev_monitor():
+    """pyudev tty monitor on Linux (optional dependency), else None."""
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        import pyudev
+        mon = pyudev.Monitor.from_netlink(pyudev.Context())
+        mon.filter_by("tty")
+        mon.start()
+        return mon
+    except Exception:
+        return None
+
+
+class PortWatcher:
+    """
+    Calls on_arrival(info) / on_removal(info) from a background thread for
+    every serial port that appears / disappears (info: list_port_info() entry).
+    """
+
+    def __init__(self, on_arrival, on_removal=None, poll: float = 0.25, use_udev: bool = True, list_fn=None):
+        self.on_arrival = on_arrival
+        self.on_removal = on_removal
+        self.poll = poll
+        self.use_udev = use_udev
+        self.list_fn = list_fn or autogen_flash.list_port_info
+        self.ports = {}
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.mode = "poll"
+
+    def snapshot(self) -> dict:
+        try:
+            return {p["device"]: p for p in self.list_fn()}
+        except Exception:
+            return dict(self.ports)  # enumeration hiccup: report nothing rather than "all removed"
+
+    def start(self, report_present: bool = False):
+        """Start watching. report_present=True also reports the ports already there as arrivals."""
+        if not report_present:
+            self.ports = self.snapshot()
+        self.thread = threading.Thread(target=self.run, name="port-watcher", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join(timeout=2)
+
+    def check(self):
+        """Diff against the last snapshot and fire the callbacks."""
+        now = self.snapshot()
+        for dev in [d for d in self.ports if d not in now]:
+            info = self.ports.pop(dev)
+            if self.on_removal:
+                self.on_removal(info)
+        for dev, info in now.items():
+            if dev not in self.ports:
+                self.ports[dev] = info
+                self.on_arrival(info)
+
+    def run(self):
+        mon = _udev_monitor() if self.use_udev else None
+        self.mode = "udev" if mon else "poll"
+        while not self.stop_event.is_set():
+            try:
+                self.check()
+            except Exception as ex:
+                print(f"⚠️ Port watcher: {ex}")
+            if mon:
+                # Block until the kernel reports a tty change (poll interval as a safety net)
+                dev = mon.poll(timeout=max(self.poll, 1.0))
+                if dev is not None:
+                    time.sleep(0.05)  # let the device node settle before enumerating
+            else:
+                self.stop_event.wait(self.poll)
+
+
+# -------------------- auto-flash --------------------
+
+def usb_id(info: dict):
+    if not info or info.get("vid") is None:
+        return None
+    return f"{info['vid']:04x}:{info.get('pid') or 0:04x}"
+
+
+def match_device(info: dict, cfg) -> str:
+    """Why this port should be flashed ("" = leave it alone): a known controller or an ESP USB bridge."""
+    from autogen_flash_cache import JsonStore, usb_key
+    entry = JsonStore("devices").load().get(usb_key(info) or "")
+    if entry:
+        return f"known {entry.get('chip') or 'ESP'}{' ' + entry['mac'] if entry.get('mac') else ''}"
+    vp = usb_id(info)
+    if vp and vp in {s.lower() for s in cfg.get("watch_usb_ids", DEFAULT_USB_IDS)}:
+        return f"USB {vp}"
+    return ""
+
+
+class AutoFlasher:
+    """
+    Glue between PortWatcher and the flash jobs: which plug-ins are flashed,
+    de-duplication while a job runs, the re-plug cooldown.
+
+    job(cfg, fw_path, port) -> {port, ok, error, seconds} runs one unit. Default:
+    autogen_flash_station.flash_one in a pool of warm worker processes; with a
+    custom job (GUI) `jobs` threads run it instead. log(text) gets the status
+    lines, on_finish(result) every finished (or cancelled) job.
+    """
+
+    def __init__(self, cfg, fw_path: str, jobs: int = 2, cooldown: float = 5.0, job=None, log=print, on_finish=None):
+        self.cfg = cfg
+        self.fw_path = fw_path
+        self.cooldown = cooldown
+        self.jobs = jobs
+        self.log = log
+        self.on_finish = on_finish
+        self.lock = threading.Lock()
+        self.busy = {}        # device -> Future (queued or running)
+        self.flashed = {}     # device -> (time the last job ended, USB serial of that unit)
+        self.present = {}     # device -> its latest arrival info (until it goes away)
+        self.closed = False
+        self.results = []
+        if job is None:
+            from concurrent.futures import ProcessPoolExecutor
+            from autogen_flash_station import flash_one
+            self.job = flash_one
+            self.pool = ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context("spawn"))
+            # Start the workers now: imports, esptool and firmware are warm before the first plug-in
+            for _ in range(jobs):
+                self.pool.submit(autogen_flash.warm_up, cfg, fw_path)
+        else:
+            from concurrent.futures import ThreadPoolExecutor
+            self.job = job
+            self.pool = ThreadPoolExecutor(max_workers=jobs, thread_name_prefix="auto-flash")
+
+    def on_arrival(self, info: dict):
+        dev = info["device"]
+        why = match_device(info, self.cfg)
+        if not why:
+            self.log(f"🔌 {dev} ({info.get('description') or '?'}): not an AutoGen X USB identity, ignored")
+            return
+        serial = info.get("serial_number") or ""
+        with self.lock:
+            if self.closed:
+                return
+            self.present[dev] = info
+            if dev in self.busy:
+                self.log(f"🔌 {dev} came back while its job runs, not queued again")
+                return
+            ended, last_serial = self.flashed.get(dev, (None, ""))
+            wait = self.cooldown - (time.monotonic() - ended) if ended is not None else 0
+            if wait > 0 and serial and serial == last_serial:
+                self.log(f"🔌 {dev} re-enumerated after its reset (same serial {serial}), not flashed again")
+                return
+            if wait > 0 and not (serial and last_serial):
+                # Can't tell the unit just flashed from a new one: look again when the cooldown is over
+                self.log(f"🔌 {dev} plugged in {self.cooldown - wait:.1f}s after its last job, checking again in {wait:.1f}s")
+                t = threading.Timer(wait, self.recheck, (info,))
+                t.daemon = True
+                t.start()
+                return
+            queued = len(self.busy) >= self.jobs
+            self.log(f"🔌 {dev} plugged in ({why}), {'queued until a worker is free' if queued else 'flashing ...'}")
+            fut = self.pool.submit(self.job, self.cfg, self.fw_path, dev)
+            self.busy[dev] = fut
+        fut.add_done_callback(lambda f, dev=dev, serial=serial: self.on_done(dev, f, serial))
+
+    def recheck(self, info: dict):
+        """Cooldown over: flash the port if that arrival is still there (not unplugged / replaced since)."""
+        with self.lock:
+            if self.present.get(info["device"]) is not info:
+                return
+        self.on_arrival(info)
+
+    def on_removal(self, info: dict):
+        dev = info["device"]
+        with self.lock:
+            self.present.pop(dev, None)
+            fut = self.busy.get(dev)
+            if fut is None and dev in self.flashed:
+                return  # a flashed unit unplugged (or resetting): the next arrival decides
+        if fut is None:
+            self.log(f"⏏️ {dev} removed")
+        elif fut.cancel():  # outside the lock: cancel() runs on_done() right here
+            self.log(f"⏏️ {dev} removed before its turn")
+        else:
+            self.log(f"⚠️ {dev} removed while flashing")
+
+    def on_done(self, dev: str, fut, serial: str = ""):
+        cancelled = fut.cancelled()
+        if cancelled:
+            r = {"port": dev, "ok": False, "error": "removed before it was flashed", "seconds": 0.0}
+        else:
+            try:
+                r = fut.result()
+            except Exception as ex:
+                r = {"port": dev, "ok": False, "error": f"worker crashed: {ex}", "seconds": 0.0}
+        with self.lock:
+            self.busy.pop(dev, None)
+            if not cancelled:
+                self.flashed[dev] = (time.monotonic(), serial)  # serial of the unit the job started on
+                self.results.append(r)
+        if not cancelled:
+            state = "✅ done" if r["ok"] else f"❌ FAILED: {r['error']}"
+            self.log(f"\n{state}  {dev} in {r['seconds']:.1f}s  — unplug it, plug in the next one.\n")
+        if self.on_finish:
+            self.on_finish(r)
+
+    def close(self, wait: bool = True):
+        with self.lock:
+            self.closed = True  # pending re-checks do nothing
+        self.pool.shutdown(wait=wait, cancel_futures=not wait)
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Flash every AutoGen X controller as soon as it is plugged in.")
+    ap.add_argument("firmware", nargs="?", help="firmware .bin / .agx (default: from version.json)")
+    ap.add_argument("--jobs", type=int, help="devices flashed at the same time (default 2)")
+    ap.add_argument("--poll", type=float, help="port poll interval in seconds (default watch_poll, 0.25)")
+    ap.add_argument("--include-present", action="store_true", help="also flash matching ports already connected")
+    args = ap.parse_args(argv)
+
+    print("======================================")
+    print("   AutoGen X Hot-plug Flashing")
+    print("======================================\n")
+
+    cfg = autogen_flash.prepare_cfg()
+    try:
+        fw_path = autogen_flash.resolve_firmware_path(cfg, args.firmware)
+        autogen_flash.check_firmware(cfg, fw_path)  # a bad image stops before any unit is touched
+    except autogen_flash.FlashError:
+        return 1  # die() already printed the ❌ reason
+
+    flasher = AutoFlasher(cfg, fw_path, jobs=args.jobs or int(cfg.get("watch_jobs", 2)),
+                          cooldown=float(cfg.get("watch_cooldown", 5)))
+    watcher = PortWatcher(flasher.on_arrival, flasher.on_removal,
+                          poll=args.poll or float(cfg.get("watch_poll", 0.25)))
+    watcher.start(report_present=args.include_present)
+    time.sleep(0.1)
+    print(f"👀 Watching serial ports ({watcher.mode}) — plug in a controller. Ctrl+C to stop.\n")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("\n🛑 Stopping (waiting for running jobs) ...")
+    finally:
+        watcher.stop()
+        flasher.close()
+
+    if flasher.results:
+        from autogen_flash_station import print_summary
+        print_summary(flasher.results)
+    return 0 if all(r["ok"] for r in flasher.results) else 1
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())